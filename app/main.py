@@ -1,8 +1,106 @@
-from fastapi import FastAPI
-from app.models import ChatRequest, ChatResponse, SourceMeta
-from app.services.rag_service import rag_pipeline
+import json
+import os
+import time
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Bank GPT Backend")
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.models import (
+    BatchChatItem,
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatRequest,
+    ChatResponse,
+    SourceMeta,
+)
+from app.rag.corpus_registry import UnknownCorpusError
+from app.rag.logs import get_logger
+from app.rag.metrics import HTTP_REQUESTS, HTTP_SECONDS, register_collector, render, span
+from app.services.warmup import PipelineWarmup
+
+log = get_logger(__name__)
+
+# Seconds clients are told to wait (Retry-After) while the pipeline warms up
+READY_RETRY_AFTER = int(os.getenv("READY_RETRY_AFTER", "5"))
+
+
+def build_service(progress):
+    # Heavy imports (langchain, chromadb, pandas, fitz) happen here, on the
+    # warm-up thread, not when uvicorn imports this module
+    from app.services.rag_service import MultiCorpusRAGService
+
+    progress("import", 0.0)
+    return MultiCorpusRAGService(progress=progress)
+
+
+warmup = PipelineWarmup(build_service)
+
+
+def cache_metrics():
+    """
+    Scrape-time view of the query-embedding cache, rewrites, sessions and
+    corpora. Answer-cache and structural lookups are counted per tier in
+    rag_lookups_total.
+    """
+    service = warmup.service
+    if service is None:
+        return []
+
+    embedding = service.shared["embeddings"].stats()
+
+    registry = service.registry.stats()
+    rewrites = service.shared["query_rewriter"].stats()
+    sessions = service.sessions.stats()
+    return [
+        (
+            "rag_query_embedding_cache_total", "counter", "Query-embedding cache lookups.",
+            [("", {"result": r}, embedding[k]) for r, k in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))],
+        ),
+        (
+            "rag_query_rewrite_total", "counter", "Follow-up rewrites (skipped = already standalone).",
+            [("", {"result": r}, rewrites[k]) for r, k in (("hit", "hits"), ("miss", "misses"), ("skipped", "skipped"))],
+        ),
+        ("rag_sessions", "gauge", "Conversation sessions in memory.", [("", {}, sessions["sessions"])]),
+        (
+            "rag_sessions_dropped_total", "counter", "Sessions dropped from memory.",
+            [("", {"reason": "lru"}, sessions["evicted"]), ("", {"reason": "ttl"}, sessions["expired"])],
+        ),
+        (
+            "rag_corpus_memory_bytes", "gauge", "Estimated resident size of loaded corpora.",
+            [("", {"corpus": c}, b) for c, b in registry["loaded"].items()],
+        ),
+    ]
+
+
+register_collector(cache_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+
+
+app = FastAPI(title="Bank GPT Backend", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template, not the raw URL, keeps label cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, path=path)
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+        if status >= 500:
+            log.error("request_failed", method=request.method, path=path, status=status)
 
 
 @app.get("/health")
@@ -10,23 +108,40 @@ def health():
     return {"status": "ok"}
 
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    print("🔥 /chat endpoint HIT")
-    print(f"🔥 User Question: {req.question}")
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the pipeline is built, else 503 + stage."""
+    status = warmup.status()
+    if warmup.ready:
+        return status
+    return JSONResponse(status_code=503, content=status, headers={"Retry-After": str(READY_RETRY_AFTER)})
+
 
-    print("🔥 Starting RAG PIPELINE...")
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of stage latencies, counters and caches."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+def require_ready():
+    if not warmup.ready:
+        status = warmup.status()
+        raise HTTPException(
+            status_code=503,
+            detail=status["error"] or f"Pipeline warming up ({status['stage']}, {status['progress']:.0%})",
+            headers={"Retry-After": str(READY_RETRY_AFTER)},
+        )
+    return warmup.service
 
-    # ✅ RAG pipeline
-    answer, metadata_list = rag_pipeline.query(req.question, req.history)
 
-    print("🔥 Pipeline returned ANSWER successfully")
-    print(f"🔥 Answer snippet: {str(answer)[:120]}...")
+@app.get("/corpora")
+def corpora():
+    return require_ready().registry.stats()
 
-    print("🔥 Building metadata objects...")
 
+def build_sources(metadata_list):
     # ✅ CRITICAL FIX: sheet_name + str()
-    sources = [
+    return [
         SourceMeta(
             return_name=str(m.get("return", "")),
             sheet_name=str(m.get("sheet", "")),   # ✅ FIXED
@@ -36,10 +151,115 @@ def chat(req: ChatRequest):
         for m in metadata_list
     ]
 
-    print("🔥 Returning ChatResponse\n")
 
-    return ChatResponse(
-        answer=answer,
-        sources=sources,
-        raw_metadata=metadata_list
+async def get_service(corpus_id):
+    try:
+        return await require_ready().aservice(corpus_id)
+    except UnknownCorpusError:
+        raise HTTPException(status_code=404, detail=f"Unknown corpus {corpus_id!r}")
+
+
+def conversation_for(req: ChatRequest):
+    """(session key, compacted history) for a chat request."""
+    key = req.session_id or req.user_id
+    history = [m.model_dump() for m in req.history or []]
+    return key, require_ready().conversation(key, history, corpus_id=req.corpus_id)
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    log.debug("chat_request", corpus=req.corpus_id, question_chars=len(req.question))
+
+    # ✅ RAG pipeline (corpus built on first use)
+    service = await get_service(req.corpus_id)
+    session_key, history = conversation_for(req)
+    # Follow-ups become standalone questions (rewritten once, here); no
+    # transcript reaches the answer prompt
+    question = await service.astandalone(req.question, history)
+    answer, metadata_list = await service.aquery(req.question, standalone_question=question)
+    require_ready().remember(session_key, question, answer, corpus_id=req.corpus_id)
+
+    with span("serialize"):
+        response = ChatResponse(
+            answer=answer,
+            sources=build_sources(metadata_list),
+            raw_metadata=metadata_list,
+            session_id=session_key,
+            standalone_question=question if question != req.question else None,
+        )
+
+    log.debug("chat_response", answer_chars=len(answer), sources=len(metadata_list))
+    return response
+
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(req: BatchChatRequest):
+    log.debug("chat_batch_request", questions=len(req.requests))
+
+    outcomes = await require_ready().abatch_query(
+        [r.question for r in req.requests],
+        corpus_ids=[r.corpus_id for r in req.requests],
+        max_concurrency=req.max_concurrency,
+    )
+
+    results = []
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results.append(BatchChatItem(index=i, error=f"{type(outcome).__name__}: {outcome}"))
+            continue
+
+        answer, metadata_list = outcome
+        results.append(
+            BatchChatItem(
+                index=i,
+                response=ChatResponse(
+                    answer=answer,
+                    sources=build_sources(metadata_list),
+                    raw_metadata=metadata_list,
+                ),
+            )
+        )
+
+    return BatchChatResponse(results=results)
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-sent events: `sources` (SourceMeta list + raw metadata) right
+    after retrieval, then `token` events, then `done` with timings.
+    """
+
+    service = await get_service(req.corpus_id)
+    session_key, history = conversation_for(req)
+
+    async def event_stream():
+        question = await service.astandalone(req.question, history)
+        chunks = []
+        async for event in service.astream_query(req.question, standalone_question=question):
+            data = event["data"]
+            if event["event"] == "sources":
+                data = {
+                    "sources": jsonable_encoder(build_sources(data)),
+                    "raw_metadata": data,
+                }
+            elif event["event"] == "token":
+                chunks.append(data)
+            elif event["event"] == "done":
+                require_ready().remember(session_key, question, "".join(chunks), corpus_id=req.corpus_id)
+                data = {
+                    **data,
+                    "session_id": session_key,
+                    "standalone_question": question if question != req.question else None,
+                }
+            yield format_sse(event["event"], data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1,6 +1,14 @@
-from pydantic import BaseModel
+import os
+
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 
+# /chat/batch limits (larger batches are rejected with 422; split them).
+# Sized for whole compliance checklists (~500 questions); LLM calls stay
+# under max_concurrency however long the batch is
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "1000"))
+BATCH_MAX_CONCURRENCY_LIMIT = int(os.getenv("BATCH_MAX_CONCURRENCY_LIMIT", "64"))
+
 
 class ChatMessage(BaseModel):
     role: str
@@ -10,7 +18,11 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     question: str
     user_id: Optional[str] = None
+    # Server-side conversation key (falls back to user_id); with neither,
+    # `history` (if any) is used for this request only
+    session_id: Optional[str] = None
     history: Optional[List[ChatMessage]] = None
+    corpus_id: Optional[str] = None  # None → default corpus
 
 
 class SourceMeta(BaseModel):
@@ -24,4 +36,34 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceMeta]
     raw_metadata: Optional[List[dict]] = None
+    session_id: Optional[str] = None
+    # Set when a follow-up was rewritten into a standalone question
+    standalone_question: Optional[str] = None
+
+
+class BatchChatRequest(BaseModel):
+    # Standalone questions only: batch items are not conversation turns
+    requests: List[ChatRequest] = Field(max_length=BATCH_MAX_REQUESTS)
+    # None → BATCH_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=BATCH_MAX_CONCURRENCY_LIMIT)
+
+    @field_validator("requests")
+    @classmethod
+    def no_conversation_fields(cls, requests: List[ChatRequest]) -> List[ChatRequest]:
+        for i, r in enumerate(requests):
+            if r.session_id or r.history:
+                raise ValueError(
+                    f"requests[{i}]: session_id/history are not supported in /chat/batch; "
+                    "send follow-ups to /chat"
+                )
+        return requests
+
+
+class BatchChatItem(BaseModel):
+    index: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
 
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
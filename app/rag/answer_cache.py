@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.rag.embedding_cache import normalize_query
+
+
+def compute_corpus_version(doc_ids: List[str], prompt, llm_name: str = "") -> str:
+    """
+    Fingerprint of everything an answer depends on besides the question:
+    the indexed chunk ids (content hashes), the prompt text and the LLM.
+    """
+    h = hashlib.sha256()
+    for doc_id in sorted(doc_ids):
+        h.update(doc_id.encode("utf-8"))
+    h.update(prompt.pretty_repr().encode("utf-8"))
+    h.update(llm_name.encode("utf-8"))
+    return h.hexdigest()
+
+
+# -------------------------------------------------------
+# SEMANTIC ANSWER CACHE
+# -------------------------------------------------------
+class AnswerCache:
+    """
+    Bounded TTL cache of (answer, metadata_list) per question.
+
+    Lookups match the normalized question exactly, or any cached question
+    whose embedding has cosine similarity >= similarity_threshold. All
+    entries are dropped when the corpus version changes.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        max_entries: int = 512,
+        ttl_seconds: float = 24 * 3600,
+        similarity_threshold: float = 0.97,
+    ):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._matrix = None  # stacked unit embeddings, rebuilt lazily
+        self._matrix_keys: List[str] = []
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    # ---- versioning ----
+    def set_version(self, version: str):
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entries.clear()
+                self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    # ---- internals ----
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return now - entry["created_at"] > self.ttl_seconds
+
+    def _touch(self, key: str) -> Dict:
+        self._entries.move_to_end(key)
+        entry = self._entries[key]
+        return {"answer": entry["answer"], "metadata": list(entry["metadata"])}
+
+    def _similarity_matrix(self):
+        if self._matrix is None:
+            self._matrix_keys = [
+                k for k, e in self._entries.items() if e["embedding"] is not None
+            ]
+            if self._matrix_keys:
+                self._matrix = np.stack(
+                    [self._entries[k]["embedding"] for k in self._matrix_keys]
+                )
+        return self._matrix
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    # ---- public API ----
+    def lookup_exact(self, question: str) -> Optional[Dict]:
+        key = normalize_query(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self.hits += 1
+                return self._touch(key)
+            if entry is not None:
+                del self._entries[key]
+                self._matrix = None
+            return None
+
+    def lookup_similar(self, embedding) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            matrix = self._similarity_matrix()
+            if matrix is None:
+                self.misses += 1
+                return None
+
+            scores = matrix @ self._unit(embedding)
+            for idx in np.argsort(-scores):
+                if scores[idx] < self.similarity_threshold:
+                    break
+                key = self._matrix_keys[idx]
+                entry = self._entries.get(key)
+                if entry is None or self._expired(entry, now):
+                    continue
+                self.hits += 1
+                self.semantic_hits += 1
+                return self._touch(key)
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, answer: str, metadata: List[dict], embedding=None):
+        key = normalize_query(question)
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "metadata": list(metadata),
+                "embedding": None if embedding is None else self._unit(embedding),
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,23 @@
+"""
+Ingest step for VECTOR_BACKEND=mmap: builds (or refreshes, when the
+source files changed) the read-only snapshot every server worker maps.
+Run it once per deploy, before starting the workers.
+
+    python -m app.rag.build_index [corpus_id ...] [--force]
+"""
+import argparse
+
+from app.rag.embedder import get_cached_embedder
+from app.rag.main import QUERY_CACHE_SIZE, corpus_ids, corpus_spec, open_snapshot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpora", nargs="*", help="corpus ids (default: all configured)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the snapshot is current")
+    args = parser.parse_args()
+
+    embeddings = get_cached_embedder(max_entries=QUERY_CACHE_SIZE, cache_path=None)
+    for corpus_id in args.corpora or corpus_ids():
+        spec = corpus_spec(corpus_id)
+        store = open_snapshot(spec, embeddings, force=args.force)
+        print(f"{corpus_id}: {len(store)} chunks in {store.path}")
@@ -0,0 +1,253 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+
+from app.rag.embedding_cache import normalize_query
+from app.rag.logs import get_logger
+from app.rag.metrics import span
+from app.rag.tokens import count_tokens, truncate_tokens
+
+log = get_logger(__name__)
+
+# Questions that lean on the conversation: anaphora ("where is that
+# reported?") or a continuation opener ("and for Level 2B?", "what about ...")
+follow_up_re = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|same|above|previous|former|latter)\b"
+    r"|^\s*(and|but|also|so|then|what about|how about)\b",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(question: str) -> bool:
+    return bool(follow_up_re.search(question))
+
+
+def format_history(messages: List[Dict]) -> str:
+    return "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+    )
+
+
+# -------------------------------------------------------
+# SERVER-SIDE SESSIONS (bounded, LRU + idle TTL)
+# -------------------------------------------------------
+class SessionStore:
+    """
+    Conversation turns per session key (any hashable, e.g. (corpus id,
+    session id) so a conversation never leaks into another corpus).
+
+    At most `max_sessions` sessions are kept, least recently used first out;
+    a session idle for `ttl_seconds` is dropped. Turns are compacted as they
+    are stored: answers are clipped to `answer_tokens` tokens and only the
+    last `max_messages` messages are kept. history() returns the newest
+    messages that fit in `history_tokens`, so what a request carries stays
+    the same size however long the conversation gets.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: float = 1800,
+        max_messages: int = 20,
+        answer_tokens: int = 150,
+        history_tokens: int = 800,
+        encoding=None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.answer_tokens = answer_tokens
+        self.history_tokens = history_tokens
+        self.encoding = encoding
+
+        # key → {"messages": [{"role", "content", "tokens"}], "updated_at"}
+        self._sessions: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.evicted = 0
+        self.expired = 0
+
+    def _message(self, role: str, content: str, max_tokens: Optional[int] = None) -> Dict:
+        if max_tokens:
+            content = truncate_tokens(content, max_tokens, self.encoding)
+        return {"role": role, "content": content, "tokens": count_tokens(content, self.encoding)}
+
+    def _window(self, messages: List[Dict]) -> List[Dict]:
+        """
+        Newest messages within history_tokens, in conversation order. The
+        message that crosses the budget is truncated to what is left, so
+        one long turn never empties the window.
+        """
+        window, used = [], 0
+        for m in reversed(messages):
+            remaining = self.history_tokens - used
+            if remaining <= 0:
+                break
+            content = m["content"]
+            if m["tokens"] > remaining:
+                content = truncate_tokens(content, remaining, self.encoding)
+            window.append({"role": m["role"], "content": content})
+            used += m["tokens"]
+        return window[::-1]
+
+    def _drop_expired(self, now: float):
+        # LRU order is last-use order, so expired sessions sit at the front
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session["updated_at"] <= self.ttl_seconds:
+                break
+            del self._sessions[key]
+            self.expired += 1
+
+    def compact(self, messages) -> List[Dict]:
+        """Client-supplied history ({"role", "content"} dicts) → the same bounded window."""
+        return self._window([
+            self._message(m["role"], m["content"], None if m["role"] == "user" else self.answer_tokens)
+            for m in messages or []
+        ][-self.max_messages:])
+
+    def history(self, key: Hashable) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            session = self._sessions.get(key)
+            if session is None:
+                return []
+            self._sessions.move_to_end(key)
+            session["updated_at"] = now
+            return self._window(session["messages"])
+
+    def append(self, key: Hashable, question: str, answer: str):
+        now = time.time()
+        turn = [self._message("user", question), self._message("assistant", answer, self.answer_tokens)]
+        with self._lock:
+            self._drop_expired(now)
+            session = self._sessions.setdefault(key, {"messages": [], "updated_at": now})
+            session["messages"] = (session["messages"] + turn)[-self.max_messages:]
+            session["updated_at"] = now
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self, key: Hashable):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "evicted": self.evicted, "expired": self.expired}
+
+
+# -------------------------------------------------------
+# FOLLOW-UP → STANDALONE QUERY REWRITING (cached)
+# -------------------------------------------------------
+class QueryRewriter:
+    """
+    Rewrites follow-up questions into standalone ones with one LLM call, so
+    retrieval, the answer cache and the answer prompt see a self-contained
+    question and no transcript. Questions that read as standalone (or come
+    without history) are returned as-is without a call. Rewrites are cached
+    (LRU + TTL) by question and the history window they were made from.
+    """
+
+    def __init__(self, llm, prompt, max_entries: int = 2048, ttl_seconds: float = 3600):
+        self.chain = prompt | llm | StrOutputParser()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (rewrite, created_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @staticmethod
+    def cache_key(question: str, history: List[Dict]) -> str:
+        h = hashlib.sha256(normalize_query(question).encode("utf-8"))
+        for m in history:
+            h.update(f"\x00{m['role']}\x00{m['content']}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _needs_rewrite(self, question: str, history) -> bool:
+        if not history:
+            return False
+        if is_follow_up(question):
+            return True
+        with self._lock:
+            self.skipped += 1
+        return False
+
+    def _lookup(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, rewrite: str):
+        with self._lock:
+            self._entries[key] = (rewrite, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _clean(rewrite: str, question: str) -> str:
+        rewrite = rewrite.strip().strip('"').strip()
+        return rewrite or question
+
+    def rewrite(self, question: str, history: List[Dict]) -> str:
+        if not self._needs_rewrite(question, history):
+            return question
+        key = self.cache_key(question, history)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            with span("rewrite"):
+                rewrite = self.chain.invoke({"history": format_history(history), "question": question})
+        except Exception as e:
+            log.warning("rewrite_failed", error=type(e).__name__)
+            return question
+        rewrite = self._clean(rewrite, question)
+        self._store(key, rewrite)
+        return rewrite
+
+    async def arewrite(self, question: str, history: List[Dict]) -> str:
+        if not self._needs_rewrite(question, history):
+            return question
+        key = self.cache_key(question, history)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        try:
+            with span("rewrite"):
+                rewrite = await self.chain.ainvoke({"history": format_history(history), "question": question})
+        except Exception as e:
+            log.warning("rewrite_failed", error=type(e).__name__)
+            return question
+        rewrite = self._clean(rewrite, question)
+        self._store(key, rewrite)
+        return rewrite
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+            }
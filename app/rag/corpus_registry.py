@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.rag.logs import get_logger
+
+# Rough per-entry cost of a BM25 posting: (doc, tf) tuple + list slot
+POSTING_BYTES = 72
+
+log = get_logger(__name__)
+
+
+class UnknownCorpusError(KeyError):
+    pass
+
+
+def load_corpora(path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Reads extra corpora from a JSON file of the form
+        {"<corpus_id>": {"rulebook": "<pdf>", "template": "<xlsx>"}, ...}
+    Either source may be omitted; relative paths resolve against the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    return {
+        corpus_id: {
+            key: value if key not in ("rulebook", "template") else os.path.join(base, value)
+            for key, value in spec.items()
+        }
+        for corpus_id, spec in raw.items()
+    }
+
+
+# -------------------------------------------------------
+# IN-MEMORY SIZE OF A BUILT PIPELINE
+# -------------------------------------------------------
+def vector_bytes(vectorstore, n: int) -> int:
+    vectors = getattr(vectorstore, "_vectors", None)
+    if vectors is not None:
+        # Memory-mapped vectors live in the shared page cache; the NumPy
+        # store's matrix is a view of a larger growable buffer
+        if getattr(vectors, "filename", None):
+            return 0
+        return int(getattr(vectorstore, "_buffer", vectors).nbytes)
+
+    # Chroma: the HNSW index holds n float32 vectors of the stored dimension
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is None or not n:
+        return 0
+    sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+    return n * len(sample[0]) * 4 if len(sample) else 0
+
+
+def estimate_pipeline_bytes(pipeline: Dict[str, Any]) -> int:
+    """
+    Estimate of what a corpus pipeline keeps resident: its vectors, the
+    MMR candidate-vector cache, chunk texts (held by the store, the BM25
+    index and the structural index) and BM25 postings. Shared pieces
+    (embedder, LLM, executor) and memory-mapped snapshot files are not
+    counted. The candidate-vector cache is counted at its bound (it fills
+    after the build, and only for stores without in-process vectors).
+    """
+    lexical_index = pipeline["lexical_index"]
+    texts = lexical_index.texts
+    if getattr(texts, "mapped", False):
+        # Mapped texts are shared through the page cache
+        text_bytes = 0
+    else:
+        text_bytes = 3 * sum(len(t) for t in texts)
+    if getattr(lexical_index.postings, "mapped", False):
+        postings = 0
+    else:
+        postings = sum(len(p) for p in lexical_index.postings.values())
+    n = len(lexical_index.ids)
+    vectorstore = pipeline["vectorstore"]
+    stored = vector_bytes(vectorstore, n)
+    cache_bytes = 0
+    vector_cache = pipeline.get("vector_cache")
+    if vector_cache is not None and n and not hasattr(vectorstore, "search_candidates"):
+        cache_bytes = min(vector_cache.max_entries, n) * (stored // n)
+    return (
+        stored
+        + cache_bytes
+        + text_bytes
+        + POSTING_BYTES * postings
+    )
+
+
+# -------------------------------------------------------
+# LAZY, LRU-EVICTED CORPUS REGISTRY
+# -------------------------------------------------------
+class CorpusRegistry:
+    """
+    corpus id → built object (pipeline or service), built on first get().
+
+    Built corpora are kept in LRU order with their estimated size; once
+    the total exceeds `memory_cap_bytes` the least recently used ones are
+    dropped (never the one just requested) and rebuilt on next use, so
+    memory follows the active corpora. memory_cap_bytes=0 disables
+    eviction. Concurrent first requests for a corpus build it once.
+    """
+
+    def __init__(
+        self,
+        builder: Callable[[str], Any],
+        corpus_ids: Iterable[str],
+        memory_cap_bytes: int = 0,
+        sizer: Callable[[Any], int] = lambda obj: 0,
+    ):
+        self.builder = builder
+        self.corpus_ids = list(corpus_ids)
+        self.memory_cap_bytes = memory_cap_bytes
+        self.sizer = sizer
+
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+        self.builds = 0
+        self.evictions = 0
+
+    def _check(self, corpus_id: str):
+        if corpus_id not in self.corpus_ids:
+            raise UnknownCorpusError(corpus_id)
+
+    def peek(self, corpus_id: str) -> Optional[Any]:
+        """The built object if loaded (marked as recently used), else None."""
+        self._check(corpus_id)
+        with self._lock:
+            obj = self._loaded.get(corpus_id)
+            if obj is not None:
+                self._loaded.move_to_end(corpus_id)
+            return obj
+
+    def get(self, corpus_id: str) -> Any:
+        obj = self.peek(corpus_id)
+        if obj is not None:
+            return obj
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(corpus_id, threading.Lock())
+
+        with build_lock:
+            obj = self.peek(corpus_id)
+            if obj is not None:
+                return obj
+
+            log.info("corpus_loading", corpus=corpus_id)
+            obj = self.builder(corpus_id)
+            size = self.sizer(obj)
+
+            with self._lock:
+                self._loaded[corpus_id] = obj
+                self._sizes[corpus_id] = size
+                self.builds += 1
+                self._evict_over_cap(keep=corpus_id)
+            return obj
+
+    async def aget(self, corpus_id: str) -> Any:
+        """get() that builds a cold corpus off the event loop."""
+        obj = self.peek(corpus_id)
+        if obj is not None:
+            return obj
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, corpus_id)
+
+    def _evict_over_cap(self, keep: str):
+        if not self.memory_cap_bytes:
+            return
+        while sum(self._sizes.values()) > self.memory_cap_bytes:
+            victim = next((cid for cid in self._loaded if cid != keep), None)
+            if victim is None:
+                break
+            del self._loaded[victim]
+            freed = self._sizes.pop(victim)
+            self.evictions += 1
+            log.info("corpus_evicted", corpus=victim, freed_mib=round(freed / 2**20, 1))
+
+    def evict(self, corpus_id: str) -> bool:
+        with self._lock:
+            if self._loaded.pop(corpus_id, None) is None:
+                return False
+            self._sizes.pop(corpus_id, None)
+            self.evictions += 1
+            return True
+
+    def loaded(self):
+        """(corpus id, object) for the corpora currently in memory, LRU first."""
+        with self._lock:
+            return list(self._loaded.items())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "corpora": list(self.corpus_ids),
+                "loaded": {cid: self._sizes[cid] for cid in self._loaded},
+                "memory_bytes": sum(self._sizes.values()),
+                "memory_cap_bytes": self.memory_cap_bytes,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
@@ -1,8 +1,18 @@
 import os
+from typing import Optional
+
+import httpx
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 
-def get_embedder(model_name: str = "text-embedding-3-large") -> OpenAIEmbeddings:
+from app.rag.embedding_cache import CachedQueryEmbedder
+from app.rag.tokens import get_token_encoding
+
+def get_embedder(
+    model_name: str = "text-embedding-3-large",
+    http_async_client: Optional[httpx.AsyncClient] = None,
+    max_retries: int = 2,
+) -> OpenAIEmbeddings:
     load_dotenv()  
     openai_api_key = os.getenv("OPENAI_API_KEY")
 
@@ -11,4 +21,40 @@ def get_embedder(model_name: str = "text-embedding-3-large") -> OpenAIEmbeddings
 
     os.environ["OPENAI_API_KEY"] = openai_api_key
 
-    return OpenAIEmbeddings(model=model_name)
\ No newline at end of file
+    # Length-safe embedding tokenizes with tiktoken; where its BPE file can't
+    # be loaded (offline hosts) send text instead — chunks are far below the
+    # model's input limit
+    return OpenAIEmbeddings(
+        model=model_name,
+        http_async_client=http_async_client,
+        check_embedding_ctx_length=get_token_encoding(model_name) is not None,
+        max_retries=max_retries,
+    )
+
+
+def get_ingest_embedder(embeddings):
+    """
+    Document embedder for EmbeddingWriter: the same OpenAI model with the
+    SDK's own retries off, so 429/5xx reach the writer's rate-budgeted
+    retry loop (and its retry counters) instead of being retried unseen.
+    Other Embeddings are returned unchanged.
+    """
+    inner = getattr(embeddings, "embeddings", embeddings)  # unwrap CachedQueryEmbedder
+    if isinstance(inner, OpenAIEmbeddings) and inner.max_retries:
+        return get_embedder(inner.model, max_retries=0)
+    return embeddings
+
+
+def get_cached_embedder(
+    model_name: str = "text-embedding-3-large",
+    max_entries: int = 1024,
+    cache_path: Optional[str] = None,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+) -> CachedQueryEmbedder:
+    """get_embedder() wrapped in an LRU (+ optional on-disk) query cache."""
+    return CachedQueryEmbedder(
+        get_embedder(model_name, http_async_client=http_async_client),
+        model_name=model_name,
+        max_entries=max_entries,
+        cache_path=cache_path,
+    )
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace-insensitive form used as the cache key."""
+    return " ".join(text.lower().split())
+
+
+# -------------------------------------------------------
+# CACHING EMBEDDER (LRU in memory + optional SQLite tier)
+# -------------------------------------------------------
+class CachedQueryEmbedder(Embeddings):
+    """
+    Wraps an Embeddings instance and caches embed_query results.
+
+    Keys are sha256(model name + normalized query). Hits are served from a
+    bounded in-memory LRU first, then from an optional on-disk SQLite file
+    that survives restarts. embed_documents is passed straight through,
+    since ingest is already deduplicated by content hash.
+
+    The async methods check the LRU inline and never touch SQLite on the
+    event loop: disk lookups run on a single cache thread and disk writes
+    are queued to it (write-behind).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: Optional[str] = None,
+        max_entries: int = 1024,
+        cache_path: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.model = model_name or str(
+            getattr(embeddings, "model", None) or type(embeddings).__name__
+        )
+        self.max_entries = max_entries
+        self.cache_path = cache_path
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._disk_executor: Optional[ThreadPoolExecutor] = None
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+            self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-cache")
+
+    # ---- keys / tiers ----
+    def cache_key(self, text: str) -> str:
+        payload = f"{self.model}\x00{normalize_query(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+            return vector
+
+    def _get_disk(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Disk tier lookup for LRU misses; found vectors are promoted to the LRU."""
+        found = {}
+        if self._db is not None:
+            with self._db_lock:
+                for key in keys:
+                    row = self._db.execute(
+                        "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        found[key] = array("d", row[0]).tolist()
+        with self._lock:
+            for key, vector in found.items():
+                self._remember(key, vector)
+            self.hits += len(found)
+            self.disk_hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        vector = self._get_memory(key)
+        if vector is None:
+            vector = self._get_disk([key]).get(key)
+        return vector
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _put_disk(self, items: Sequence[Tuple[str, List[float]]]):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("d", vector).tobytes()) for key, vector in items],
+            )
+            self._db.commit()
+
+    def _put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._remember(key, vector)
+        if self._db is not None:
+            self._put_disk([(key, vector)])
+
+    # ---- async tiers (SQLite on the cache thread, never on the event loop) ----
+    async def _aget_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        vectors = [self._get_memory(k) for k in keys]
+        missing = [k for k, v in zip(keys, vectors) if v is None]
+        if missing:
+            if self._disk_executor is not None:
+                found = await asyncio.get_running_loop().run_in_executor(
+                    self._disk_executor, self._get_disk, missing
+                )
+            else:
+                found = self._get_disk(missing)
+            vectors = [v if v is not None else found.get(k) for k, v in zip(keys, vectors)]
+        return vectors
+
+    def _aput_many(self, items: List[Tuple[str, List[float]]]):
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+        if self._disk_executor is not None:
+            self._disk_executor.submit(self._put_disk, items)
+
+    # ---- Embeddings interface ----
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = (await self._aget_many([key]))[0]
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self._aput_many([(key, vector)])
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Cached embed_query for many texts: cache misses are sent upstream
+        in a single batched embeddings request.
+        """
+        keys = [self.cache_key(t) for t in texts]
+        vectors = await self._aget_many(keys)
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = await self.embeddings.aembed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            self._aput_many([(keys[i], vectors[i]) for i in missing])
+        return vectors
+
+    # ---- stats ----
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._memory),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM query_embeddings")
+                self._db.commit()
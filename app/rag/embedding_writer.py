@@ -0,0 +1,254 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from app.rag.logs import get_logger
+from app.rag.metrics import EMBEDDING_RETRIES, EMBEDDING_TOKENS
+from app.rag.tokens import count_tokens, get_token_encoding
+
+# OpenAI embedding request limits
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+log = get_logger(__name__)
+
+
+# -------------------------------------------------------
+# RETRY CLASSIFICATION
+# -------------------------------------------------------
+def is_retryable(exc: BaseException) -> bool:
+    """429s, timeouts, connection drops and 5xx are worth retrying."""
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS or (status is not None and status >= 500)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on the failed response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if name == "retry-after-ms" else seconds
+    return None
+
+
+# -------------------------------------------------------
+# TOKENS-PER-MINUTE / REQUESTS-PER-MINUTE BUDGET
+# -------------------------------------------------------
+class RateLimiter:
+    """
+    Two token buckets (tokens and requests) refilled continuously at
+    budget / 60 per second. acquire() blocks until both can be paid.
+    A budget of 0 disables that bucket.
+    """
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until `tokens` and one request fit; returns seconds waited."""
+        # A single request larger than the whole budget waits for a full bucket
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                token_deficit = tokens - self._tokens if self.tokens_per_minute else 0.0
+                request_deficit = 1 - self._requests if self.requests_per_minute else 0.0
+
+                if token_deficit <= 0 and request_deficit <= 0:
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    return waited
+
+                wait = max(
+                    token_deficit * 60 / self.tokens_per_minute if token_deficit > 0 else 0.0,
+                    request_deficit * 60 / self.requests_per_minute if request_deficit > 0 else 0.0,
+                )
+            time.sleep(wait)
+            waited += wait
+
+
+# -------------------------------------------------------
+# ON-DISK EMBEDDING CHECKPOINT
+# -------------------------------------------------------
+class EmbeddingCheckpoint:
+    """
+    SQLite table of chunk vectors keyed by sha256(model + text), written as
+    soon as a batch comes back. An interrupted or repeated ingest (or one
+    into a different backend) only pays for texts never embedded before.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.model = model_name
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS doc_embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, List[float]]:
+        """Position → vector for the texts already checkpointed."""
+        keys = [self.key(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM doc_embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update((k, array("d", v).tolist()) for k, v in rows)
+        return {i: found[k] for i, k in enumerate(keys) if k in found}
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO doc_embeddings (key, vector) VALUES (?, ?)",
+                [(self.key(t), array("d", v).tobytes()) for t, v in zip(texts, vectors)],
+            )
+            self._db.commit()
+
+
+# -------------------------------------------------------
+# BUDGETED, RETRYING EMBEDDING WRITER
+# -------------------------------------------------------
+class EmbeddingWriter:
+    """
+    Embeds document batches for ingest. Thread-safe: several ingest
+    workers share one writer, so they share its rate budget.
+
+    Each call looks texts up in the optional checkpoint, waits for the
+    batch's tokens under the TPM/RPM budget, calls embed_documents and
+    retries retryable failures with exponential backoff and full jitter
+    (a Retry-After hint, when present, is the minimum wait).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: Optional[str] = None,
+        tokens_per_minute: int = 0,
+        requests_per_minute: int = 0,
+        max_batch_tokens: int = MAX_TOKENS_PER_REQUEST,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        checkpoint_path: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.model = model_name or str(
+            getattr(embeddings, "model", None) or type(embeddings).__name__
+        )
+        self.encoding = get_token_encoding(self.model)
+        self.limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+        self.max_batch_tokens = min(max_batch_tokens, MAX_TOKENS_PER_REQUEST)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.checkpoint = (
+            EmbeddingCheckpoint(checkpoint_path, self.model) if checkpoint_path else None
+        )
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.tokens = 0
+        self.checkpoint_hits = 0
+        self.throttled_s = 0.0
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.encoding)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _call(self, texts: List[str], tokens: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self._count(throttled_s=self.limiter.acquire(tokens))
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                self._count(requests=1, tokens=tokens)
+                EMBEDDING_TOKENS.inc(tokens)
+                return vectors
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_retryable(exc):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                delay = max(delay, retry_after(exc) or 0.0)
+                attempt += 1
+                self._count(retries=1)
+                EMBEDDING_RETRIES.inc()
+                log.warning("embedding_retry", error=type(exc).__name__, attempt=attempt, delay_s=round(delay, 2))
+                time.sleep(delay)
+
+    def embed(self, texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        if token_counts is None:
+            token_counts = [self.count_tokens(t) for t in texts]
+
+        vectors: Dict[int, List[float]] = (
+            self.checkpoint.get_many(texts) if self.checkpoint is not None else {}
+        )
+        self._count(checkpoint_hits=len(vectors))
+
+        missing = [i for i in range(len(texts)) if i not in vectors]
+        if missing:
+            fresh = self._call([texts[i] for i in missing], sum(token_counts[i] for i in missing))
+            if self.checkpoint is not None:
+                self.checkpoint.put_many([texts[i] for i in missing], fresh)
+            vectors.update(zip(missing, fresh))
+
+        return [vectors[i] for i in range(len(texts))]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "tokens": self.tokens,
+                "checkpoint_hits": self.checkpoint_hits,
+                "throttled_s": round(self.throttled_s, 3),
+            }
@@ -1,38 +1,155 @@
-def format_docs(docs):
-    formatted = []
+import re
+from typing import Dict, List, Optional, Tuple
 
+from app.rag.tokens import count_tokens
+
+# Structural header chunk_rulebook prepends to every rulebook chunk; the
+# reference line below already carries the same fields
+structural_header_re = re.compile(
+    r"^(?:(?:Chapter|Title|Article|Section|Subsection|Roman): .*\n)+\n"
+)
+
+# Shortest suffix/prefix match treated as splitter overlap. Adjacent
+# rulebook chunks (chunk_overlap=100) mostly overlap by 70-99 chars; a
+# floor this close to chunk_overlap keeps boilerplate phrases from
+# stitching unrelated chunks together
+MIN_OVERLAP_CHARS = 60
+
+DOC_SEPARATOR = "\n\n---\n\n"
+
+
+def reference_header(md: dict) -> str:
+    ref_parts = []
+
+    # Rulebook metadata
+    if md.get("chapter"):
+        ref_parts.append(f"Chapter: {md['chapter']}")
+    if md.get("title"):
+        ref_parts.append(f"Title: {md['title']}")
+    if md.get("article"):
+        ref_parts.append(f"Article: {md['article']}")
+    if md.get("section"):
+        ref_parts.append(f"Section: {md['section']}")
+    if md.get("subsection"):
+        ref_parts.append(f"Subsection: {md['subsection']}")
+    if md.get("page") is not None:
+        ref_parts.append(f"Page: {md['page']}")
+
+    # Template metadata
+    if md.get("template_sheet"):
+        ref_parts.append(f"Sheet: {md['template_sheet']}")
+    if md.get("row"):
+        ref_parts.append(f"Row: {md['row']}")
+    if md.get("id_hierarchy"):
+        ref_parts.append(f"ID: {md['id_hierarchy']}")
+
+    # Source type
+    if md.get("doc_type"):
+        ref_parts.append(f"Source: {md['doc_type']}")
+
+    return " | ".join(ref_parts)
+
+
+def strip_structural_header(text: str) -> str:
+    return structural_header_re.sub("", text, count=1).lstrip("\n")
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    if len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    # Only suffixes starting with right's first MIN_OVERLAP_CHARS can match;
+    # str.find skips to those candidates instead of testing every offset
+    probe = right[:MIN_OVERLAP_CHARS]
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def merge_spans(bodies: List[str]) -> List[str]:
+    """
+    Folds chunk bodies of one source (same reference header, in rank
+    order) into contiguous spans: contained chunks are dropped and a chunk
+    is stitched onto a span only at its ends, i.e. when it is the span's
+    splitter neighbour. A chunk that bridges two spans joins them.
+    """
+    spans: List[str] = []
+    for body in bodies:
+        if any(body in span for span in spans):
+            continue
+
+        # Neighbour spans: one ending where body starts, one starting
+        # where body ends
+        before = after = None
+        for i, span in enumerate(spans):
+            if before is None:
+                k = overlap_length(span, body)
+                if k:
+                    before = (i, k)
+                    continue
+            if after is None:
+                k = overlap_length(body, span)
+                if k:
+                    after = (i, k)
+
+        merged = body
+        if before is not None:
+            i, k = before
+            merged = spans[i] + merged[k:]
+        if after is not None:
+            i, k = after
+            merged = merged + spans[i][k:]
+
+        joined = sorted({i for i, _ in filter(None, (before, after))})
+        if not joined:
+            spans.append(merged)
+            continue
+        spans[joined[0]] = merged
+        for i in reversed(joined[1:]):
+            del spans[i]
+    return spans
+
+
+def assemble_context(docs) -> str:
+    """
+    Groups docs by reference header (first-seen rank order), emits each
+    header once and merges overlapping chunks under it.
+    """
+    groups: Dict[str, List[str]] = {}
     for d in docs:
-        md = d.metadata
-        ref_parts = []
-
-        # Rulebook metadata
-        if md.get("chapter"):
-            ref_parts.append(f"Chapter: {md['chapter']}")
-        if md.get("title"):
-            ref_parts.append(f"Title: {md['title']}")
-        if md.get("article"):
-            ref_parts.append(f"Article: {md['article']}")
-        if md.get("section"):
-            ref_parts.append(f"Section: {md['section']}")
-        if md.get("subsection"):
-            ref_parts.append(f"Subsection: {md['subsection']}")
-        if md.get("page") is not None:
-            ref_parts.append(f"Page: {md['page']}")
-
-        # Template metadata
-        if md.get("template_sheet"):
-            ref_parts.append(f"Sheet: {md['template_sheet']}")
-        if md.get("row"):
-            ref_parts.append(f"Row: {md['row']}")
-        if md.get("id_hierarchy"):
-            ref_parts.append(f"ID: {md['id_hierarchy']}")
-
-        # Source type
-        if md.get("doc_type"):
-            ref_parts.append(f"Source: {md['doc_type']}")
-
-        header = " | ".join(ref_parts)
-
-        formatted.append(f"[{header}]\n{d.page_content}")
-
-    return "\n\n---\n\n".join(formatted)
\ No newline at end of file
+        body = d.page_content
+        if d.metadata.get("doc_type") == "pra_rulebook":
+            body = strip_structural_header(body)
+        groups.setdefault(reference_header(d.metadata), []).append(body)
+
+    formatted = [
+        f"[{header}]\n" + "\n\n".join(merge_spans(bodies))
+        for header, bodies in groups.items()
+    ]
+    return DOC_SEPARATOR.join(formatted)
+
+
+def format_docs(docs, max_tokens: Optional[int] = None, encoding=None) -> Tuple[str, list]:
+    """
+    (context string for the prompt, docs it was built from). Docs are
+    expected in rank order; when the assembled context exceeds `max_tokens`
+    the lowest-ranked docs are dropped first (the top-ranked doc is always
+    kept), so the returned docs are the rank prefix the LLM actually sees.
+    """
+    docs = list(docs)
+    context = assemble_context(docs)
+    if not max_tokens or count_tokens(context, encoding) <= max_tokens:
+        return context, docs
+
+    # Longest rank prefix that fits (context size grows with the prefix)
+    lo, hi = 1, len(docs) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(assemble_context(docs[:mid]), encoding) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return assemble_context(docs[:lo]), docs[:lo]
@@ -0,0 +1,291 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_core.documents import Document
+
+from app.rag.embedding_writer import EmbeddingWriter
+from app.rag.logs import get_logger
+from app.rag.rulebook_chunker import chunk_rulebook, iter_chunk_rulebook
+from app.rag.rulebook_loader import MIN_PAGES_PER_SHARD, load_rulebook, shard_ranges
+from app.rag.template_chunker import chunk_template_excel
+from app.rag.template_loader import load_template_excel
+from app.rag.vector_db import (
+    compute_doc_id,
+    flush_vector_db,
+    get_embedding_model_name,
+    insert_embeddings,
+    prepare_documents,
+)
+
+log = get_logger(__name__)
+
+_DONE = object()
+
+
+# -------------------------------------------------------
+# DOCUMENT SOURCES (generators, consumed lazily)
+# -------------------------------------------------------
+def iter_rulebook_documents(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    chunk_size: int = 700,
+    chunk_overlap: int = 100,
+) -> Iterable[Document]:
+    """
+    Rulebook chunks as pages are parsed. PDFs large enough for the
+    process pool (workers=None: all CPUs) are parsed/chunked in parallel
+    and then yielded.
+    """
+    import pymupdf
+
+    workers = workers or os.cpu_count() or 1
+
+    with pymupdf.open(pdf_path) as doc:
+        total_pages = len(doc)
+
+    if len(shard_ranges(total_pages, workers, MIN_PAGES_PER_SHARD)) > 1:
+        yield from chunk_rulebook(
+            load_rulebook(pdf_path, workers=workers),
+            workers=workers,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+        )
+    else:
+        yield from iter_chunk_rulebook(PyMuPDFLoader(pdf_path).lazy_load(), chunk_size, chunk_overlap)
+
+
+def iter_template_documents(excel_path: str) -> Iterable[Document]:
+    # Continuation rows can merge across sheets, so the workbook is
+    # chunked as a whole; it is small next to the rulebook
+    yield from chunk_template_excel(load_template_excel(excel_path))
+
+
+# -------------------------------------------------------
+# PER-STAGE PROGRESS / BACKPRESSURE
+# -------------------------------------------------------
+class StageStats:
+    """Items through a stage, time spent working and time blocked downstream."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self.blocked_s = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int = 0, busy_s: float = 0.0, blocked_s: float = 0.0):
+        with self._lock:
+            self.items += items
+            self.busy_s += busy_s
+            self.blocked_s += blocked_s
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "items": self.items,
+                "busy_s": round(self.busy_s, 3),
+                "blocked_s": round(self.blocked_s, 3),
+            }
+
+
+def _put(q: queue.Queue, item, stats: StageStats):
+    start = time.perf_counter()
+    q.put(item)
+    stats.record(blocked_s=time.perf_counter() - start)
+
+
+# -------------------------------------------------------
+# STREAMING INGEST (source → embed → insert)
+# -------------------------------------------------------
+def run_ingest(
+    vectorstore,
+    sources: Dict[str, Callable[[], Iterable[Document]]],
+    model_name: Optional[str] = None,
+    batch_size: int = 64,
+    embed_workers: int = 4,
+    queue_size: int = 8,
+    progress_every: float = 5.0,
+    writer: Optional[EmbeddingWriter] = None,
+) -> Dict[str, object]:
+    """
+    Streams every source into the vector store and syncs it to exactly the
+    produced chunks, with the same result shape as sync_documents_to_db.
+
+    Each source runs in its own thread and hashes chunks as they appear;
+    only chunks missing from the store are packed into batches of at most
+    `batch_size` chunks and writer.max_batch_tokens tiktoken tokens, put
+    on a bounded queue, embedded through `writer` (rate budget, retries,
+    checkpoint) by `embed_workers` threads and inserted by the calling
+    thread. Full queues block the producers (backpressure), so at most
+    ~2 * queue_size batches of vectors are in memory at once. Chunk
+    texts are not bounded: every produced Document is kept, since the
+    result's "docs" feed the BM25 and structural indexes, so that part
+    grows with the corpus text (small next to its vectors). Chroma
+    writes each batch through; the NumPy store is persisted once at the
+    end (also on failure), so a rerun resumes with what is still missing.
+    """
+    embeddings = vectorstore.embeddings
+    if model_name is None:
+        model_name = get_embedding_model_name(embeddings)
+    if writer is None:
+        writer = EmbeddingWriter(embeddings)
+
+    started = time.perf_counter()
+    existing = set(vectorstore.get(include=[])["ids"])
+
+    embed_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    insert_q: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    stats = {name: StageStats(f"source:{name}") for name in sources}
+    stats["embed"] = StageStats("embed")
+    stats["insert"] = StageStats("insert")
+
+    produced: Dict[str, Dict[str, Document]] = {name: {} for name in sources}
+    queued: set = set()
+    queued_lock = threading.Lock()
+    errors: List[BaseException] = []
+
+    # ---- stage 1: one producer per source ----
+    def produce(name: str, factory: Callable[[], Iterable[Document]]):
+        source_stats = stats[name]
+        wanted = produced[name]
+        batch: List[Document] = []
+        batch_tokens: List[int] = []
+        try:
+            start = time.perf_counter()
+            for doc in factory():
+                prepared = prepare_documents([doc])
+                if not prepared:
+                    continue  # invalid item, already logged
+                d = prepared[0]
+                d.id = compute_doc_id(d, model_name)
+                if d.id in wanted:
+                    continue
+                wanted[d.id] = d
+
+                with queued_lock:
+                    is_new = d.id not in existing and d.id not in queued
+                    queued.add(d.id)
+                if not is_new:
+                    continue
+
+                tokens = writer.count_tokens(d.page_content)
+                if batch and (
+                    len(batch) >= batch_size
+                    or sum(batch_tokens) + tokens > writer.max_batch_tokens
+                ):
+                    source_stats.record(items=len(batch), busy_s=time.perf_counter() - start)
+                    _put(embed_q, (batch, batch_tokens), source_stats)
+                    batch, batch_tokens = [], []
+                    start = time.perf_counter()
+
+                batch.append(d)
+                batch_tokens.append(tokens)
+
+            source_stats.record(items=len(batch), busy_s=time.perf_counter() - start)
+            if batch:
+                _put(embed_q, (batch, batch_tokens), source_stats)
+        except BaseException as exc:
+            errors.append(exc)
+
+    # ---- stage 2: embedding workers ----
+    def embed():
+        while True:
+            item = embed_q.get()
+            if item is _DONE:
+                insert_q.put(_DONE)
+                return
+            if errors:
+                continue  # drain so producers never block forever
+            batch, batch_tokens = item
+            try:
+                start = time.perf_counter()
+                vectors = writer.embed([d.page_content for d in batch], batch_tokens)
+                stats["embed"].record(items=len(batch), busy_s=time.perf_counter() - start)
+                _put(insert_q, (batch, vectors), stats["embed"])
+            except BaseException as exc:
+                errors.append(exc)
+
+    producers = [
+        threading.Thread(target=produce, args=(name, factory), name=f"ingest-{name}", daemon=True)
+        for name, factory in sources.items()
+    ]
+    embedders = [
+        threading.Thread(target=embed, name=f"ingest-embed-{i}", daemon=True)
+        for i in range(max(1, embed_workers))
+    ]
+    for t in producers + embedders:
+        t.start()
+
+    def close_embed_queue():
+        for t in producers:
+            t.join()
+        for _ in embedders:
+            embed_q.put(_DONE)
+
+    threading.Thread(target=close_embed_queue, name="ingest-close", daemon=True).start()
+
+    # ---- stage 3: single writer (this thread) ----
+    last_report = time.perf_counter()
+    finished = 0
+    while finished < len(embedders):
+        item = insert_q.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        if errors:
+            continue
+        batch, vectors = item
+        try:
+            start = time.perf_counter()
+            insert_embeddings(vectorstore, batch, vectors, [d.id for d in batch])
+            stats["insert"].record(items=len(batch), busy_s=time.perf_counter() - start)
+        except BaseException as exc:
+            errors.append(exc)
+
+        if time.perf_counter() - last_report >= progress_every:
+            last_report = time.perf_counter()
+            log.info(
+                "ingest_progress",
+                **{k: s.snapshot()["items"] for k, s in stats.items()},
+                embedding=writer.stats(),
+            )
+
+    if errors:
+        flush_vector_db(vectorstore)
+        raise errors[0]
+
+    # ---- sync: drop chunks no source produced any more ----
+    wanted: Dict[str, Document] = {}
+    for name in sources:
+        for doc_id, d in produced[name].items():
+            wanted.setdefault(doc_id, d)
+
+    stale_ids = [i for i in existing if i not in wanted]
+    for i in range(0, len(stale_ids), 160):
+        vectorstore.delete(ids=stale_ids[i:i + 160])
+    flush_vector_db(vectorstore)
+
+    added = stats["insert"].items
+    log.info(
+        "ingest_done",
+        seconds=round(time.perf_counter() - started, 1),
+        docs=len(wanted),
+        added=added,
+        stale=len(stale_ids),
+        stages={s.name: s.snapshot() for s in stats.values()},
+        embedding=writer.stats(),
+    )
+
+    return {
+        "ids": sorted(wanted),
+        "docs": wanted,
+        "added": added,
+        "deleted": len(stale_ids),
+        "stages": {name: s.snapshot() for name, s in stats.items()},
+        "embedding": writer.stats(),
+    }
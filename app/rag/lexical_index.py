@@ -0,0 +1,224 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Identifier-friendly tokens: "article", "2", "72.00", "1.1.2.3", "0030"
+token_re = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+zero_decimal_re = re.compile(r"^(\d+)\.0+$")
+
+# Keywords whose following number forms a compound token ("article:2")
+IDENTIFIER_KEYWORDS = {"article", "row", "sheet", "section", "id", "c", "template", "line"}
+
+# Bump when tokenize() / identifier_text() change output, so persisted
+# postings built with the old rules are rebuilt instead of reused
+TOKENIZER_VERSION = 1
+
+
+def normalize_token(tok: str) -> str:
+    # "0030" → "30", "72.00" → "72"
+    m = zero_decimal_re.match(tok)
+    if m:
+        tok = m.group(1)
+    if tok.isdigit():
+        tok = tok.lstrip("0") or "0"
+    return tok
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = [normalize_token(t) for t in token_re.findall(text.lower())]
+
+    compounds = []
+    for prev, tok in zip(tokens, tokens[1:]):
+        if prev in IDENTIFIER_KEYWORDS and tok[0].isdigit():
+            compounds.append(f"{prev}:{tok}")
+
+    return tokens + compounds
+
+
+def identifier_text(metadata: dict) -> str:
+    """Structural identifiers from metadata, so BM25 can match them."""
+    parts = []
+    if metadata.get("article") not in (None, "None"):
+        parts.append(str(metadata["article"]))
+    if metadata.get("section") not in (None, "None"):
+        parts.append(f"section {metadata['section']}")
+    if metadata.get("template_sheet") not in (None, "None"):
+        parts.append(f"sheet {metadata['template_sheet']} c {metadata['template_sheet']}")
+    if metadata.get("row") not in (None, "None"):
+        parts.append(f"row {metadata['row']}")
+    if metadata.get("id_hierarchy") not in (None, "None"):
+        parts.append(f"id {metadata['id_hierarchy']}")
+    return " ".join(parts)
+
+
+def corpus_fingerprint(ids: List[str]) -> str:
+    h = hashlib.sha256()
+    for doc_id in sorted(ids):
+        h.update(doc_id.encode("utf-8"))
+    return h.hexdigest()
+
+
+def index_fingerprint(ids: List[str]) -> str:
+    """corpus_fingerprint plus the tokenizer version the postings use."""
+    payload = f"tokenizer={TOKENIZER_VERSION}\x00{corpus_fingerprint(ids)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------------
+# BM25 INVERTED INDEX
+# -------------------------------------------------------
+class BM25Index:
+    """In-process Okapi BM25 over the same chunks stored in the vector DB."""
+
+    def __init__(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        postings: Dict[str, List[Tuple[int, int]]],
+        doc_lengths: List[int],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        n = len(ids)
+        self.avg_length = (sum(doc_lengths) / n) if n else 0.0
+        self.idf = {
+            tok: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for tok, p in postings.items()
+        }
+        self.fingerprint = index_fingerprint(ids)
+
+    @classmethod
+    def from_documents(cls, docs: List[Document], ids: List[str]) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = []
+
+        for idx, doc in enumerate(docs):
+            tokens = tokenize(doc.page_content + " " + identifier_text(doc.metadata))
+            doc_lengths.append(len(tokens))
+            for tok, tf in Counter(tokens).items():
+                postings.setdefault(tok, []).append((idx, tf))
+
+        return cls(
+            ids=list(ids),
+            texts=[d.page_content for d in docs],
+            metadatas=[dict(d.metadata) for d in docs],
+            postings=postings,
+            doc_lengths=doc_lengths,
+        )
+
+    # ---- persistence (JSON next to the Chroma directory) ----
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "ids": self.ids,
+                    "texts": self.texts,
+                    "metadatas": self.metadatas,
+                    "postings": self.postings,
+                    "doc_lengths": self.doc_lengths,
+                    "k1": self.k1,
+                    "b": self.b,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(
+            ids=data["ids"],
+            texts=data["texts"],
+            metadatas=data["metadatas"],
+            postings={t: [tuple(p) for p in ps] for t, ps in data["postings"].items()},
+            doc_lengths=data["doc_lengths"],
+            k1=data["k1"],
+            b=data["b"],
+        )
+        # The saved fingerprint records what the postings were built with
+        index.fingerprint = data["fingerprint"]
+        return index
+
+    # ---- search ----
+    def _matches(self, idx: int, filter: Optional[dict]) -> bool:
+        if not filter:
+            return True
+        md = self.metadatas[idx]
+        return all(md.get(k) == v for k, v in filter.items())
+
+    def search_scores(self, query: str, k: int, filter: Optional[dict] = None) -> List[Tuple[int, float]]:
+        scores: Dict[int, float] = {}
+        for tok in set(tokenize(query)):
+            plist = self.postings.get(tok)
+            if not plist:
+                continue
+            idf = self.idf[tok]
+            for idx, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[idx] / self.avg_length)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = (
+            (idx, s) for idx, s in scores.items() if self._matches(idx, filter)
+        )
+        return heapq.nlargest(k, candidates, key=lambda x: x[1])
+
+    def search(self, query: str, k: int, filter: Optional[dict] = None) -> List[Document]:
+        return [
+            Document(id=self.ids[idx], page_content=self.texts[idx], metadata=dict(self.metadatas[idx]))
+            for idx, _ in self.search_scores(query, k, filter)
+        ]
+
+
+# -------------------------------------------------------
+# RECIPROCAL RANK FUSION
+# -------------------------------------------------------
+def doc_key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Document] = {}
+
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            first_seen.setdefault(key, doc)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [first_seen[key] for key in ranked[:k]]
+
+
+def load_or_build_bm25(path: str, docs: List[Document], ids: List[str]) -> BM25Index:
+    """Reuses the persisted index when it was built from the same chunk ids and tokenizer."""
+    index = BM25Index.load(path)
+    if index is not None and index.fingerprint == index_fingerprint(ids):
+        return index
+
+    index = BM25Index.from_documents(docs, ids)
+    index.save(path)
+    return index
@@ -0,0 +1,69 @@
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_openai import ChatOpenAI
+
+from app.rag.metrics import LLM_TOKENS, STAGE_ERRORS, STAGE_SECONDS
+
+
+def get_async_http_client(
+    max_connections: int = 200,
+    max_keepalive_connections: int = 50,
+    timeout: float = 60.0,
+) -> httpx.AsyncClient:
+    """Shared pooled client for the async OpenAI chat + embedding calls."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        ),
+        timeout=timeout,
+    )
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records LLM call latency (stage "llm"), token usage and errors."""
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm")
+
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._started.pop(run_id, None)
+        STAGE_ERRORS.inc(stage="llm", error=type(error).__name__)
+
+
+def get_llm(
+    model_name: str = "gpt-4.1-mini",
+    temperature: float = 0.0,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model_name,
+        temperature=temperature,
+        http_async_client=http_async_client,
+        # Usage on streamed responses too, for rag_llm_tokens_total
+        stream_usage=True,
+        callbacks=[LLMMetricsHandler()],
+    )
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Level, output format ("text" = key=value, "json" = one object per line)
+# and per-event rate limit: at most LOG_RATE_LIMIT records per event per
+# LOG_RATE_WINDOW seconds (0 = unlimited); the next record that gets
+# through carries suppressed=<n>
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+
+ROOT_LOGGER = "app"
+
+
+# -------------------------------------------------------
+# FORMATTERS
+# -------------------------------------------------------
+def _text_value(value) -> str:
+    text = str(value)
+    return json.dumps(text) if not text or any(c in text for c in ' ="\n') else text
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", {})
+        parts = [
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            record.levelname,
+            record.name,
+            record.getMessage(),
+        ]
+        parts.extend(f"{k}={_text_value(v)}" for k, v in fields.items())
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+# -------------------------------------------------------
+# PER-EVENT RATE LIMIT
+# -------------------------------------------------------
+class RateLimiter:
+    """Fixed window per (logger, event); counts what it drops."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._windows: Dict[Tuple[str, str], list] = {}  # key → [start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def allow(self, key: Tuple[str, str]) -> Optional[int]:
+        """None to drop the record, else the number dropped since the last one."""
+        if self.limit <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+                return suppressed
+            if state[1] < self.limit:
+                state[1] += 1
+                suppressed, state[2] = state[2], 0
+                return suppressed
+            state[2] += 1
+            return None
+
+
+_limiter = RateLimiter(LOG_RATE_LIMIT, LOG_RATE_WINDOW)
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Installs one stderr handler on the "app" logger (idempotent)."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.setLevel(level)
+        root.propagate = False
+        _configured = True
+
+
+# -------------------------------------------------------
+# STRUCTURED LOGGER
+# -------------------------------------------------------
+class StructuredLogger:
+    """
+    log.info("event_name", key=value, ...). The level check comes first,
+    so disabled levels cost one method call; enabled records pass the
+    per-event rate limit before anything is formatted.
+    """
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None):
+        if not self._logger.isEnabledFor(level):
+            return
+        suppressed = _limiter.allow((self._logger.name, event))
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    configure_logging()
+    return StructuredLogger(name)
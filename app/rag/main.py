@@ -1,17 +1,33 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from app.rag.rulebook_loader import load_rulebook
-from app.rag.template_loader import load_template_excel
-from app.rag.rulebook_chunker import chunk_rulebook
-from app.rag.template_chunker import chunk_template_excel
-from app.rag.embedder import get_embedder
-from app.rag.vector_db import create_vector_db, add_documents_to_db
-from app.rag.retriever import get_combined_retriever
-from app.rag.prompt_builder import get_regulatory_prompt
+from app.rag.corpus_registry import load_corpora
+from app.rag.ingest import iter_rulebook_documents, iter_template_documents, run_ingest
+from app.rag.embedder import get_cached_embedder, get_ingest_embedder
+from app.rag.embedding_writer import EmbeddingWriter
+from app.rag.vector_db import create_vector_db, get_embedding_model_name
+from app.rag.mmap_store import MappedVectorStore, snapshot_lock, source_fingerprint, write_snapshot
+from app.rag.mmr import VectorCache
+from app.rag.numpy_store import NumpyVectorStore
+from app.rag.retriever import DEFAULT_FETCH_K, DEFAULT_K, DEFAULT_LAMBDA_MULT, get_combined_retriever
+from app.rag.lexical_index import TOKENIZER_VERSION, load_or_build_bm25
+from app.rag.logs import get_logger
+from app.rag.structural_index import StructuralIndex
+from app.rag.scope_classifier import ScopeClassifier
+from app.rag.prompt_builder import get_regulatory_prompt, get_rewrite_prompt
+from app.rag.conversation import QueryRewriter, SessionStore
+from app.rag.tokens import get_token_encoding
+from app.rag.answer_cache import AnswerCache, compute_corpus_version
 from app.rag.rag_pipeline import (
     build_combined_rag,
+    build_combined_rag_with_sources,
+    build_answer_chain,
+    get_context_formatter,
 )
-from langchain_openai import ChatOpenAI
+from app.rag.llm import get_async_http_client, get_llm
+
+
+log = get_logger(__name__)
 
 
 # CONFIG
@@ -19,63 +35,373 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 RULEBOOK_PATH = os.path.join(BASE_DIR, "data", "Liquidity Coverage Ratio (CRR)_26-11-2025.pdf")
 TEMPLATE_PATH = os.path.join(BASE_DIR, "data", "Annex XXIV - LCR templates_for publication.xlsx")
-PERSIST_DIR = os.path.join(BASE_DIR, "chroma_pra_lcr_db")
+# Vector backend: "chroma" (default), "numpy" (in-process brute force) or
+# "mmap" (read-only snapshot built once, memory-mapped by every worker)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Where vector stores and BM25 indexes are written (default: next to this file)
+INDEX_DIR = os.getenv("INDEX_DIR", BASE_DIR)
+PERSIST_DIR = os.path.join(INDEX_DIR, f"{VECTOR_BACKEND}_pra_lcr_db")
+BM25_PATH = os.path.join(INDEX_DIR, "bm25_pra_lcr_index.json")
 
+# Corpora: DEFAULT_CORPUS is the files above; CORPORA_PATH names a JSON file
+# of further corpora ({"id": {"rulebook": ..., "template": ...}}). Each is
+# built on first use; least recently used ones are dropped from memory
+# above CORPUS_MEMORY_CAP_MB (0 = no cap)
+DEFAULT_CORPUS = "pra_lcr"
+CORPORA_PATH = os.getenv("CORPORA_PATH", "")
+EXTRA_CORPORA = load_corpora(CORPORA_PATH) if CORPORA_PATH else {}
+CORPUS_MEMORY_CAP_MB = float(os.getenv("CORPUS_MEMORY_CAP_MB", "2048"))
 
-# MAIN PIPELINE
-def build_pipeline():
+# Query-embedding cache (set QUERY_CACHE_PATH="" to keep it memory-only)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_PATH = os.getenv(
+    "QUERY_CACHE_PATH", os.path.join(BASE_DIR, "cache", "query_embeddings.sqlite")
+)
 
-    print("Loading Rulebook PDF...")
-    rulebook_docs_raw = load_rulebook(RULEBOOK_PATH)
-    print(f"Loaded {len(rulebook_docs_raw)} pages.")
+# Answer cache (exact + paraphrase matches, invalidated on corpus/prompt change)
+LLM_MODEL = "gpt-4.1-mini"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.97"))
 
-    print("Chunking Rulebook...")
-    rulebook_chunks = chunk_rulebook(rulebook_docs_raw)
-    print(f"Rulebook chunks: {len(rulebook_chunks)}")
+# Async serving: pooled OpenAI connections + bounded pool for blocking DB calls
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+VECTOR_DB_WORKERS = int(os.getenv("VECTOR_DB_WORKERS", "16"))
 
-    print("Loading Template Excel...")
-    xls = load_template_excel(TEMPLATE_PATH)
+# Retrieval / chunking knobs (pick with python -m benchmarks.tune_retrieval).
+# RETRIEVER_K / RETRIEVER_FETCH_K apply with QUERY_ROUTING=0; routed
+# searches use the per-partition k below
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", str(DEFAULT_K)))
+RETRIEVER_FETCH_K = int(os.getenv("RETRIEVER_FETCH_K", str(DEFAULT_FETCH_K)))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", str(DEFAULT_LAMBDA_MULT)))
+RULEBOOK_CHUNK_SIZE = int(os.getenv("RULEBOOK_CHUNK_SIZE", "700"))
+RULEBOOK_CHUNK_OVERLAP = int(os.getenv("RULEBOOK_CHUNK_OVERLAP", "100"))
+# Chroma candidate vectors kept per corpus for MMR (LRU, entries)
+VECTOR_CACHE_SIZE = int(os.getenv("VECTOR_CACHE_SIZE", "2048"))
 
-    print("Chunking Template...")
-    template_docs = chunk_template_excel(xls)
-    print(f"Template rows converted to docs: {len(template_docs)}")
+# Query routing: reporting-location questions search the template and
+# rulebook partitions with their own k (QUERY_ROUTING=0 → one merged search)
+QUERY_ROUTING = os.getenv("QUERY_ROUTING", "1") != "0"
+QUERY_ROUTES = {
+    "reporting": {
+        "lcr_template": int(os.getenv("REPORTING_TEMPLATE_K", "4")),
+        "pra_rulebook": int(os.getenv("REPORTING_RULEBOOK_K", "3")),
+    },
+    "regulatory": {
+        "pra_rulebook": int(os.getenv("REGULATORY_RULEBOOK_K", "5")),
+        "lcr_template": int(os.getenv("REGULATORY_TEMPLATE_K", "1")),
+    },
+}
 
-    print("Initializing Embedder...")
-    embeddings = get_embedder()
+# Prompt context: token budget for the assembled docs (0 = no limit)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+
+# Local out-of-scope refusal: refuse when the share of question words found
+# in the corpus vocabulary is below this and no domain term (HQLA, LCR,
+# gilts, ...) appears (0 = leave scope to the LLM)
+SCOPE_REFUSE_BELOW = float(os.getenv("SCOPE_REFUSE_BELOW", "0.34"))
+SCOPE_MIN_DF = int(os.getenv("SCOPE_MIN_DF", "1"))
+
+# Conversations: sessions keyed by session/user id (LRU above SESSION_MAX,
+# dropped after SESSION_TTL idle seconds). Stored answers are clipped to
+# SESSION_ANSWER_TOKENS; follow-ups are rewritten into standalone questions
+# from the newest SESSION_HISTORY_TOKENS of history, rewrites cached
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(30 * 60)))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "20"))
+SESSION_ANSWER_TOKENS = int(os.getenv("SESSION_ANSWER_TOKENS", "150"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "800"))
+REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "2048"))
+REWRITE_CACHE_TTL = float(os.getenv("REWRITE_CACHE_TTL", "3600"))
+
+# /chat/batch: in-flight retrieval + LLM calls per batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Ingest: processes for PDF parsing / rulebook chunking (0 = all CPUs)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+# Streaming ingest: chunks per embedding request, concurrent embedding
+# requests, and batches buffered between stages
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Embedding writer: per-request token cap, account TPM/RPM budget (0 = no
+# limit), retries for 429/5xx, and on-disk vectors so reruns resume
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "100000"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_CHECKPOINT_PATH = os.getenv(
+    "EMBED_CHECKPOINT_PATH", os.path.join(BASE_DIR, "cache", "doc_embeddings.sqlite")
+)
+
+
+# Build stages reported to /ready while the first corpus warms up
+BUILD_STAGES = (
+    "embedder", "llm", "prompt", "vector_db", "ingest", "bm25_index",
+    "scope_classifier", "structural_index", "answer_cache", "retriever", "chains",
+)
+
+
+def report_stage(progress, stage: str, message: str):
+    log.info("build_stage", stage=stage, step=message)
+    if progress is not None:
+        progress(stage, BUILD_STAGES.index(stage) / len(BUILD_STAGES))
+
+
+# CORPORA
+def corpus_ids():
+    return [DEFAULT_CORPUS] + [cid for cid in EXTRA_CORPORA if cid != DEFAULT_CORPUS]
 
-    print("Creating Vector Database...")
-    vectorstore = create_vector_db(
-        embeddings=embeddings,
-        persist_dir=PERSIST_DIR,
-        collection_name="pra_lcr_collection",
-        fresh=True
-    )
 
-    print("Adding Rulebook docs to Vector DB...")
-    add_documents_to_db(vectorstore, rulebook_chunks)
+def corpus_spec(corpus_id: str) -> dict:
+    """Source files, index paths and collection name for a corpus."""
+    if corpus_id == DEFAULT_CORPUS:
+        return {
+            "rulebook": RULEBOOK_PATH,
+            "template": TEMPLATE_PATH,
+            "persist_dir": PERSIST_DIR,
+            "bm25_path": BM25_PATH,
+            "collection": "pra_lcr_collection",
+        }
 
-    print("Adding Template docs to Vector DB...")
-    add_documents_to_db(vectorstore, template_docs)
+    spec = dict(EXTRA_CORPORA[corpus_id])
+    spec.setdefault("persist_dir", os.path.join(INDEX_DIR, f"{VECTOR_BACKEND}_{corpus_id}_db"))
+    spec.setdefault("bm25_path", os.path.join(INDEX_DIR, f"bm25_{corpus_id}_index.json"))
+    spec.setdefault("collection", f"{corpus_id}_collection")
+    return spec
 
-    print("Initializing LLM...")
-    llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.0)
 
-    print("Loading Regulatory Prompt...")
+# SHARED PIECES (one per process, reused by every corpus)
+def build_shared(progress=None):
+    """progress(stage, fraction_done) is called as each stage starts."""
+
+    report_stage(progress, "embedder", "Initializing Embedder...")
+    http_async_client = get_async_http_client(max_connections=OPENAI_MAX_CONNECTIONS)
+    embeddings = get_cached_embedder(
+        max_entries=QUERY_CACHE_SIZE,
+        cache_path=QUERY_CACHE_PATH or None,
+        http_async_client=http_async_client,
+    )
+
+    report_stage(progress, "llm", "Initializing LLM...")
+    llm = get_llm(LLM_MODEL, temperature=0.0, http_async_client=http_async_client)
+
+    report_stage(progress, "prompt", "Loading Regulatory Prompt...")
     prompt = get_regulatory_prompt()
 
-    print("Creating Retriever...")
-    combined_retriever = get_combined_retriever(vectorstore)
+    vector_db_executor = ThreadPoolExecutor(
+        max_workers=VECTOR_DB_WORKERS, thread_name_prefix="vector-db"
+    )
+
+    query_rewriter = QueryRewriter(
+        llm, get_rewrite_prompt(), max_entries=REWRITE_CACHE_SIZE, ttl_seconds=REWRITE_CACHE_TTL
+    )
+
+    return {
+        "embeddings": embeddings,
+        "llm": llm,
+        "prompt": prompt,
+        "vector_db_executor": vector_db_executor,
+        "query_rewriter": query_rewriter,
+    }
+
+
+def build_session_store() -> SessionStore:
+    return SessionStore(
+        max_sessions=SESSION_MAX,
+        ttl_seconds=SESSION_TTL,
+        max_messages=SESSION_MAX_MESSAGES,
+        answer_tokens=SESSION_ANSWER_TOKENS,
+        history_tokens=SESSION_HISTORY_TOKENS,
+        encoding=get_token_encoding(LLM_MODEL),
+    )
+
 
-    print("Building RAG Chains...")
-    combined_rag = build_combined_rag(combined_retriever, llm, prompt)
+# INGEST
+def embedding_writer(embeddings) -> EmbeddingWriter:
+    """Document embedder with the configured rate budget, retries and checkpoint."""
+    return EmbeddingWriter(
+        get_ingest_embedder(embeddings),
+        tokens_per_minute=EMBED_TPM,
+        requests_per_minute=EMBED_RPM,
+        max_batch_tokens=EMBED_MAX_BATCH_TOKENS,
+        max_retries=EMBED_MAX_RETRIES,
+        checkpoint_path=EMBED_CHECKPOINT_PATH or None,
+    )
+
+
+def ingest_corpus(vectorstore, spec: dict, embeddings):
+    """
+    Streaming, content-addressed ingest: Rulebook + Template concurrently,
+    unchanged chunks are never re-embedded.
+    """
+    sources = {}
+    if spec.get("rulebook"):
+        sources["rulebook"] = lambda: iter_rulebook_documents(
+            spec["rulebook"],
+            workers=INGEST_WORKERS or None,
+            chunk_size=RULEBOOK_CHUNK_SIZE,
+            chunk_overlap=RULEBOOK_CHUNK_OVERLAP,
+        )
+    if spec.get("template"):
+        sources["template"] = lambda: iter_template_documents(spec["template"])
+
+    return run_ingest(
+        vectorstore,
+        sources=sources,
+        batch_size=INGEST_BATCH_SIZE,
+        embed_workers=INGEST_EMBED_WORKERS,
+        queue_size=INGEST_QUEUE_SIZE,
+        writer=embedding_writer(embeddings),
+    )
+
+
+def snapshot_sources(spec: dict, embeddings) -> str:
+    paths = [spec[key] for key in ("rulebook", "template") if spec.get(key)]
+    return source_fingerprint(
+        paths,
+        get_embedding_model_name(embeddings),
+        settings=(
+            f"chunk_size={RULEBOOK_CHUNK_SIZE};chunk_overlap={RULEBOOK_CHUNK_OVERLAP};"
+            f"tokenizer={TOKENIZER_VERSION}"
+        ),
+    )
+
+
+def build_snapshot(spec: dict, embeddings):
+    """Ingest step of the mmap backend: embed into memory, publish a snapshot."""
+    staging = NumpyVectorStore(embeddings)
+    ingest_corpus(staging, spec, embeddings)
+    data = staging.get(include=["documents", "metadatas", "embeddings"])
+    return write_snapshot(
+        spec["persist_dir"],
+        data["ids"],
+        data["documents"],
+        data["metadatas"],
+        data["embeddings"],
+        sources=snapshot_sources(spec, embeddings),
+    )
+
+
+def open_snapshot(spec: dict, embeddings, force: bool = False) -> MappedVectorStore:
+    """
+    Maps the corpus snapshot. The first worker to find it missing or stale
+    (source files changed) builds it under a file lock; the others wait on
+    the lock and then map the published snapshot.
+    """
+    sources = snapshot_sources(spec, embeddings)
+    store = None if force else MappedVectorStore.open(embeddings, spec["persist_dir"], sources)
+    if store is None:
+        with snapshot_lock(spec["persist_dir"]):
+            store = None if force else MappedVectorStore.open(embeddings, spec["persist_dir"], sources)
+            if store is None:
+                log.info("snapshot_build", path=spec["persist_dir"])
+                build_snapshot(spec, embeddings)
+                store = MappedVectorStore.open(embeddings, spec["persist_dir"], sources)
+    return store
+
+
+# MAIN PIPELINE (one corpus)
+def build_pipeline(corpus_id: str = DEFAULT_CORPUS, shared=None, progress=None):
+
+    spec = corpus_spec(corpus_id)
+    if shared is None:
+        shared = build_shared(progress)
+    embeddings = shared["embeddings"]
+    llm = shared["llm"]
+    prompt = shared["prompt"]
+
+    if VECTOR_BACKEND == "mmap":
+        # Read-only snapshot shared through the page cache: no per-worker
+        # ingest, and vectors, texts, metadata and BM25 postings cost no
+        # private memory (see MappedVectorStore for what stays per worker)
+        report_stage(progress, "vector_db", f"Mapping Snapshot ({corpus_id})...")
+        vectorstore = open_snapshot(spec, embeddings)
+        doc_ids = vectorstore.chunk_ids()
+
+        report_stage(progress, "bm25_index", "Loading BM25 Lexical Index...")
+        lexical_index = vectorstore.lexical_index()
+    else:
+        report_stage(progress, "vector_db", f"Opening Vector Database ({corpus_id})...")
+        vectorstore = create_vector_db(
+            embeddings=embeddings,
+            persist_dir=spec["persist_dir"],
+            collection_name=spec["collection"],
+            fresh=False,
+            backend=VECTOR_BACKEND,
+        )
+
+        report_stage(progress, "ingest", "Ingesting Rulebook + Template docs into Vector DB...")
+        sync_stats = ingest_corpus(vectorstore, spec, embeddings)
+        doc_ids = sync_stats["ids"]
+        docs = list(sync_stats["docs"].values())
+
+        report_stage(progress, "bm25_index", "Loading BM25 Lexical Index...")
+        lexical_index = load_or_build_bm25(spec["bm25_path"], docs, list(sync_stats["docs"]))
+
+    report_stage(progress, "scope_classifier", "Building Scope Classifier...")
+    scope_classifier = ScopeClassifier.from_lexical_index(
+        lexical_index, refuse_below=SCOPE_REFUSE_BELOW, min_df=SCOPE_MIN_DF
+    )
+
+    report_stage(progress, "structural_index", "Building Structural Index...")
+    if VECTOR_BACKEND == "mmap":
+        structural_index = vectorstore.structural_index()
+    else:
+        structural_index = StructuralIndex.from_documents(docs)
+
+    report_stage(progress, "answer_cache", "Creating Answer Cache...")
+    answer_cache = AnswerCache(
+        version=compute_corpus_version(doc_ids, prompt, LLM_MODEL),
+        max_entries=ANSWER_CACHE_SIZE,
+        ttl_seconds=ANSWER_CACHE_TTL,
+        similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    )
+
+    report_stage(progress, "retriever", "Creating Retriever...")
+    vector_cache = VectorCache(max_entries=VECTOR_CACHE_SIZE)
+    combined_retriever = get_combined_retriever(
+        vectorstore,
+        k=RETRIEVER_K,
+        fetch_k=RETRIEVER_FETCH_K,
+        lambda_mult=MMR_LAMBDA,
+        executor=shared["vector_db_executor"],
+        lexical_index=lexical_index,
+        structural_index=structural_index,
+        routes=QUERY_ROUTES if QUERY_ROUTING else None,
+        vector_cache=vector_cache,
+    )
+
+    report_stage(progress, "chains", "Building RAG Chains...")
+    combined_rag = build_combined_rag(
+        combined_retriever, llm, prompt, max_context_tokens=CONTEXT_TOKEN_BUDGET
+    )
+    combined_rag_with_sources = build_combined_rag_with_sources(
+        combined_retriever, llm, prompt, max_context_tokens=CONTEXT_TOKEN_BUDGET
+    )
+    answer_chain = build_answer_chain(llm, prompt)
+    context_formatter = get_context_formatter(llm, max_context_tokens=CONTEXT_TOKEN_BUDGET)
 
-    print("Pipeline successfully built.\n")
+    log.info("pipeline_built", corpus=corpus_id, chunks=len(doc_ids))
 
     return {
+        "corpus_id": corpus_id,
         "vectorstore": vectorstore,
+        "doc_ids": doc_ids,
         "combined_rag": combined_rag,
+        "combined_rag_with_sources": combined_rag_with_sources,
+        "answer_chain": answer_chain,
+        "context_formatter": context_formatter,
         "retriever": combined_retriever,
+        "vector_cache": vector_cache,
+        "lexical_index": lexical_index,
+        "structural_index": structural_index,
+        "scope_classifier": scope_classifier,
+        "embeddings": embeddings,
+        "answer_cache": answer_cache,
         "llm": llm,
+        "vector_db_executor": shared["vector_db_executor"],
+        "query_rewriter": shared["query_rewriter"],
         "prompt": prompt
     }
 
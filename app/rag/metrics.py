@@ -0,0 +1,214 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets (seconds): sub-ms cache hits up to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Sample = Tuple[str, Dict[str, str], float]  # (name suffix, labels, value)
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+# -------------------------------------------------------
+# COUNTER / HISTOGRAM
+# -------------------------------------------------------
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name if name.endswith("_total") else name + "_total", help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("", dict(zip(self.labelnames, key)), v) for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[slot] += 1
+            row[-1] += value
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        out: List[Sample] = []
+        for key, row in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += n
+                out.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            out.append(("_sum", labels, row[-1]))
+            out.append(("_count", labels, cumulative))
+        return out
+
+
+# -------------------------------------------------------
+# STANDARD METRICS
+# -------------------------------------------------------
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Latency of each pipeline stage.", ("stage",)
+)
+STAGE_ERRORS = Counter(
+    "rag_stage_errors", "Exceptions raised inside a pipeline stage.", ("stage", "error")
+)
+ANSWERS = Counter(
+    "rag_answers", "Answers by how they were produced.", ("source",)
+)
+LOOKUPS = Counter(
+    "rag_lookups",
+    "Pre-retrieval lookups per tier (exact answer cache, structural index, "
+    "semantic answer cache); hits + misses = lookups at that tier.",
+    ("corpus", "tier", "result"),
+)
+DOCS_RETRIEVED = Counter(
+    "rag_docs_retrieved", "Context documents passed to the LLM.", ("doc_type",)
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens", "LLM token usage reported by the API.", ("kind",)
+)
+EMBEDDING_TOKENS = Counter(
+    "rag_embedding_tokens", "Tokens sent to the embeddings API for documents."
+)
+EMBEDDING_RETRIES = Counter(
+    "rag_embedding_retries", "Retried embedding requests."
+)
+HTTP_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency.", ("method", "path")
+)
+HTTP_REQUESTS = Counter(
+    "http_requests", "HTTP requests by response status.", ("method", "path", "status")
+)
+
+
+# -------------------------------------------------------
+# SPANS
+# -------------------------------------------------------
+class span:
+    """
+    Times a block into rag_stage_seconds{stage}; exceptions are counted in
+    rag_stage_errors and re-raised. Works in sync and async code:
+
+        with span("retrieve"):
+            docs = await retriever.aretrieve_with_embedding(q, v)
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage, error=exc_type.__name__)
+        return False
+
+
+def record_docs(docs):
+    for d in docs:
+        DOCS_RETRIEVED.inc(doc_type=d.metadata.get("doc_type") or "unknown")
+
+
+# -------------------------------------------------------
+# EXPOSITION (Prometheus text format 0.0.4)
+# -------------------------------------------------------
+def register_collector(fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+    """
+    fn() → [(name, type, help, samples)], called at scrape time, for values
+    that already live elsewhere (cache stats) and cost nothing per request.
+    """
+    _collectors.append(fn)
+
+
+def render(extra: Optional[Iterable[Tuple[str, str, str, List[Sample]]]] = None) -> str:
+    families = [(m.name, m.kind, m.help, m.samples()) for m in _metrics]
+    for fn in _collectors:
+        families.extend(fn())
+    if extra:
+        families.extend(extra)
+
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,369 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.rag.lexical_index import BM25Index, corpus_fingerprint
+from app.rag.numpy_store import NumpyVectorStore, current_version, publish_version, staging_dir
+from app.rag.structural_index import StructuralIndex
+
+# 2: BM25 postings as mapped arrays instead of JSON
+SNAPSHOT_FORMAT = 2
+LOCK_FILE = ".lock"
+MANIFEST_FILE = "manifest.json"
+BM25_FILE = "bm25.json"
+POSTINGS_PATH = "bm25"  # bm25.offsets.npy, bm25.docs.npy, bm25.tf.npy
+
+# Metadata keys with at most this many distinct values get a code column,
+# so filters (e.g. doc_type) are vectorised masks over the mapped file
+MAX_CATEGORIES = 1024
+
+
+def source_fingerprint(paths: Iterable[str], model_name: str, settings: str = "") -> str:
+    """Cheap staleness key: source file names, sizes and mtimes + model + chunking settings."""
+    h = hashlib.sha256(f"{model_name}\x00{settings}".encode("utf-8"))
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}\x00{st.st_size}\x00{st.st_mtime_ns}\x00".encode("utf-8"))
+    return h.hexdigest()
+
+
+# -------------------------------------------------------
+# MAPPED STRING TABLE
+# -------------------------------------------------------
+def write_strings(path: str, values: Iterable[str]):
+    """<path>.bin (concatenated UTF-8) + <path>.idx.npy (n + 1 offsets)."""
+    offsets = [0]
+    with open(path + ".bin", "wb") as f:
+        for value in values:
+            data = value.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(path + ".idx.npy", np.asarray(offsets, dtype=np.int64))
+
+
+class MappedStrings(Sequence):
+    """Read-only list of strings decoded on access from a mapped file."""
+
+    mapped = True
+
+    def __init__(self, path: str):
+        self._offsets = np.load(path + ".idx.npy", mmap_mode="r")
+        self.nbytes = int(self._offsets[-1])
+        self._data = np.memmap(path + ".bin", dtype=np.uint8, mode="r") if self.nbytes else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, stop = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return bytes(self._data[start:stop]).decode("utf-8")
+
+
+class MappedMetadata(Sequence):
+    """Per-chunk metadata dicts (JSON) decoded on access."""
+
+    mapped = True
+
+    def __init__(self, path: str):
+        self._raw = MappedStrings(path)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return json.loads(self._raw[idx])
+
+
+class PostingList(Sequence):
+    """(doc position, term frequency) pairs of one term, over mapped arrays."""
+
+    __slots__ = ("_docs", "_tfs")
+
+    def __init__(self, docs: np.ndarray, tfs: np.ndarray):
+        self._docs = docs
+        self._tfs = tfs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return list(zip(self._docs[idx].tolist(), self._tfs[idx].tolist()))
+        return int(self._docs[idx]), int(self._tfs[idx])
+
+    def __iter__(self):
+        return zip(self._docs.tolist(), self._tfs.tolist())
+
+
+class MappedPostings(Mapping):
+    """
+    BM25 postings (term → PostingList) stored as CSR arrays: per-term
+    offsets into one doc-position array and one tf array, all mapped.
+    Only the term → row lookup is built in process memory.
+    """
+
+    mapped = True
+
+    def __init__(self, path: str, terms: List[str]):
+        self._lookup = {term: i for i, term in enumerate(terms)}
+        self._offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        self._docs = np.load(path + ".docs.npy", mmap_mode="r")
+        self._tfs = np.load(path + ".tf.npy", mmap_mode="r")
+
+    def __getitem__(self, term: str) -> PostingList:
+        i = self._lookup[term]
+        start, stop = int(self._offsets[i]), int(self._offsets[i + 1])
+        return PostingList(self._docs[start:stop], self._tfs[start:stop])
+
+    def __iter__(self):
+        return iter(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self._lookup)
+
+
+def write_postings(path: str, postings: Dict[str, List[tuple]]) -> List[str]:
+    """Writes postings as CSR arrays under `path`; returns the term order."""
+    terms = list(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+    pairs = np.asarray(
+        [pair for t in terms for pair in postings[t]], dtype=np.int32
+    ).reshape(-1, 2)
+    np.save(path + ".offsets.npy", offsets)
+    np.save(path + ".docs.npy", np.ascontiguousarray(pairs[:, 0]))
+    np.save(path + ".tf.npy", np.ascontiguousarray(pairs[:, 1]))
+    return terms
+
+
+# -------------------------------------------------------
+# SNAPSHOT WRITE (one ingest step, atomic publish)
+# -------------------------------------------------------
+@contextmanager
+def snapshot_lock(root: str):
+    """Exclusive lock so concurrent workers build a snapshot only once."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_snapshot_files(
+    staging: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[dict],
+    vectors,
+    sources: str,
+):
+    """Every file of one snapshot version, written into `staging`."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+    np.save(os.path.join(staging, "vectors.npy"), NumpyVectorStore._normalize(vectors))
+    write_strings(os.path.join(staging, "ids"), ids)
+    write_strings(os.path.join(staging, "texts"), texts)
+    write_strings(
+        os.path.join(staging, "metadata"),
+        (json.dumps(md, ensure_ascii=False, sort_keys=True) for md in metadatas),
+    )
+
+    # Code columns for low-cardinality keys (-1 = key absent)
+    columns: Dict[str, list] = {}
+    keys = dict.fromkeys(k for md in metadatas for k in md)
+    for key in keys:
+        categories = list(dict.fromkeys(md.get(key) for md in metadatas if md.get(key) is not None))
+        if len(categories) > MAX_CATEGORIES:
+            continue
+        lookup = {json.dumps(c): i for i, c in enumerate(categories)}
+        codes = np.asarray(
+            [lookup[json.dumps(md[key])] if md.get(key) is not None else -1 for md in metadatas],
+            dtype=np.int16,
+        )
+        np.save(os.path.join(staging, f"col.{len(columns)}.npy"), codes)
+        columns[key] = categories
+
+    # BM25 postings over the same positions (texts stay in the mapped file)
+    bm25 = BM25Index.from_documents(
+        [Document(page_content=t, metadata=md) for t, md in zip(texts, metadatas)], ids
+    )
+    terms = write_postings(os.path.join(staging, POSTINGS_PATH), bm25.postings)
+    np.save(os.path.join(staging, "bm25.lengths.npy"), np.asarray(bm25.doc_lengths, dtype=np.int32))
+    with open(os.path.join(staging, BM25_FILE), "w", encoding="utf-8") as f:
+        json.dump({"terms": terms, "k1": bm25.k1, "b": bm25.b}, f, ensure_ascii=False)
+
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "format": SNAPSHOT_FORMAT,
+                "count": len(ids),
+                "dim": int(vectors.shape[1]) if len(ids) else 0,
+                "fingerprint": corpus_fingerprint(ids),
+                "sources": sources,
+                "columns": columns,
+            },
+            f,
+            ensure_ascii=False,
+        )
+
+
+def write_snapshot(
+    root: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[dict],
+    vectors,
+    sources: str = "",
+) -> str:
+    """
+    Writes a new snapshot version under `root`, then points CURRENT at it
+    (atomic rename) and removes older versions. Readers that still map an
+    old version keep it until they close it. Returns the version path.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = staging_dir(root, version)
+    try:
+        _write_snapshot_files(staging, ids, texts, metadatas, vectors, sources)
+        return publish_version(root, staging, version)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def current_snapshot(root: str) -> Optional[str]:
+    path = current_version(root)
+    return path if path and os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+
+# -------------------------------------------------------
+# READ-ONLY MAPPED VECTOR STORE
+# -------------------------------------------------------
+class MappedVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore over a snapshot opened with mmap: vectors, ids, chunk
+    texts, metadata and BM25 postings stay in the page cache and are
+    shared by every process that opens the same snapshot. Read-only; a
+    new snapshot is published by write_snapshot.
+
+    Private per worker: the BM25 term lookup and idf table, the scope
+    classifier's vocabulary, the structural index's position maps and
+    the category lists of the code columns, all sized by the vocabulary
+    or by the number of articles/rows, not by chunk text.
+    """
+
+    def __init__(self, embedding_function: Embeddings, path: str):
+        super().__init__(embedding_function, persist_directory=None)
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.collection_name = os.path.basename(path)
+
+        self._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self._ids = MappedStrings(os.path.join(path, "ids"))
+        self._texts = MappedStrings(os.path.join(path, "texts"))
+        self._metadatas = MappedMetadata(os.path.join(path, "metadata"))
+        self._categories = self.manifest["columns"]
+        self._codes = {
+            key: np.load(os.path.join(path, f"col.{i}.npy"), mmap_mode="r")
+            for i, key in enumerate(self._categories)
+        }
+
+        # BM25 files are mapped here too, not on first lexical query: a
+        # mapped file outlives its version dir being pruned, so the whole
+        # snapshot stays readable once it is open
+        with open(os.path.join(path, BM25_FILE), encoding="utf-8") as f:
+            bm25 = json.load(f)
+        self._bm25_params = {"k1": bm25["k1"], "b": bm25["b"]}
+        self._postings = MappedPostings(os.path.join(path, POSTINGS_PATH), bm25["terms"])
+        self._doc_lengths = np.load(os.path.join(path, "bm25.lengths.npy"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, embedding_function: Embeddings, root: str, sources: Optional[str] = None):
+        """The current snapshot under `root`, or None if missing or stale."""
+        for attempt in range(2):
+            path = current_snapshot(root)
+            if path is None:
+                return None
+            try:
+                store = cls(embedding_function, path)
+                break
+            except FileNotFoundError:
+                # Version pruned between reading CURRENT and opening it
+                if attempt:
+                    raise
+        if store.manifest.get("format") != SNAPSHOT_FORMAT:
+            return None
+        if sources is not None and store.manifest.get("sources") != sources:
+            return None
+        return store
+
+    def _metadata_at(self, idx: int) -> dict:
+        return {k: v for k, v in self._metadatas[idx].items() if v is not None}
+
+    def _filter_mask(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, value in filter.items():
+            if key in self._codes:
+                categories = self._categories[key]
+                if value not in categories:
+                    return np.zeros(len(self._ids), dtype=bool)
+                mask &= self._codes[key] == categories.index(value)
+            else:
+                mask &= np.array([self._metadatas[i].get(key) == value for i in range(len(self._ids))])
+        return mask
+
+    def chunk_ids(self) -> Sequence[str]:
+        """All chunk ids, decoded on access."""
+        return self._ids
+
+    def lexical_index(self) -> BM25Index:
+        """
+        BM25 over the mapped texts, metadata and postings. Per process it
+        keeps the term → row lookup and the idf table (one float per term).
+        """
+        return BM25Index(
+            ids=self._ids,
+            texts=self._texts,
+            metadatas=self._metadatas,
+            postings=self._postings,
+            doc_lengths=self._doc_lengths,
+            **self._bm25_params,
+        )
+
+    def structural_index(self, max_docs: int = 40) -> StructuralIndex:
+        """
+        Built in one pass over the mapped metadata; it keeps only chunk
+        positions, and resolved chunks are decoded when a query hits them.
+        """
+        return StructuralIndex.from_metadatas(self._metadatas, self._document_at, max_docs=max_docs)
+
+    # ---- read-only ----
+    def add_embeddings(self, *args: Any, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("MappedVectorStore is read-only; publish a new snapshot instead")
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        raise NotImplementedError("MappedVectorStore is read-only; publish a new snapshot instead")
+
+    def persist(self):
+        pass
@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# -------------------------------------------------------
+# VECTORISED, BATCHED MMR SELECTION
+# -------------------------------------------------------
+def mmr_select(
+    query_vecs: np.ndarray,
+    candidate_vecs: Sequence[np.ndarray],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[List[int]]:
+    """
+    Greedy maximal marginal relevance for a batch of queries.
+
+    query_vecs: (Q, d); candidate_vecs: Q arrays of shape (F_i, d).
+    Candidates are padded to one (Q, F, d) tensor, the query-candidate and
+    candidate-candidate cosine similarities are computed once, and each of
+    the k greedy steps is an argmax over a (Q, F) score matrix. Selection
+    order and tie-breaking match langchain's maximal_marginal_relevance.
+    Returns, per query, indices into that query's candidates.
+    """
+    n_queries = len(candidate_vecs)
+    if n_queries == 0:
+        return []
+
+    fetch = max((len(c) for c in candidate_vecs), default=0)
+    if fetch == 0 or k <= 0:
+        return [[] for _ in range(n_queries)]
+    dim = np.asarray(query_vecs).shape[-1]
+
+    cands = np.zeros((n_queries, fetch, dim), dtype=np.float32)
+    valid = np.zeros((n_queries, fetch), dtype=bool)
+    for q, c in enumerate(candidate_vecs):
+        if len(c):
+            cands[q, : len(c)] = c
+            valid[q, : len(c)] = True
+
+    cands = _unit(cands)
+    queries = _unit(np.asarray(query_vecs, dtype=np.float32).reshape(n_queries, dim))
+
+    # Batched BLAS matmuls: (Q, F) query sims, (Q, F, F) candidate sims
+    query_sim = np.matmul(cands, queries[:, :, None])[:, :, 0]
+    cand_sim = np.matmul(cands, cands.transpose(0, 2, 1))
+
+    rows = np.arange(n_queries)
+    steps = min(k, fetch)
+    selected = np.full((n_queries, steps), -1, dtype=int)
+    taken = ~valid
+    redundancy = np.full((n_queries, fetch), -np.inf, dtype=np.float32)
+
+    for step in range(steps):
+        if step == 0:
+            scores = query_sim.copy()
+        else:
+            scores = lambda_mult * query_sim - (1 - lambda_mult) * redundancy
+        scores[taken] = -np.inf
+
+        pick = np.argmax(scores, axis=1)
+        live = np.isfinite(scores[rows, pick])
+        selected[live, step] = pick[live]
+        taken[rows[live], pick[live]] = True
+        redundancy = np.maximum(redundancy, cand_sim[rows, pick])
+
+    return [[int(i) for i in sel if i >= 0] for sel in selected]
+
+
+# -------------------------------------------------------
+# CANDIDATE VECTOR CACHE (bounded LRU, shared per corpus)
+# -------------------------------------------------------
+class VectorCache:
+    """
+    Candidate vectors by chunk id, least recently used out above
+    `max_entries`. One instance is shared by every partition retriever of
+    a pipeline, so a vector is held once however many routes fetch it.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for i in ids:
+                vector = self._entries.get(i)
+                if vector is not None:
+                    self._entries.move_to_end(i)
+                    found[i] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for i, vector in vectors.items():
+                old = self._entries.pop(i, None)
+                if old is not None:
+                    self.nbytes -= old.nbytes
+                self._entries[i] = vector
+                self.nbytes += vector.nbytes
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+
+# -------------------------------------------------------
+# CANDIDATE FETCH (one store round trip per batch)
+# -------------------------------------------------------
+def fetch_candidates(
+    vectorstore,
+    query_vecs: List[List[float]],
+    fetch_k: int,
+    filter: Optional[dict] = None,
+    vector_cache: Optional[VectorCache] = None,
+) -> List[Tuple[List[Document], np.ndarray]]:
+    """
+    Top fetch_k candidates per query together with their stored vectors.
+    Uses NumpyVectorStore.search_candidates when available, otherwise a
+    single batched Chroma query.
+
+    Pulling embeddings out of Chroma is its slowest path, so candidate
+    vectors are kept in `vector_cache` and reused while they stay in it.
+    Ids are content hashes, so a cached vector never goes stale.
+    """
+    if hasattr(vectorstore, "search_candidates"):
+        return vectorstore.search_candidates(query_vecs, fetch_k, filter=filter)
+
+    collection = vectorstore._collection
+    result = collection.query(
+        query_embeddings=query_vecs,
+        n_results=fetch_k,
+        where=filter,
+        include=["documents", "metadatas"],
+    )
+
+    wanted = list(dict.fromkeys(i for ids in result["ids"] for i in ids))
+    vector_by_id = vector_cache.get_many(wanted) if vector_cache is not None else {}
+    missing = [i for i in wanted if i not in vector_by_id]
+    if missing:
+        stored = collection.get(ids=missing, include=["embeddings"])
+        fresh = {
+            i: np.asarray(vector, dtype=np.float32)
+            for i, vector in zip(stored["ids"], stored["embeddings"])
+        }
+        if vector_cache is not None:
+            vector_cache.put_many(fresh)
+        vector_by_id.update(fresh)
+
+    batch = []
+    for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"]):
+        docs = [
+            Document(id=i, page_content=t, metadata=m or {})
+            for i, t, m in zip(ids, texts, metadatas)
+        ]
+        vectors = np.asarray([vector_by_id[i] for i in ids], dtype=np.float32)
+        batch.append((docs, vectors.reshape(len(docs), -1)))
+    return batch
+
+
+def mmr_search_batch(
+    vectorstore,
+    query_vecs: List[List[float]],
+    k: int,
+    fetch_k: int,
+    lambda_mult: float = 0.5,
+    filter: Optional[dict] = None,
+    chunk_size: int = 32,
+    vector_cache: Optional[VectorCache] = None,
+) -> List[List[Document]]:
+    """
+    MMR search for many query vectors. Queries are processed in chunks of
+    `chunk_size` to bound the (Q, F, d) candidate tensor.
+    """
+    results: List[List[Document]] = []
+    for start in range(0, len(query_vecs), chunk_size):
+        chunk = query_vecs[start:start + chunk_size]
+        candidates = fetch_candidates(
+            vectorstore, chunk, fetch_k, filter=filter, vector_cache=vector_cache
+        )
+        picks = mmr_select(
+            np.asarray(chunk, dtype=np.float32),
+            [vectors for _, vectors in candidates],
+            k=k,
+            lambda_mult=lambda_mult,
+        )
+        results.extend([docs[i] for i in idx] for (docs, _), idx in zip(candidates, picks))
+    return results
@@ -0,0 +1,447 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.rag.mmr import mmr_select
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+CURRENT_FILE = "CURRENT"
+PUBLISH_LOCK_FILE = ".publish.lock"
+
+
+# -------------------------------------------------------
+# VERSIONED DIRECTORIES (atomic publish)
+# -------------------------------------------------------
+def staging_dir(root: str, version: str) -> str:
+    """
+    Creates a staging dir for one writer: the pid + random token keep
+    concurrent writers from sharing (or cleaning up) each other's files.
+    """
+    path = os.path.join(root, f".{version}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+    os.makedirs(path)
+    return path
+
+
+@contextmanager
+def publish_lock(root: str):
+    """Serialises publishes under `root` (rename, CURRENT swap, pruning)."""
+    with open(os.path.join(root, PUBLISH_LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish_version(root: str, staging: str, version: str) -> str:
+    """
+    Moves a fully written `staging` dir to root/<version>, points CURRENT
+    at it (atomic rename) and removes older published versions, so readers
+    only ever see a complete set of files. Runs under publish_lock, so
+    concurrent writers publish one at a time; their staging dirs are
+    never touched. Returns the version path.
+    """
+    final = os.path.join(root, version)
+    with publish_lock(root):
+        os.rename(staging, final)
+        pointer_tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+        for name in os.listdir(root):
+            if name != version and name.startswith("v"):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return final
+
+
+def current_version(root: str) -> Optional[str]:
+    """Path of the version CURRENT points at, or None."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return os.path.join(root, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+# -------------------------------------------------------
+# IN-PROCESS NUMPY VECTOR STORE
+# -------------------------------------------------------
+class NumpyVectorStore(VectorStore):
+    """
+    Brute-force vector store for small corpora.
+
+    Unit-normalised embeddings live in one contiguous float32 matrix, so a
+    top-k query is a single matrix-vector product; the matrix is a view
+    of a buffer that grows geometrically, so batched inserts append rather
+    than copy the whole matrix. Metadata is kept in columns (one per key)
+    whose object arrays are built once per write, so filters are
+    vectorised masks.
+
+    Writes stay in memory until flush(), which persists `vectors.npy` +
+    `documents.json` as a new version under persist_directory/
+    collection_name and swaps it in atomically.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_directory: Optional[str] = None,
+        collection_name: str = "pra_lcr_collection",
+    ):
+        self._embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.persist_path = (
+            os.path.join(persist_directory, collection_name) if persist_directory else None
+        )
+
+        self._lock = threading.RLock()
+        # _vectors is always _buffer[:len(self)]
+        self._buffer = np.zeros((0, 0), dtype=np.float32)
+        self._vectors = self._buffer
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._columns: Dict[str, list] = {}
+        self._column_arrays: Dict[str, np.ndarray] = {}
+        self._dirty = False
+
+        if self.persist_path:
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ---- persistence ----
+    def _load(self):
+        for attempt in range(2):
+            path = current_version(self.persist_path)
+            if path is None:
+                # Unversioned layout written by earlier releases
+                path = self.persist_path
+                if not os.path.exists(os.path.join(path, VECTORS_FILE)):
+                    return
+            try:
+                vectors = np.load(os.path.join(path, VECTORS_FILE))
+                with open(os.path.join(path, DOCUMENTS_FILE), encoding="utf-8") as f:
+                    data = json.load(f)
+                break
+            except FileNotFoundError:
+                # Version pruned by a newer publish between reading CURRENT
+                # and opening it
+                if attempt:
+                    raise
+        self._buffer = vectors
+        self._vectors = self._buffer
+        self._ids = data["ids"]
+        self._texts = data["texts"]
+        self._columns = data["columns"]
+
+    def persist(self):
+        """Writes the store as a new version dir and swaps it in (all files or none)."""
+        if not self.persist_path:
+            return
+        os.makedirs(self.persist_path, exist_ok=True)
+        version = f"v{time.time_ns()}"
+        staging = staging_dir(self.persist_path, version)
+        try:
+            np.save(os.path.join(staging, VECTORS_FILE), self._vectors)
+            with open(os.path.join(staging, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+                json.dump(
+                    {"ids": self._ids, "texts": self._texts, "columns": self._columns},
+                    f,
+                    ensure_ascii=False,
+                )
+            publish_version(self.persist_path, staging, version)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        # Files of the unversioned layout are superseded by CURRENT
+        for name in (VECTORS_FILE, DOCUMENTS_FILE):
+            legacy = os.path.join(self.persist_path, name)
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+    def flush(self):
+        """Persists writes made since the last flush (one full write per ingest)."""
+        with self._lock:
+            if self._dirty:
+                self.persist()
+                self._dirty = False
+
+    # ---- helpers ----
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _metadata_at(self, idx: int) -> dict:
+        md = {}
+        for key, column in self._columns.items():
+            value = column[idx]
+            if value is not None:
+                md[key] = value
+        return md
+
+    def _document_at(self, idx: int) -> Document:
+        return Document(id=self._ids[idx], page_content=self._texts[idx], metadata=self._metadata_at(idx))
+
+    def _column_array(self, key: str) -> Optional[np.ndarray]:
+        array = self._column_arrays.get(key)
+        if array is None and key in self._columns:
+            array = np.empty(len(self._ids), dtype=object)
+            array[:] = self._columns[key]
+            self._column_arrays[key] = array
+        return array
+
+    def _filter_mask(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, value in filter.items():
+            column = self._column_array(key)
+            if column is None:
+                return np.zeros(len(self._ids), dtype=bool)
+            mask &= column == value
+        return mask
+
+    def _append_vectors(self, new_vectors: np.ndarray):
+        n, m = len(self._ids), len(new_vectors)
+        if n == 0 or self._buffer.shape[0] < n + m:
+            capacity = max(n + m, 2 * self._buffer.shape[0])
+            buffer = np.empty((capacity, new_vectors.shape[1]), dtype=np.float32)
+            if n:
+                buffer[:n] = self._vectors
+            self._buffer = buffer
+        self._buffer[n:n + m] = new_vectors
+        self._vectors = self._buffer[:n + m]
+
+    # ---- writes ----
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Adds precomputed embeddings (upsert by id)."""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        if not texts:
+            return ids
+
+        with self._lock:
+            existing = set(self._ids).intersection(ids)
+            if existing:
+                self._delete(existing)
+
+            n_old = len(self._ids)
+            self._append_vectors(self._normalize(np.asarray(embeddings, dtype=np.float32)))
+
+            # Extend every column, creating new ones padded with None
+            keys = dict.fromkeys(self._columns)
+            for md in metadatas:
+                keys.update(dict.fromkeys(md))
+            for key in keys:
+                column = self._columns.setdefault(key, [None] * n_old)
+                column.extend(md.get(key) for md in metadatas)
+            self._column_arrays.clear()
+
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._dirty = True
+
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+
+    def _delete(self, ids):
+        ids = set(ids)
+        keep = np.array([i not in ids for i in self._ids], dtype=bool)
+        if keep.all():
+            return
+        # Compact in place: the buffer keeps its capacity
+        kept = self._vectors[keep]
+        self._buffer[:len(kept)] = kept
+        self._vectors = self._buffer[:len(kept)]
+        self._columns = {
+            key: [v for v, k in zip(column, keep) if k] for key, column in self._columns.items()
+        }
+        self._column_arrays.clear()
+        self._ids = [i for i, k in zip(self._ids, keep) if k]
+        self._texts = [t for t, k in zip(self._texts, keep) if k]
+        self._dirty = True
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            self._delete(ids)
+        return True
+
+    # ---- reads ----
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> dict:
+        """Chroma-compatible subset of Collection.get()."""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            if ids is None:
+                positions = range(len(self._ids))
+            else:
+                lookup = {doc_id: i for i, doc_id in enumerate(self._ids)}
+                positions = [lookup[i] for i in ids if i in lookup]
+
+            result = {"ids": [self._ids[i] for i in positions]}
+            if "documents" in include:
+                result["documents"] = [self._texts[i] for i in positions]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadata_at(i) for i in positions]
+            if "embeddings" in include:
+                result["embeddings"] = self._vectors[list(positions)]
+            return result
+
+    def _top_k(self, embedding, k: int, filter: Optional[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        if not self._ids:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self._vectors @ query
+
+        mask = self._filter_mask(filter)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        with self._lock:
+            top, scores = self._top_k(embedding, k, filter)
+            return [(self._document_at(i), float(s)) for i, s in zip(top, scores)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        docs, vectors = self.search_candidates([embedding], fetch_k, filter)[0]
+        selected = mmr_select(
+            np.asarray([embedding], dtype=np.float32), [vectors], k=k, lambda_mult=lambda_mult
+        )[0]
+        return [docs[i] for i in selected]
+
+    def search_candidates(
+        self, query_vecs: List[List[float]], fetch_k: int, filter: Optional[dict] = None
+    ) -> List[Tuple[List[Document], np.ndarray]]:
+        """Top fetch_k docs + their vectors for a batch of queries (one matmul)."""
+        with self._lock:
+            if not self._ids or not len(query_vecs):
+                return [([], np.zeros((0, 0), dtype=np.float32)) for _ in query_vecs]
+
+            queries = self._normalize(np.asarray(query_vecs, dtype=np.float32))
+            scores = queries @ self._vectors.T  # (Q, n)
+
+            mask = self._filter_mask(filter)
+            n_valid = len(self._ids)
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+                n_valid = int(mask.sum())
+
+            k = min(fetch_k, n_valid)
+            if k <= 0:
+                return [([], np.zeros((0, self._vectors.shape[1]), dtype=np.float32)) for _ in query_vecs]
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+
+            return [
+                ([self._document_at(i) for i in row], self._vectors[row])
+                for row in top
+            ]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.max_marginal_relevance_search_by_vector(embedding, k, fetch_k, lambda_mult, filter)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        persist_directory: Optional[str] = None,
+        collection_name: str = "pra_lcr_collection",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, persist_directory=persist_directory, collection_name=collection_name)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.flush()
+        return store
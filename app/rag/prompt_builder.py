@@ -1,5 +1,11 @@
 from langchain_core.prompts import ChatPromptTemplate
 
+# Exact sentence the assistant returns for out-of-scope questions
+OUT_OF_SCOPE_REFUSAL = (
+    "*This assistant can only answer questions about the PRA LCR rulebook and its "
+    "mapping to the LCR reporting templates. Please ask a regulatory question.*"
+)
+
 def get_regulatory_prompt() -> ChatPromptTemplate:
     template = """
 You are an internal regulatory assistant for an LCR reporting system.
@@ -22,7 +28,7 @@ A question is OUT OF SCOPE if it is:
 
 Do NOT include context, evidence, or explanations when refusing and return ONLY this sentence and NOTHING else:
 
-*This assistant can only answer questions about the PRA LCR rulebook and its mapping to the LCR reporting templates. Please ask a regulatory question.*.
+""" + OUT_OF_SCOPE_REFUSAL + """.
 
 ====================================================================
 NEXT: DETECT WHETHER IT IS A REPORTING-LOCATION QUESTION
@@ -86,4 +92,23 @@ Answer:
     return ChatPromptTemplate.from_template(template)
 
    
-   
\ No newline at end of file
+   
+
+def get_rewrite_prompt() -> ChatPromptTemplate:
+    """Turns a follow-up into a standalone question for retrieval."""
+    template = """
+Rewrite the follow-up question so it can be understood without the conversation.
+Resolve references such as "it", "that", "those" or "the same" from the conversation.
+Keep article numbers, template sheets, rows and IDs exactly as written.
+If the question already stands alone, return it unchanged.
+Return ONLY the rewritten question.
+
+Conversation:
+{history}
+
+Follow-up question:
+{question}
+
+Standalone question:
+"""
+    return ChatPromptTemplate.from_template(template)
@@ -0,0 +1,47 @@
+import re
+from typing import List
+
+from langchain_core.documents import Document
+
+from app.rag.lexical_index import doc_key
+
+# Same triggers the prompt uses for reporting-location questions
+reporting_res = [
+    re.compile(r"^\s*where\b", re.IGNORECASE),
+    re.compile(r"\bwhere\s+(?:to|do|should|would|can|shall)\b.*\b(?:put|go|report|include)\b", re.IGNORECASE),
+    re.compile(r"\breport(?:s|ed|ing)?\b", re.IGNORECASE),
+    re.compile(r"\b(?:sheet|row|line|cell|template)s?\b", re.IGNORECASE),
+    re.compile(r"\b(?:map|maps|mapped|mapping|placement)\b", re.IGNORECASE),
+]
+
+REPORTING = "reporting"
+REGULATORY = "regulatory"
+
+def classify_query(question: str) -> str:
+    """"reporting" for reporting-location questions, else "regulatory"."""
+    if any(r.search(question) for r in reporting_res):
+        return REPORTING
+    return REGULATORY
+
+
+def merge_partitions(result_lists: List[List[Document]]) -> List[Document]:
+    """
+    Interleaves partition results by relative rank, (rank + 0.5) / len,
+    so each partition keeps its share of the merged list; ties go to
+    the earlier partition. Duplicates keep their best position.
+    """
+    ranked = sorted(
+        (
+            ((rank + 0.5) / len(results), p, rank)
+            for p, results in enumerate(result_lists)
+            for rank in range(len(results))
+        )
+    )
+    seen, merged = set(), []
+    for _, p, rank in ranked:
+        doc = result_lists[p][rank]
+        key = doc_key(doc)
+        if key not in seen:
+            seen.add(key)
+            merged.append(doc)
+    return merged
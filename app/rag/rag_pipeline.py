@@ -1,12 +1,30 @@
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from app.rag.formatter import format_docs
+from app.rag.metrics import span
+from app.rag.tokens import get_token_encoding
 
 
-def build_rag_chain(retriever, llm, prompt):
+def get_context_formatter(llm, max_context_tokens=None):
+    """
+    format_docs bound to a token budget counted with the LLM's encoding:
+    docs → (context, kept_docs).
+    """
+    encoding = None
+    if max_context_tokens:
+        encoding = get_token_encoding(getattr(llm, "model_name", None) or "gpt-4o")
+
+    def formatter(docs):
+        with span("format_docs"):
+            return format_docs(docs, max_tokens=max_context_tokens, encoding=encoding)
+
+    return formatter
+
+
+def build_rag_chain(retriever, llm, prompt, max_context_tokens=None):
     rag_chain = (
         {
-            "context": retriever | format_docs,
+            "context": retriever | get_context_formatter(llm, max_context_tokens) | (lambda fitted: fitted[0]),
             "question": RunnablePassthrough()
         }
         | prompt
@@ -15,11 +33,48 @@ def build_rag_chain(retriever, llm, prompt):
     )
     return rag_chain
 
-def build_combined_rag(retriever, llm, prompt):
-    return build_rag_chain(retriever, llm, prompt)
+def build_combined_rag(retriever, llm, prompt, max_context_tokens=None):
+    return build_rag_chain(retriever, llm, prompt, max_context_tokens)
+
+
+def build_answer_chain(llm, prompt):
+    """
+    Generation half of the RAG chain: {"context", "question"} → answer text.
+    Used directly when retrieval has already happened (e.g. streaming); the
+    context comes from get_context_formatter, whose kept docs are the sources.
+    """
+    return (
+        (lambda x: {"context": x["context"], "question": x["question"]})
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+
+def build_rag_chain_with_sources(retriever, llm, prompt, max_context_tokens=None):
+    """
+    Same chain as build_rag_chain, but retrieves once and returns
+    {"question", "docs", "answer"} so callers get the exact context docs
+    (the retrieved docs that fit the context budget).
+    """
+    formatter = get_context_formatter(llm, max_context_tokens)
+
+    def fit_context(x):
+        context, kept = formatter(x["docs"])
+        return {"question": x["question"], "docs": kept, "context": context}
+
+    return (
+        RunnableParallel(docs=retriever, question=RunnablePassthrough())
+        | fit_context
+        | RunnablePassthrough.assign(answer=build_answer_chain(llm, prompt))
+        | (lambda x: {"question": x["question"], "docs": x["docs"], "answer": x["answer"]})
+    )
+
+def build_combined_rag_with_sources(retriever, llm, prompt, max_context_tokens=None):
+    return build_rag_chain_with_sources(retriever, llm, prompt, max_context_tokens)
 
 # def build_rulebook_rag(retriever, llm, prompt):
 #     return build_rag_chain(retriever, llm, prompt)
 
 # def build_template_rag(retriever, llm, prompt):
-#     return build_rag_chain(retriever, llm, prompt)
\ No newline at end of file
+#     return build_rag_chain(retriever, llm, prompt)
@@ -1,20 +1,357 @@
-from langchain_chroma import Chroma
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.rag.metrics import span
+from app.rag.mmr import VectorCache, mmr_search_batch
+from app.rag.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.rag.query_router import classify_query, merge_partitions
+from app.rag.structural_index import StructuralIndex
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
 
 DEFAULT_K = 6
 DEFAULT_FETCH_K = 20
+DEFAULT_LAMBDA_MULT = 0.5
+DEFAULT_LEXICAL_K = 20
+# Per-partition fetch_k = multiplier * partition k
+DEFAULT_PARTITION_FETCH_MULT = 3
+
+
+# -------------------------------------------------------
+# MMR RETRIEVER WITH OFFLOADED VECTOR SEARCH
+# -------------------------------------------------------
+class VectorMMRRetriever(BaseRetriever):
+    """
+    MMR retriever that embeds the query itself (async-capable, cached) and
+    runs the blocking vector-store search on a bounded executor, so the
+    event loop never waits on Chroma.
+
+    MMR is our own vectorised implementation (app.rag.mmr): candidate
+    vectors come back with the search in one round trip and are re-ranked
+    over a single candidate-candidate similarity matrix, for a whole batch
+    of queries at once.
+    """
+
+    vectorstore: Any
+    embeddings: Any
+    k: int = DEFAULT_K
+    fetch_k: int = DEFAULT_FETCH_K
+    lambda_mult: float = DEFAULT_LAMBDA_MULT
+    filter: Optional[dict] = None
+    executor: Optional[Executor] = None
+    # Bounded id → candidate vector LRU (mmr.VectorCache), shared by partitions
+    vector_cache: Optional[Any] = None
+
+    def retrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        with span("vector_mmr"):
+            return mmr_search_batch(
+                self.vectorstore,
+                embeddings,
+                k=self.k,
+                fetch_k=self.fetch_k,
+                lambda_mult=self.lambda_mult,
+                filter=self.filter,
+                vector_cache=self.vector_cache,
+            )
+
+    def retrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        return self.retrieve_batch_with_embeddings([query], [embedding])[0]
+
+    async def aretrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(self.retrieve_batch_with_embeddings, queries, embeddings)
+        )
+
+    async def aretrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        return (await self.aretrieve_batch_with_embeddings([query], [embedding]))[0]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.retrieve_with_embedding(query, self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.aretrieve_with_embedding(query, embedding)
+
+
+# -------------------------------------------------------
+# HYBRID RETRIEVER (vector MMR + BM25, fused by RRF)
+# -------------------------------------------------------
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses the vector MMR results with BM25 results over the same chunks,
+    so exact identifiers ("Article 2", "row 0030", "C 72.00") rank even
+    when the embedding misses them.
+    """
+
+    vector_retriever: VectorMMRRetriever
+    lexical_index: BM25Index
+    k: int = DEFAULT_K
+    lexical_k: int = DEFAULT_LEXICAL_K
+    rrf_k: int = 60
+
+    @property
+    def embeddings(self):
+        return self.vector_retriever.embeddings
+
+    def _fuse(self, vector_docs: List[Document], query: str) -> List[Document]:
+        with span("lexical_search"):
+            lexical_docs = self.lexical_index.search(
+                query, self.lexical_k, filter=self.vector_retriever.filter
+            )
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k=self.k, rrf_k=self.rrf_k)
+
+    def retrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        return self._fuse(self.vector_retriever.retrieve_with_embedding(query, embedding), query)
+
+    def retrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        batch = self.vector_retriever.retrieve_batch_with_embeddings(queries, embeddings)
+        return [self._fuse(docs, q) for docs, q in zip(batch, queries)]
+
+    # Vector search, BM25 scoring and RRF all run in one executor hop
+    async def aretrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.vector_retriever.executor, partial(self.retrieve_with_embedding, query, embedding)
+        )
+
+    async def aretrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.vector_retriever.executor,
+            partial(self.retrieve_batch_with_embeddings, queries, embeddings),
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.retrieve_with_embedding(query, self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.aretrieve_with_embedding(query, embedding)
+
+
+# -------------------------------------------------------
+# QUERY ROUTER (per-doc_type partitions, searched concurrently)
+# -------------------------------------------------------
+class QueryRouterRetriever(BaseRetriever):
+    """
+    Classifies the query locally (reporting-location vs regulatory, same
+    rules as the prompt) and searches that route's doc_type partitions
+    concurrently, each with its own k, then interleaves the results by
+    rank. Reporting questions therefore always get template rows.
+    """
+
+    # route → {doc_type: retriever filtered to that doc_type}
+    routes: Dict[str, Dict[str, Any]]
+    executor: Optional[Executor] = None
+
+    @property
+    def embeddings(self):
+        for partitions in self.routes.values():
+            for retriever in partitions.values():
+                return retriever.embeddings
+
+    def partitions_for(self, query: str) -> List[Any]:
+        return list(self.routes[classify_query(query)].values())
+
+    def retrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        partitions = self.partitions_for(query)
+        if self.executor is not None and len(partitions) > 1:
+            futures = [
+                self.executor.submit(p.retrieve_with_embedding, query, embedding)
+                for p in partitions
+            ]
+            return merge_partitions([f.result() for f in futures])
+        return merge_partitions([p.retrieve_with_embedding(query, embedding) for p in partitions])
+
+    async def aretrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        results = await asyncio.gather(
+            *(p.aretrieve_with_embedding(query, embedding) for p in self.partitions_for(query))
+        )
+        return merge_partitions(list(results))
+
+    async def aretrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        # One batched call per (route, partition), all in flight together
+        by_route: Dict[str, List[int]] = {}
+        for i, q in enumerate(queries):
+            by_route.setdefault(classify_query(q), []).append(i)
+
+        calls, slots = [], []
+        for route, idx in by_route.items():
+            for retriever in self.routes[route].values():
+                calls.append(retriever.aretrieve_batch_with_embeddings(
+                    [queries[i] for i in idx], [embeddings[i] for i in idx]
+                ))
+                slots.append(idx)
+
+        per_query: List[List[List[Document]]] = [[] for _ in queries]
+        for idx, batch in zip(slots, await asyncio.gather(*calls)):
+            for i, docs in zip(idx, batch):
+                per_query[i].append(docs)
+        return [merge_partitions(results) for results in per_query]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.retrieve_with_embedding(query, self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.aretrieve_with_embedding(query, embedding)
+
+
+# -------------------------------------------------------
+# STRUCTURAL RETRIEVER (direct lookup, search as fallback)
+# -------------------------------------------------------
+class StructuralRetriever(BaseRetriever):
+    """
+    Answers explicit references ("Article 2", "sheet 72 row 0040") straight
+    from the StructuralIndex; everything else goes to the search retriever.
+    A resolved query is never embedded.
+    """
+
+    structural_index: StructuralIndex
+    search_retriever: BaseRetriever
+
+    @property
+    def embeddings(self):
+        return self.search_retriever.embeddings
+
+    def resolve(self, query: str) -> Optional[List[Document]]:
+        return self.structural_index.resolve(query)
+
+    def retrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        docs = self.resolve(query)
+        if docs is not None:
+            return docs
+        return self.search_retriever.retrieve_with_embedding(query, embedding)
+
+    async def aretrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        docs = self.resolve(query)
+        if docs is not None:
+            return docs
+        return await self.search_retriever.aretrieve_with_embedding(query, embedding)
+
+    async def aretrieve_batch_with_embeddings(
+        self, queries: List[str], embeddings: List[List[float]]
+    ) -> List[List[Document]]:
+        results = [self.resolve(q) for q in queries]
+        todo = [i for i, docs in enumerate(results) if docs is None]
+        if todo:
+            searched = await self.search_retriever.aretrieve_batch_with_embeddings(
+                [queries[i] for i in todo], [embeddings[i] for i in todo]
+            )
+            for i, docs in zip(todo, searched):
+                results[i] = docs
+        return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.resolve(query)
+        if docs is not None:
+            return docs
+        return self.search_retriever.retrieve_with_embedding(
+            query, self.embeddings.embed_query(query)
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.resolve(query)
+        if docs is not None:
+            return docs
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.search_retriever.aretrieve_with_embedding(query, embedding)
+
 
 def get_combined_retriever(
-    vectorstore: Chroma,
+    vectorstore: "Chroma",
     k: int = DEFAULT_K,
     fetch_k: int = DEFAULT_FETCH_K,
+    lambda_mult: float = DEFAULT_LAMBDA_MULT,
+    executor: Optional[Executor] = None,
+    lexical_index: Optional[BM25Index] = None,
+    structural_index: Optional[StructuralIndex] = None,
+    routes: Optional[Dict[str, Dict[str, int]]] = None,
+    partition_fetch_mult: int = DEFAULT_PARTITION_FETCH_MULT,
+    vector_cache: Optional[VectorCache] = None,
 ):
-    return vectorstore.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": k,
-            "fetch_k": fetch_k,
-        },
-    )
+    if vector_cache is None:
+        vector_cache = VectorCache()
+
+    def build_search(k: int, fetch_k: int, filter: Optional[dict] = None):
+        retriever = VectorMMRRetriever(
+            vectorstore=vectorstore,
+            embeddings=vectorstore.embeddings,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+            executor=executor,
+            vector_cache=vector_cache,
+        )
+        if lexical_index is not None:
+            retriever = HybridRetriever(
+                vector_retriever=retriever,
+                lexical_index=lexical_index,
+                k=k,
+            )
+        return retriever
+
+    if routes:
+        retriever = QueryRouterRetriever(
+            routes={
+                route: {
+                    doc_type: build_search(
+                        part_k, partition_fetch_mult * part_k, {"doc_type": doc_type}
+                    )
+                    for doc_type, part_k in partitions.items()
+                    if part_k > 0
+                }
+                for route, partitions in routes.items()
+            },
+            executor=executor,
+        )
+    else:
+        retriever = build_search(k, fetch_k)
+
+    if structural_index is not None:
+        retriever = StructuralRetriever(
+            structural_index=structural_index,
+            search_retriever=retriever,
+        )
+    return retriever
 
 # def get_rulebook_retriever(
 #     vectorstore: Chroma,
@@ -1,6 +1,12 @@
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from app.rag.rulebook_loader import MIN_PAGES_PER_SHARD, get_process_context, shard_ranges
+
 # REGEX PATTERNS
 chapter_re = re.compile(r"^\s*((Chapter|CHAPTER)\s*\d+|\d+\s+[A-Z][A-Za-z].+)$")
 title_re   = re.compile(r"^\s*(Title|TITLE)\s*[IVXLC0-9]+(\s+.*)?$")
@@ -30,7 +36,50 @@ def clean_metadata(md):
     return clean
 
 
-def chunk_rulebook(documents):
+# LINE CLASSIFICATION (pure regex work, safe to run in worker processes)
+def classify_page_lines(page_text: str):
+    """
+    Cleans each line of a page and tags it with the structural rule that
+    matches first: (kind, cleaned, payload). Blank/dash lines are dropped.
+    """
+    events = []
+
+    for line in page_text.split("\n"):
+        raw = line.strip()
+        cleaned = date_re.sub("", raw)
+        cleaned = " ".join(cleaned.split())
+
+        if not cleaned or cleaned in ["-", "–", "—"]:
+            continue
+
+        if chapter_re.match(cleaned):
+            events.append(("chapter", cleaned, None))
+        elif title_re.match(cleaned):
+            events.append(("title", cleaned, None))
+        elif article_re.match(cleaned):
+            events.append(("article", cleaned, None))
+        elif section_re.match(cleaned):
+            events.append(("section", cleaned, section_re.match(cleaned).group(1)))
+        elif roman_re.match(cleaned):
+            events.append(("roman", cleaned, roman_re.match(cleaned).group().strip()))
+        elif subsection_re.match(cleaned):
+            events.append(("subsection", cleaned, f"({cleaned[1]})"))
+        else:
+            events.append(("text", cleaned, None))
+
+    return events
+
+
+def _classify_pages(page_texts):
+    return [classify_page_lines(text) for text in page_texts]
+
+
+# STRUCTURAL FOLD (serial: chapter/title/article state crosses pages)
+def iter_fold_structure(pages):
+    """
+    pages: iterable of (page_num, events) in document order. Yields
+    structured chunks page by page, so callers can stream.
+    """
     structured_chunks = []
 
     # State variables
@@ -56,23 +105,13 @@ def chunk_rulebook(documents):
             }
             structured_chunks.append({"text": buffer.strip(), "metadata": metadata})
 
-    # STRUCTURAL CHUNKING
-    for doc in documents:
-        page_num = doc.metadata.get("page")
-        lines = doc.page_content.split("\n")
-
+    for page_num, events in pages:
         buffer = ""
 
-        for line in lines:
-            raw = line.strip()
-            cleaned = date_re.sub("", raw)
-            cleaned = " ".join(cleaned.split())
-
-            if not cleaned or cleaned in ["-", "–", "—"]:
-                continue
+        for kind, cleaned, payload in events:
 
             # Chapter
-            if chapter_re.match(cleaned):
+            if kind == "chapter":
                 push_chunk(buffer, page_num)
                 buffer = ""
                 current_chapter = cleaned
@@ -81,7 +120,7 @@ def chunk_rulebook(documents):
                 continue
 
             # Title
-            if title_re.match(cleaned):
+            if kind == "title":
                 push_chunk(buffer, page_num)
                 buffer = ""
                 current_title = cleaned
@@ -90,7 +129,7 @@ def chunk_rulebook(documents):
                 continue
 
             # Article
-            if article_re.match(cleaned):
+            if kind == "article":
                 push_chunk(buffer, page_num)
                 buffer = ""
                 current_article = cleaned
@@ -99,37 +138,32 @@ def chunk_rulebook(documents):
                 continue
 
             # Section
-            m_section = section_re.match(cleaned)
-            if m_section:
+            if kind == "section":
                 push_chunk(buffer, page_num)
                 buffer = ""
-                current_section = m_section.group(1)
+                current_section = payload
                 current_subsection = None
                 current_roman = []
                 buffer += cleaned + "\n"
                 continue
 
             # Roman bullet
-            if roman_re.match(cleaned):
-                current_roman.append(roman_re.match(cleaned).group().strip())
+            if kind == "roman":
+                current_roman.append(payload)
                 buffer += cleaned + "\n"
                 continue
 
             # Subsection (a), (b), ...
-            if subsection_re.match(cleaned):
-                if (
-                    buffer.strip().endswith(":")
-                    and not section_re.match(cleaned)
-                    and not roman_re.match(cleaned)
-                ):
+            if kind == "subsection":
+                if buffer.strip().endswith(":"):
                     buffer += cleaned + "\n"
-                    current_subsection = f"({cleaned[1]})"
+                    current_subsection = payload
                     current_roman = []
                     continue
 
                 push_chunk(buffer, page_num)
                 buffer = ""
-                current_subsection = f"({cleaned[1]})"
+                current_subsection = payload
                 current_roman = []
                 buffer += cleaned + "\n"
                 continue
@@ -139,8 +173,18 @@ def chunk_rulebook(documents):
 
         push_chunk(buffer, page_num)
 
-    # CHARACTER CHUNKING
-    splitter = RecursiveCharacterTextSplitter(chunk_size=700, chunk_overlap=100)
+        yield from structured_chunks
+        structured_chunks.clear()
+
+
+def fold_structure(pages):
+    """pages: [(page_num, events)] in document order → structured chunks."""
+    return list(iter_fold_structure(pages))
+
+
+# CHARACTER CHUNKING (independent per structured chunk)
+def split_structured_chunks(structured_chunks, chunk_size: int = 700, chunk_overlap: int = 100):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     final_chunks = []
 
     for item in structured_chunks:
@@ -185,3 +229,58 @@ def chunk_rulebook(documents):
         d.metadata = clean_metadata(d.metadata)
 
     return final_chunks
+
+
+def _shards(items, n):
+    step = -(-len(items) // n)
+    return [items[i:i + step] for i in range(0, len(items), step)]
+
+
+def chunk_rulebook(documents, workers: Optional[int] = None, chunk_size: int = 700, chunk_overlap: int = 100):
+    """
+    Structural + character chunking of rulebook pages.
+
+    With workers > 1 (and enough pages) the line-level regex pass and the
+    character splitting run across a process pool, sharded by page range /
+    chunk range. The chapter/title/article state machine always runs
+    serially over the classified lines, so output equals a serial run.
+    """
+    workers = workers or os.cpu_count() or 1
+    page_texts = [doc.page_content for doc in documents]
+    page_nums = [doc.metadata.get("page") for doc in documents]
+
+    n_shards = len(shard_ranges(len(documents), workers, MIN_PAGES_PER_SHARD))
+
+    if n_shards <= 1:
+        structured = fold_structure(zip(page_nums, _classify_pages(page_texts)))
+        return split_structured_chunks(structured, chunk_size, chunk_overlap)
+
+    with ProcessPoolExecutor(max_workers=n_shards, mp_context=get_process_context()) as pool:
+        classified = [
+            events
+            for shard in pool.map(_classify_pages, _shards(page_texts, n_shards))
+            for events in shard
+        ]
+        structured = fold_structure(zip(page_nums, classified))
+
+        shards = _shards(structured, n_shards)
+        split = pool.map(
+            split_structured_chunks,
+            shards,
+            [chunk_size] * len(shards),
+            [chunk_overlap] * len(shards),
+        )
+        return [d for shard in split for d in shard]
+
+
+def iter_chunk_rulebook(documents, chunk_size: int = 700, chunk_overlap: int = 100):
+    """
+    Streaming chunk_rulebook: consumes pages lazily (e.g. from
+    PyMuPDFLoader.lazy_load) and yields final chunks as each page is done.
+    """
+    pages = (
+        (doc.metadata.get("page"), classify_page_lines(doc.page_content))
+        for doc in documents
+    )
+    for item in iter_fold_structure(pages):
+        yield from split_structured_chunks([item], chunk_size, chunk_overlap)
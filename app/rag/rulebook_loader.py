@@ -1,8 +1,63 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
 from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_core.documents import Document
+
+# Below this many pages per worker a process pool costs more than it saves
+MIN_PAGES_PER_SHARD = 64
+
+
+def get_process_context():
+    # forkserver avoids forking a process that may already run server threads
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def shard_ranges(total: int, workers: int, min_per_shard: int) -> List[Tuple[int, int]]:
+    """Contiguous [start, stop) ranges, at most `workers` of them."""
+    shards = max(1, min(workers, total // max(1, min_per_shard)))
+    step = -(-total // shards) if total else 0
+    return [(i, min(i + step, total)) for i in range(0, total, step)] if total else []
+
+
+def _extract_page_texts(pdf_path: str, start: int, stop: int) -> List[str]:
+    # Same text PyMuPDFLoader produces with its default settings
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        return [doc[i].get_text().strip() for i in range(start, stop)]
+
+
+def load_rulebook(pdf_path: str, workers: Optional[int] = None):
+    """
+    Loads one Document per PDF page. With workers > 1 and enough pages,
+    text extraction is sharded by page range across a process pool; the
+    result is identical to PyMuPDFLoader(pdf_path).load().
+    """
+    workers = workers or os.cpu_count() or 1
+
+    import pymupdf
+
+    with pymupdf.open(pdf_path) as doc:
+        total_pages = len(doc)
+
+    ranges = shard_ranges(total_pages, workers, MIN_PAGES_PER_SHARD)
+    if len(ranges) <= 1:
+        loader = PyMuPDFLoader(pdf_path)
+        documents = loader.load()
+        return documents
 
-def load_rulebook(pdf_path: str):
+    # Document-level metadata exactly as the loader builds it (page 0 only)
+    base_metadata = next(PyMuPDFLoader(pdf_path).lazy_load()).metadata
 
-    loader = PyMuPDFLoader(pdf_path)
-    documents = loader.load()
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=get_process_context()) as pool:
+        shards = pool.map(_extract_page_texts, [pdf_path] * len(ranges), *zip(*ranges))
+        texts = [t for shard in shards for t in shard]
 
-    return documents
\ No newline at end of file
+    return [
+        Document(page_content=text, metadata={**base_metadata, "page": page})
+        for page, text in enumerate(texts)
+    ]
@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, List
+
+from app.rag.lexical_index import tokenize
+from app.rag.structural_index import parse_references
+
+# Function words, pronouns and small talk: they say nothing about scope
+STOPWORDS = frozenset("""
+a an the and or but if then else of to in on at by for with from into onto about as is are was were be been
+being am do does did doing have has had having can could should would will shall may might must i me my mine
+we us our you your yours he him his she her it its they them their this that these those there here what
+which who whom whose when where why how whats wheres hows please tell explain describe give show let lets
+know want need help question questions answer thanks thank thx hi hello hey dear bye goodbye ok okay yes
+no not so very really just also any some all more most much many one s t re ve ll d m today now
+""".split())
+
+# Acronyms users type that the rulebook text spells out in full, and
+# market shorthand for asset classes it only names generically. Any of
+# these in a question vetoes a local refusal
+DOMAIN_TERMS = frozenset({
+    "lcr", "hqla", "hqlas", "pra", "crr", "nsfr", "ilaap", "corep",
+    "gilt", "gilts", "bund", "bunds", "treasuries", "rmbs", "cmbs", "clo", "clos",
+    "etf", "etfs", "mmf", "mmfs", "repo", "repos",
+})
+
+
+def content_tokens(question: str) -> List[str]:
+    return [t for t in tokenize(question) if ":" not in t and t not in STOPWORDS]
+
+
+# -------------------------------------------------------
+# LEXICAL OUT-OF-SCOPE CLASSIFIER
+# -------------------------------------------------------
+class ScopeClassifier:
+    """
+    Corpus-vocabulary scope check that runs before any embedding call.
+
+    score = share of the question's content tokens (stopwords removed)
+    that occur in at least `min_df` corpus chunks. A question is refused
+    locally only when it is confidently out of scope: no explicit
+    article/sheet/row reference, no DOMAIN_TERMS word and a score below
+    `refuse_below`. Anything else goes through retrieval, where the prompt
+    still applies the LLM-side scope rules. refuse_below=0 disables local
+    refusals.
+    """
+
+    def __init__(self, doc_freq: Dict[str, int], refuse_below: float = 0.34, min_df: int = 1):
+        self.vocabulary = frozenset(tok for tok, df in doc_freq.items() if df >= min_df) | DOMAIN_TERMS
+        self.refuse_below = refuse_below
+        self.min_df = min_df
+
+    @classmethod
+    def from_lexical_index(cls, lexical_index, refuse_below: float = 0.34, min_df: int = 1) -> "ScopeClassifier":
+        doc_freq = {tok: len(postings) for tok, postings in lexical_index.postings.items()}
+        return cls(doc_freq, refuse_below=refuse_below, min_df=min_df)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], refuse_below: float = 0.34, min_df: int = 1) -> "ScopeClassifier":
+        doc_freq: Dict[str, int] = {}
+        for text in texts:
+            for tok in set(tokenize(text)):
+                doc_freq[tok] = doc_freq.get(tok, 0) + 1
+        return cls(doc_freq, refuse_below=refuse_below, min_df=min_df)
+
+    def score(self, question: str) -> float:
+        return self._score(content_tokens(question))
+
+    def _score(self, tokens: List[str]) -> float:
+        if not tokens:
+            return 0.0
+        return sum(tok in self.vocabulary for tok in tokens) / len(tokens)
+
+    def is_out_of_scope(self, question: str) -> bool:
+        if self.refuse_below <= 0:
+            return False
+        refs = parse_references(question)
+        if refs["articles"] or refs["sheets"]:
+            return False
+        tokens = content_tokens(question)
+        if any(tok in DOMAIN_TERMS for tok in tokens):
+            return False
+        return self._score(tokens) < self.refuse_below
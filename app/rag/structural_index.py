@@ -0,0 +1,131 @@
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Real article headings look like "Article 10 Level 1 Assets"; lines such as
+# "Article 116 of CRR;" or "Article 27 shall be ..." are cross-references
+# the chunker picked up as headings.
+article_heading_re = re.compile(r"^Article\s+(\d+[a-z]?)\s+([A-Z][^()]*)$")
+
+# Query-side references
+query_article_re = re.compile(r"\b(?:article|art\.)\s*(\d+[a-z]?)\b", re.IGNORECASE)
+query_sheet_re = re.compile(r"\b(?:sheet|template|annex|c)\s*(\d{2})(?:\.\d{2})?\b", re.IGNORECASE)
+query_row_re = re.compile(r"\b(?:row|line)\s*(\d{2,4})\b", re.IGNORECASE)
+query_id_re = re.compile(r"\bid\s*(\d+(?:\.\d+)+)\b", re.IGNORECASE)
+
+
+def article_number(heading) -> Optional[str]:
+    """Article number for a genuine heading, None for cross-references."""
+    if not heading or heading == "None":
+        return None
+    m = article_heading_re.match(str(heading))
+    if not m or " of CRR" in heading:
+        return None
+    return m.group(1).lower()
+
+
+def normalize_row(row) -> str:
+    # "0040" / "040" → "40"; ranges like "040-290" keep their shape
+    return "-".join(part.lstrip("0") or "0" for part in str(row).strip().split("-"))
+
+
+def parse_references(question: str) -> Dict[str, List[str]]:
+    """Explicit structural references ("Article 2", "sheet C 72.00 row 0040")."""
+    return {
+        "articles": [a.lower() for a in query_article_re.findall(question)],
+        "sheets": query_sheet_re.findall(question),
+        "rows": [normalize_row(r) for r in query_row_re.findall(question)],
+        "ids": query_id_re.findall(question),
+    }
+
+
+# -------------------------------------------------------
+# STRUCTURAL DIRECT-LOOKUP INDEX
+# -------------------------------------------------------
+class StructuralIndex:
+    """
+    Article number → complete article chunks (in document order),
+    (sheet, row) → template doc and (sheet, ID hierarchy) → template doc.
+
+    Entries are chunk positions; `document_at(position)` turns the ones a
+    query resolves to into Documents, so the index itself holds no text.
+    """
+
+    def __init__(self, document_at: Callable[[int], Document], max_docs: int = 40):
+        self.document_at = document_at
+        self.max_docs = max_docs
+        # number → [(heading, [positions])]; the same number can head
+        # articles in several annexed regulations, so every occurrence is kept
+        self.articles: Dict[str, List[Tuple[str, List[int]]]] = {}
+        self.template_rows: Dict[Tuple[str, str], int] = {}
+        self.template_ids: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def from_documents(cls, docs: List[Document], max_docs: int = 40) -> "StructuralIndex":
+        docs = list(docs)
+        return cls.from_metadatas((d.metadata for d in docs), docs.__getitem__, max_docs=max_docs)
+
+    @classmethod
+    def from_metadatas(
+        cls,
+        metadatas: Iterable[dict],
+        document_at: Callable[[int], Document],
+        max_docs: int = 40,
+    ) -> "StructuralIndex":
+        """Builds from chunk metadata in document order (one pass, nothing kept)."""
+        index = cls(document_at, max_docs=max_docs)
+        current = None  # (heading, positions) of the last genuine article heading
+
+        for position, md in enumerate(metadatas):
+            if md.get("doc_type") == "pra_rulebook":
+                heading = md.get("article")
+                number = article_number(heading)
+                if number is not None and (current is None or current[0] != heading):
+                    current = (heading, [])
+                    index.articles.setdefault(number, []).append(current)
+                elif heading in (None, "None"):
+                    current = None
+                # Chunks under a cross-reference "heading" belong to the
+                # article that was open before it
+                if current is not None:
+                    current[1].append(position)
+
+            elif md.get("doc_type") == "lcr_template":
+                sheet = str(md.get("template_sheet"))
+                if md.get("row") not in (None, "None"):
+                    index.template_rows.setdefault((sheet, normalize_row(md["row"])), position)
+                if md.get("id_hierarchy") not in (None, "None"):
+                    index.template_ids.setdefault((sheet, str(md["id_hierarchy"])), position)
+
+        return index
+
+    def resolve(self, question: str) -> Optional[List[Document]]:
+        """
+        Documents for the references in `question`, or None when the
+        question has no unambiguous structural reference.
+        """
+        refs = parse_references(question)
+        positions: List[int] = []
+
+        for number in refs["articles"]:
+            for _, chunks in self.articles.get(number, []):
+                positions.extend(chunks)
+
+        # Template rows/IDs are only unique within a sheet
+        for sheet in refs["sheets"]:
+            for row in refs["rows"]:
+                position = self.template_rows.get((sheet, row))
+                if position is not None:
+                    positions.append(position)
+            for id_code in refs["ids"]:
+                position = self.template_ids.get((sheet, id_code))
+                if position is not None:
+                    positions.append(position)
+
+        if not positions:
+            return None
+
+        # Keep order, drop repeats, cap the context size
+        unique = list(dict.fromkeys(positions))[: self.max_docs]
+        return [self.document_at(position) for position in unique]
@@ -1,7 +1,11 @@
 import pandas as pd
 import math
+import numpy as np
 from langchain_core.documents import Document
 
+from app.rag.logs import get_logger
+
+log = get_logger(__name__)
 
 
 def clean_value(v):
@@ -11,6 +15,26 @@ def clean_value(v):
         return None
     return v
 
+def _text(df: pd.DataFrame, col: str) -> np.ndarray:
+    """
+    str(value).strip() for every cell of a column ("" if it is missing).
+    None reads as "nan", like the NaN pandas stores for empty cells.
+    """
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    return np.array(
+        ["nan" if v is None else str(v).strip() for v in df[col].to_numpy(dtype=object)],
+        dtype=object,
+    )
+
+
+def _values(df: pd.DataFrame, col: str) -> list:
+    """Cleaned cell values of a column as Python objects (None if missing)."""
+    if col not in df.columns:
+        return [None] * len(df)
+    return [clean_value(v) for v in df[col].to_numpy(dtype=object)]
+
+
 # CLEAN EACH TEMPLATE SHEET
 def clean_template_sheet(sheet_name: str, df: pd.DataFrame):
     """
@@ -22,17 +46,14 @@ def clean_template_sheet(sheet_name: str, df: pd.DataFrame):
     df = df.dropna(how="all", axis=0)
     df = df.dropna(how="all", axis=1)
 
-    # Identify header row
-    header_row = None
-    for i in range(len(df)):
-        vals = df.iloc[i].astype(str).str.lower()
-        if "row" in vals.values:
-            header_row = i
-            break
+    # Identify header row: first row with a cell reading "row"
+    cells = df.to_numpy(dtype=object).astype(str)
+    hits = np.flatnonzero((np.char.lower(cells) == "row").any(axis=1))
 
-    if header_row is None:
-        print(f"No header detected for sheet {sheet_name}. Skipping.")
+    if len(hits) == 0:
+        log.warning("sheet_without_header", sheet=sheet_name)
         return None
+    header_row = int(hits[0])
 
     # Set header row
     df.columns = df.iloc[header_row]
@@ -54,76 +75,90 @@ def clean_template_sheet(sheet_name: str, df: pd.DataFrame):
 
 # MERGE MULTI-LINE ITEMS
 def clean_multiline_items(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    merged_rows = []
-    buffer = None
-
-    for _, row in df.iterrows():
-        row_code = str(row.get("Row", "")).strip()
-        id_code = str(row.get("ID", "")).strip()
-        item_text = str(row.get("Item", "")).strip()
-
-        is_continuation = (
-            (row_code == "" or row_code.lower() == "nan") and
-            (id_code == "" or id_code.lower() == "nan") and
-            item_text not in ["", "nan"]
+    """
+    Rows without Row/ID codes but with Item text continue the previous
+    item. Continuations are found with a mask, grouped onto their head row
+    via a running group key, and their text appended in order.
+    """
+    row_code = _text(df, "Row")
+    id_code = _text(df, "ID")
+    item_text = _text(df, "Item")
+
+    is_continuation = (
+        np.isin(np.char.lower(row_code.astype(str)), ["", "nan"]) &
+        np.isin(np.char.lower(id_code.astype(str)), ["", "nan"]) &
+        ~np.isin(item_text.astype(str), ["", "nan"])
+    )
+
+    # Group key = number of head rows seen so far; continuations before
+    # the first head row (group 0) have nothing to attach to
+    group = np.cumsum(~is_continuation)
+    heads = np.flatnonzero(~is_continuation)
+
+    items = list(df["Item"].to_numpy(dtype=object)) if "Item" in df.columns else None
+    tails = is_continuation & (group > 0)
+    if tails.any():
+        extra = (
+            pd.Series(" " + item_text[tails])
+            .groupby(group[tails])
+            .agg("".join)
         )
+        for g, text in extra.items():
+            pos = heads[g - 1]
+            items[pos] = items[pos] + text
 
-        if is_continuation:
-            if buffer is not None:
-                buffer["Item"] += " " + item_text
-            continue
-
-        if buffer is not None:
-            merged_rows.append(buffer)
-
-        buffer = row.to_dict()
-
-    if buffer:
-        merged_rows.append(buffer)
-
-    return pd.DataFrame(merged_rows)
+    # Rebuilt from Python lists so column dtypes are re-inferred exactly
+    # as when the frame was built from merged row dicts
+    merged = {
+        col: [items[i] for i in heads] if col == "Item" else list(df[col].to_numpy(dtype=object)[heads])
+        for col in df.columns
+    }
+    return pd.DataFrame(merged)
 
 
 # ROW SPLITTER → Document objects
 def excel_row_splitter(df: pd.DataFrame):
-    docs = []
-
-    for _, row in df.iterrows():
-        item_text = str(row.get("Item", "")).strip()
+    """One Document per row with Item text; metadata built from column arrays."""
+    item_text = _text(df, "Item")
+    keep = np.flatnonzero(
+        (item_text != "") & (np.char.lower(item_text.astype(str)) != "nan")
+    )
+
+    fixed = {
+        "template_sheet": _values(df, "template_sheet"),
+        "template_code": _values(df, "template_code"),
+        "row": _values(df, "Row"),
+        "id_hierarchy": _values(df, "ID"),
+    }
+    # Add all columns 
+    extra = [(col, _values(df, col)) for col in df.columns if col != "Item"]
 
-        if not item_text or item_text.lower() == "nan":
-            continue
-
-        metadata = {
-            "template_sheet": clean_value(row.get("template_sheet")),
-            "template_code": clean_value(row.get("template_code")),
-            "row": clean_value(row.get("Row")),
-            "id_hierarchy": clean_value(row.get("ID")),
-            "doc_type": "lcr_template",
-        }
-
-        # Add all columns 
-        for col in df.columns:
-            if col != "Item":
-                metadata[col] = clean_value(row.get(col))
+    docs = []
+    for i in keep:
+        metadata = {key: values[i] for key, values in fixed.items()}
+        metadata["doc_type"] = "lcr_template"
+        for col, values in extra:
+            metadata[col] = values[i]
 
-        docs.append(Document(page_content=item_text, metadata=metadata))
+        docs.append(Document(page_content=item_text[i], metadata=metadata))
 
     return docs
 
 
 # MAIN FUNCTION
 def chunk_template_excel(xls: pd.ExcelFile):
-    processed_sheets = []
+    # Skip irrelevant sheets
+    sheets = [
+        sheet for sheet in xls.sheet_names
+        if sheet.lower() not in ["index", "readme", "instructions"]
+    ]
 
-    for sheet in xls.sheet_names:
-        # Skip irrelevant sheets
-        if sheet.lower() in ["index", "readme", "instructions"]:
-            continue
+    # Parse every relevant sheet in one pass over the workbook
+    raw_sheets = xls.parse(sheet_name=sheets, header=None)
 
-        raw_df = pd.read_excel(xls, sheet_name=sheet, header=None)
-        cleaned = clean_template_sheet(sheet, raw_df)
+    processed_sheets = []
+    for sheet in sheets:
+        cleaned = clean_template_sheet(sheet, raw_sheets[sheet])
 
         if cleaned is not None:
             processed_sheets.append(cleaned)
@@ -137,4 +172,4 @@ def chunk_template_excel(xls: pd.ExcelFile):
     # Convert to Document objects
     excel_documents = excel_row_splitter(templates_df)
 
-    return excel_documents
\ No newline at end of file
+    return excel_documents
@@ -2,5 +2,6 @@ import pandas as pd
 
 def load_template_excel(excel_path: str) -> pd.ExcelFile:
 
-    xls = pd.ExcelFile(excel_path)
+    # openpyxl engine opens the workbook read-only (streaming rows)
+    xls = pd.ExcelFile(excel_path, engine="openpyxl")
     return xls
\ No newline at end of file
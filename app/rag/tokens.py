@@ -0,0 +1,34 @@
+import tiktoken
+
+from app.rag.logs import get_logger
+
+log = get_logger(__name__)
+
+
+def get_token_encoding(model_name: str):
+    """tiktoken encoding for the model, or None when it cannot be loaded."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        # First use downloads the BPE file; offline, fall back to an estimate
+        log.warning("tiktoken_unavailable", model=model_name, error=type(exc).__name__)
+        return None
+
+
+def count_tokens(text: str, encoding=None) -> int:
+    """Exact count with an encoding, otherwise ~3 bytes per token."""
+    if encoding is None:
+        return len(text.encode("utf-8")) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, encoding=None) -> str:
+    """First `max_tokens` tokens of text (same ~3 bytes/token estimate offline)."""
+    if count_tokens(text, encoding) <= max_tokens:
+        return text
+    if encoding is None:
+        return text.encode("utf-8")[: max_tokens * 3].decode("utf-8", errors="ignore")
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
@@ -1,21 +1,52 @@
+import hashlib
+import json
 import os
 import shutil
-from typing import List, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
+from app.rag.logs import get_logger
+from app.rag.numpy_store import NumpyVectorStore
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+log = get_logger(__name__)
+
+
+def _open_store(embeddings, persist_dir: str, collection_name: str, backend: str):
+    if backend == "chroma":
+        # Imported here: chromadb is slow to import and unused by the numpy backend
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=persist_dir,
+        )
+    if backend == "numpy":
+        return NumpyVectorStore(
+            embedding_function=embeddings,
+            persist_directory=persist_dir,
+            collection_name=collection_name,
+        )
+    raise ValueError(f"Unknown vector backend {backend!r}; expected one of {VECTOR_BACKENDS}")
 
 
 # -------------------------------------------------------
-# CREATE NEW CHROMA VECTORSTORE
+# CREATE NEW VECTORSTORE (Chroma or NumPy)
 # -------------------------------------------------------
 def create_vector_db(
     embeddings,
     persist_dir: str,
     collection_name: str = "pra_lcr_collection",
-    fresh: bool = True
-) -> Chroma:
+    fresh: bool = True,
+    backend: str = "chroma",
+) -> Union["Chroma", NumpyVectorStore]:
 
     # Clean persistence directory
     if fresh and os.path.exists(persist_dir):
@@ -24,13 +55,7 @@ def create_vector_db(
     os.makedirs(persist_dir, exist_ok=True)
     os.chmod(persist_dir, 0o777)
 
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory=persist_dir,
-    )
-
-    return vectorstore
+    return _open_store(embeddings, persist_dir, collection_name, backend)
 
 
 # -------------------------------------------------------
@@ -39,14 +64,11 @@ def create_vector_db(
 def load_vector_db(
     embeddings,
     persist_dir: str,
-    collection_name: str = "pra_lcr_collection"
-) -> Chroma:
+    collection_name: str = "pra_lcr_collection",
+    backend: str = "chroma",
+) -> Union["Chroma", NumpyVectorStore]:
 
-    return Chroma(
-        collection_name=collection_name,
-        embedding_function=embeddings,
-        persist_directory=persist_dir,
-    )
+    return _open_store(embeddings, persist_dir, collection_name, backend)
 
 
 # -------------------------------------------------------
@@ -73,15 +95,28 @@ def clean_document(doc: Document) -> Document:
 
 
 # -------------------------------------------------------
-# ADD DOCUMENTS WITH AUTOMATIC BATCHING (fixed)
+# CONTENT-ADDRESSED DOCUMENT IDS
 # -------------------------------------------------------
-def add_documents_to_db(vectorstore: Chroma, docs: List[Union[str, Document]], batch_size: int = 160):
+def get_embedding_model_name(embeddings) -> str:
+    """Best-effort name of the embedding model behind a vectorstore."""
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+
+def compute_doc_id(doc: Document, model_name: str) -> str:
+    """
+    Stable id for a cleaned document: sha256 over text, metadata and the
+    embedding model, so any change to one of them yields a new vector.
+    """
+    payload = json.dumps(
+        {"text": doc.page_content, "metadata": doc.metadata, "model": model_name},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    if not docs:
-        print("No documents provided.")
-        return
 
-    # 1) Convert all items to Document + clean metadata
+def prepare_documents(docs: List[Union[str, Document]]) -> List[Document]:
+    """Converts raw strings to Documents and cleans metadata for Chroma."""
     clean_docs = []
     for d in docs:
 
@@ -91,20 +126,130 @@ def add_documents_to_db(vectorstore: Chroma, docs: List[Union[str, Document]], b
 
         # Skip anything invalid
         if not isinstance(d, Document):
-            print("Skipping invalid doc:", type(d))
+            log.warning("invalid_doc_skipped", type=type(d).__name__)
             continue
 
         clean_docs.append(clean_document(d))
 
+    return clean_docs
+
+
+# -------------------------------------------------------
+# ADD DOCUMENTS WITH AUTOMATIC BATCHING (fixed)
+# -------------------------------------------------------
+def add_documents_to_db(
+    vectorstore: "Chroma",
+    docs: List[Union[str, Document]],
+    batch_size: int = 160,
+    ids: Optional[List[str]] = None,
+):
+
+    if not docs:
+        log.warning("no_documents")
+        return
+
+    # 1) Convert all items to Document + clean metadata
+    clean_docs = prepare_documents(docs)
+
     total = len(clean_docs)
-    print(f"Total documents to insert: {total}")
+    log.info("insert_start", docs=total)
 
     # 2) Insert in safe batches
     for i in range(0, total, batch_size):
         batch = clean_docs[i:i + batch_size]
-        print(f"Adding batch {i//batch_size + 1} with {len(batch)} docs...")
-        vectorstore.add_documents(batch)
+        batch_ids = ids[i:i + batch_size] if ids is not None else None
+        log.debug("insert_batch", batch=i // batch_size + 1, docs=len(batch))
+        vectorstore.add_documents(batch, ids=batch_ids)
 
-    print("🎉 All documents successfully added to vector DB.")
+    flush_vector_db(vectorstore)
+    log.info("insert_done", docs=total)
 
 
+# -------------------------------------------------------
+# INCREMENTAL SYNC (only embed what changed)
+# -------------------------------------------------------
+def sync_documents_to_db(
+    vectorstore: "Chroma",
+    docs: List[Union[str, Document]],
+    model_name: Optional[str] = None,
+    batch_size: int = 160,
+) -> Dict[str, object]:
+    """
+    Makes the collection match `docs` exactly, keyed by content hash.
+
+    Chunks already present are left alone (no embedding call), new chunks
+    are embedded and inserted, and ids no longer produced by the corpus are
+    deleted. Returns the sorted list of live ids, the id → Document map and
+    added/deleted counts.
+    """
+    if model_name is None:
+        model_name = get_embedding_model_name(vectorstore.embeddings)
+
+    # 1) Hash every cleaned doc; identical chunks collapse onto one id
+    wanted: Dict[str, Document] = {}
+    for d in prepare_documents(docs):
+        wanted.setdefault(compute_doc_id(d, model_name), d)
+    for doc_id, d in wanted.items():
+        d.id = doc_id
+
+    existing = set(vectorstore.get(include=[])["ids"])
+
+    new_ids = [i for i in wanted if i not in existing]
+    stale_ids = [i for i in existing if i not in wanted]
+
+    log.info(
+        "index_sync",
+        docs=len(wanted),
+        unchanged=len(wanted) - len(new_ids),
+        new=len(new_ids),
+        stale=len(stale_ids),
+    )
+
+    # 2) Remove chunks that disappeared from the source files
+    for i in range(0, len(stale_ids), batch_size):
+        vectorstore.delete(ids=stale_ids[i:i + batch_size])
+
+    # 3) Embed + insert only the new chunks
+    if new_ids:
+        add_documents_to_db(
+            vectorstore,
+            [wanted[i] for i in new_ids],
+            batch_size=batch_size,
+            ids=new_ids,
+        )
+
+    flush_vector_db(vectorstore)
+
+    return {
+        "ids": sorted(wanted),
+        "docs": wanted,
+        "added": len(new_ids),
+        "deleted": len(stale_ids),
+    }
+
+
+# -------------------------------------------------------
+# INSERT PRE-COMPUTED EMBEDDINGS (no embedding call)
+# -------------------------------------------------------
+def insert_embeddings(
+    vectorstore,
+    docs: List[Document],
+    vectors: List[List[float]],
+    ids: List[str],
+):
+    """Writes already-embedded, already-cleaned docs into either backend."""
+    texts = [d.page_content for d in docs]
+    metadatas = [d.metadata for d in docs]
+
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+    else:
+        vectorstore._collection.upsert(
+            ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas
+        )
+
+
+def flush_vector_db(vectorstore):
+    """Persists buffered writes: the NumPy store writes once here, Chroma writes through."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.flush()
@@ -1,22 +1,46 @@
-from app.rag.main import build_pipeline
+import asyncio
+import time
 
-class RAGPipelineService:
-    def __init__(self):
-        print("⚙️ Building full RAG pipeline...")
-        self.pipeline = build_pipeline()
-        self.rag = self.pipeline["combined_rag"]
-        self.retriever = self.pipeline["retriever"]   # ⭐ Needed for metadata
+from app.rag.corpus_registry import CorpusRegistry, UnknownCorpusError, estimate_pipeline_bytes
+from app.rag.embedding_cache import normalize_query
+from app.rag.logs import get_logger
+from app.rag.main import (
+    BATCH_MAX_CONCURRENCY,
+    CORPUS_MEMORY_CAP_MB,
+    DEFAULT_CORPUS,
+    build_pipeline,
+    build_session_store,
+    build_shared,
+    corpus_ids,
+)
+from app.rag.metrics import ANSWERS, LOOKUPS, STAGE_SECONDS, record_docs, span
+from app.rag.prompt_builder import OUT_OF_SCOPE_REFUSAL
 
-    def query(self, question: str, history=None):
-        """
-        Returns: answer_text, metadata_list
-        """
+log = get_logger(__name__)
 
-        # ⭐ First: retrieve documents with metadata
-        retrieved_docs = self.retriever.invoke(question)
+class RAGPipelineService:
+    def __init__(self, pipeline=None):
+        if pipeline is None:
+            log.info("building_pipeline")
+            pipeline = build_pipeline()
+        self.pipeline = pipeline
+        # ⭐ Returns answer + the exact docs used as context (one retrieval)
+        self.rag = self.pipeline["combined_rag_with_sources"]
+        self.answer_chain = self.pipeline["answer_chain"]
+        # docs → (context, kept_docs): only the kept docs are returned as sources
+        self.context_formatter = self.pipeline["context_formatter"]
+        self.retriever = self.pipeline["retriever"]
+        self.embeddings = self.pipeline["embeddings"]
+        self.answer_cache = self.pipeline["answer_cache"]
+        self.structural_index = self.pipeline["structural_index"]
+        self.scope_classifier = self.pipeline["scope_classifier"]
+        self.query_rewriter = self.pipeline["query_rewriter"]
+        self.corpus_id = self.pipeline.get("corpus_id") or DEFAULT_CORPUS
 
+    @staticmethod
+    def build_metadata_list(docs):
         metadata_list = []
-        for doc in retrieved_docs:
+        for doc in docs:
             md = doc.metadata.copy()
 
             metadata_list.append({
@@ -32,14 +56,350 @@ class RAGPipelineService:
                 "subsection": md.get("subsection"),
                 "page": md.get("page"),
             })
+        return metadata_list
+
+    def count_lookup(self, tier: str, result):
+        """One lookup at `tier` ("exact" / "structural" / "semantic"): hit when `result` is not None."""
+        LOOKUPS.inc(corpus=self.corpus_id, tier=tier, result="miss" if result is None else "hit")
+
+    def standalone(self, question: str, history=None) -> str:
+        """
+        The question as a self-contained query. `history` is a list of
+        {"role", "content"} dicts (already compacted, see SessionStore);
+        follow-ups are rewritten from it, anything else is returned as-is.
+        """
+        return self.query_rewriter.rewrite(question, history or [])
+
+    async def astandalone(self, question: str, history=None) -> str:
+        return await self.query_rewriter.arewrite(question, history or [])
+
+    def query(self, question: str, history=None, standalone_question=None):
+        """
+        Returns: answer_text, metadata_list. Pass `standalone_question` when
+        the caller already rewrote the question (no second rewrite).
+        """
+        question = standalone_question or self.standalone(question, history)
+
+        # ⭐ Junk traffic is refused locally: no embedding, retrieval or LLM
+        if self.scope_classifier.is_out_of_scope(question):
+            ANSWERS.inc(source="refused")
+            return OUT_OF_SCOPE_REFUSAL, []
+
+        # ⭐ Answer cache: exact question first, then close paraphrases
+        cached = self.answer_cache.lookup_exact(question)
+        self.count_lookup("exact", cached)
+        embedding = None
+        if cached is None:
+            # Explicit references resolve structurally and are never embedded
+            docs = self.structural_index.resolve(question)
+            self.count_lookup("structural", docs)
+            if docs is None:
+                # Cached embedder → the retriever below reuses this vector
+                with span("embed_query"):
+                    embedding = self.embeddings.embed_query(question)
+                cached = self.answer_cache.lookup_similar(embedding)
+                self.count_lookup("semantic", cached)
+        if cached is not None:
+            ANSWERS.inc(source="cache")
+            return cached["answer"], cached["metadata"]
+
+        # ⭐ Single pass: retrieve once, answer from those same docs
+        with span("rag_chain"):
+            result = self.rag.invoke(question)
+        record_docs(result["docs"])
+        ANSWERS.inc(source="generated")
+
+        metadata_list = self.build_metadata_list(result["docs"])
+
+        self.answer_cache.store(question, result["answer"], metadata_list, embedding)
 
-        # ⭐ Now generate answer using RAG chain
-        answer = self.rag.invoke(question)
+        return result["answer"], metadata_list
+
+    async def aquery(self, question: str, history=None, standalone_question=None):
+        """
+        Async twin of query(): awaits the embedder, offloaded vector search
+        and OpenAI call instead of blocking a threadpool worker.
+        """
+        question = standalone_question or await self.astandalone(question, history)
+
+        cached, docs, embedding = await self._aprepare(question)
+        if cached is not None:
+            return cached["answer"], cached["metadata"]
+
+        return await self._aanswer(question, embedding, docs)
+
+    async def _aprepare(self, question: str):
+        """
+        Cheap steps before retrieval, in order: local scope check, exact
+        answer cache, structural lookup, then embed + paraphrase answer
+        cache. Returns (cached_answer, structural_docs, embedding).
+        """
+        with span("scope_check"):
+            refused = self.scope_classifier.is_out_of_scope(question)
+        if refused:
+            ANSWERS.inc(source="refused")
+            return {"answer": OUT_OF_SCOPE_REFUSAL, "metadata": []}, None, None
+
+        with span("answer_cache"):
+            cached = self.answer_cache.lookup_exact(question)
+        self.count_lookup("exact", cached)
+        if cached is not None:
+            ANSWERS.inc(source="cache")
+            return cached, None, None
+
+        with span("structural_lookup"):
+            docs = self.structural_index.resolve(question)
+        self.count_lookup("structural", docs)
+        if docs is not None:
+            return None, docs, None
+
+        with span("embed_query"):
+            embedding = await self.embeddings.aembed_query(question)
+        with span("answer_cache"):
+            cached = self.answer_cache.lookup_similar(embedding)
+        self.count_lookup("semantic", cached)
+        if cached is not None:
+            ANSWERS.inc(source="cache")
+        return cached, None, embedding
+
+    async def _aanswer(self, question: str, embedding, docs=None):
+        """Retrieve with a precomputed query embedding, then generate."""
+        if docs is None:
+            with span("retrieve"):
+                docs = await self.retriever.aretrieve_with_embedding(question, embedding)
+        context, docs = self.context_formatter(docs)
+        record_docs(docs)
+        with span("generate"):
+            answer = await self.answer_chain.ainvoke({"context": context, "question": question})
+        ANSWERS.inc(source="generated")
+
+        metadata_list = self.build_metadata_list(docs)
+
+        self.answer_cache.store(question, answer, metadata_list, embedding)
 
         return answer, metadata_list
 
+    async def abatch_query(self, questions, max_concurrency=None, semaphore=None):
+        """
+        Answers many questions at once. Identical (normalized) questions are
+        answered once, all uncached queries are embedded in one batched call
+        and searched in one batched MMR pass, and LLM calls run with at most
+        `max_concurrency` in flight (or under a caller-shared `semaphore`).
+
+        Returns a list aligned with `questions`: (answer, metadata_list) or
+        the Exception raised for that item.
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max_concurrency or BATCH_MAX_CONCURRENCY)
+
+        # Dedupe: normalized key → first question text with that key
+        keys = [normalize_query(q) for q in questions]
+        unique = {}
+        for key, question in zip(keys, questions):
+            unique.setdefault(key, question)
+
+        outcomes = {}
+        context = {}  # key → (docs, embedding) ready for generation
+        to_embed = []
+        for key, question in unique.items():
+            if self.scope_classifier.is_out_of_scope(question):
+                ANSWERS.inc(source="refused")
+                outcomes[key] = (OUT_OF_SCOPE_REFUSAL, [])
+                continue
+            cached = self.answer_cache.lookup_exact(question)
+            self.count_lookup("exact", cached)
+            if cached is not None:
+                ANSWERS.inc(source="cache")
+                outcomes[key] = (cached["answer"], cached["metadata"])
+                continue
+            docs = self.structural_index.resolve(question)
+            self.count_lookup("structural", docs)
+            if docs is not None:
+                context[key] = (docs, None)
+            else:
+                to_embed.append(key)
+
+        if to_embed:
+            to_search = []
+            try:
+                with span("embed_query_batch"):
+                    vectors = await self.embeddings.aembed_queries([unique[k] for k in to_embed])
+            except Exception as e:
+                outcomes.update({k: e for k in to_embed})
+                vectors = []
+
+            for key, embedding in zip(to_embed, vectors):
+                cached = self.answer_cache.lookup_similar(embedding)
+                self.count_lookup("semantic", cached)
+                if cached is not None:
+                    ANSWERS.inc(source="cache")
+                    outcomes[key] = (cached["answer"], cached["metadata"])
+                else:
+                    to_search.append((key, embedding))
+
+            # ⭐ One batched vector search + MMR pass for every remaining question
+            if to_search:
+                try:
+                    with span("retrieve_batch"):
+                        batch_docs = await self.retriever.aretrieve_batch_with_embeddings(
+                            [unique[k] for k, _ in to_search], [v for _, v in to_search]
+                        )
+                    for (key, embedding), docs in zip(to_search, batch_docs):
+                        context[key] = (docs, embedding)
+                except Exception as e:
+                    outcomes.update({k: e for k, _ in to_search})
+
+        async def generate(key):
+            docs, embedding = context[key]
+            async with semaphore:
+                return await self._aanswer(unique[key], embedding, docs)
+
+        results = await asyncio.gather(
+            *(generate(k) for k in context), return_exceptions=True
+        )
+        outcomes.update(zip(context, results))
+
+        return [outcomes[key] for key in keys]
+
+    async def astream_query(self, question: str, history=None, standalone_question=None):
+        """
+        Async generator of events for /chat/stream:
+          {"event": "sources", "data": metadata_list}   once retrieval is done
+          {"event": "token",   "data": text}            per LLM chunk
+          {"event": "done",    "data": timings}         at the end
+        """
+        start = time.perf_counter()
+
+        def elapsed_ms():
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        question = standalone_question or await self.astandalone(question, history)
+
+        cached, docs, embedding = await self._aprepare(question)
+        if cached is not None:
+            yield {"event": "sources", "data": cached["metadata"]}
+            yield {"event": "token", "data": cached["answer"]}
+            yield {"event": "done", "data": {"cached": True, "total_ms": elapsed_ms()}}
+            return
+
+        # ⭐ Sources go out as soon as retrieval finishes
+        if docs is None:
+            with span("retrieve"):
+                docs = await self.retriever.aretrieve_with_embedding(question, embedding)
+        context, docs = self.context_formatter(docs)
+        retrieval_ms = elapsed_ms()
+        record_docs(docs)
+        metadata_list = self.build_metadata_list(docs)
+        yield {"event": "sources", "data": metadata_list}
+
+        chunks = []
+        first_token_ms = None
+        with span("generate"):
+            async for chunk in self.answer_chain.astream({"context": context, "question": question}):
+                if first_token_ms is None:
+                    first_token_ms = elapsed_ms()
+                    STAGE_SECONDS.observe((first_token_ms - retrieval_ms) / 1000, stage="first_token")
+                chunks.append(chunk)
+                yield {"event": "token", "data": chunk}
+        ANSWERS.inc(source="generated")
+
+        answer = "".join(chunks)
+        self.answer_cache.store(question, answer, metadata_list, embedding)
+
+        yield {
+            "event": "done",
+            "data": {
+                "cached": False,
+                "retrieval_ms": retrieval_ms,
+                "first_token_ms": first_token_ms,
+                "total_ms": elapsed_ms(),
+            },
+        }
+
+
+class MultiCorpusRAGService:
+    """
+    One RAGPipelineService per corpus id, built lazily through a
+    CorpusRegistry (LRU-evicted under CORPUS_MEMORY_CAP_MB). The embedder,
+    LLM, prompt and vector-DB executor are shared by every corpus.
+    """
+
+    def __init__(self, warm=(DEFAULT_CORPUS,), progress=None):
+        # `progress` only follows the warm-up builds; later corpora load quietly
+        self._progress = progress
+        self.shared = build_shared(progress)
+        self.registry = CorpusRegistry(
+            builder=lambda corpus_id: RAGPipelineService(
+                build_pipeline(corpus_id, self.shared, progress=self._progress)
+            ),
+            corpus_ids=corpus_ids(),
+            memory_cap_bytes=int(CORPUS_MEMORY_CAP_MB * 2**20),
+            sizer=lambda service: estimate_pipeline_bytes(service.pipeline),
+        )
+        for corpus_id in warm:
+            self.registry.get(corpus_id)
+        self._progress = None
+        self.sessions = build_session_store()
+
+    def service(self, corpus_id=None) -> RAGPipelineService:
+        """Raises UnknownCorpusError for ids not configured."""
+        return self.registry.get(corpus_id or DEFAULT_CORPUS)
+
+    async def aservice(self, corpus_id=None) -> RAGPipelineService:
+        return await self.registry.aget(corpus_id or DEFAULT_CORPUS)
+
+    @staticmethod
+    def _session(session_key, corpus_id=None):
+        # Sessions are per corpus: history about one corpus must not
+        # rewrite questions sent to another
+        return (corpus_id or DEFAULT_CORPUS, session_key)
+
+    def conversation(self, session_key=None, history=None, corpus_id=None):
+        """
+        Compacted history for a request: the stored session for this
+        corpus when there is one, else the client-supplied `history`
+        ({"role", "content"} dicts).
+        """
+        if session_key:
+            stored = self.sessions.history(self._session(session_key, corpus_id))
+            if stored:
+                return stored
+        return self.sessions.compact(history)
+
+    def remember(self, session_key, question: str, answer: str, corpus_id=None):
+        """Adds a turn (standalone question + answer); refusals are not kept."""
+        if session_key and answer != OUT_OF_SCOPE_REFUSAL:
+            self.sessions.append(self._session(session_key, corpus_id), question, answer)
+
+    async def abatch_query(self, questions, corpus_ids=None, max_concurrency=None):
+        """
+        abatch_query across corpora: questions are grouped by corpus and each
+        group is batched by its own service, all under one concurrency limit.
+        """
+        corpus_ids = [c or DEFAULT_CORPUS for c in (corpus_ids or [None] * len(questions))]
+        semaphore = asyncio.Semaphore(max_concurrency or BATCH_MAX_CONCURRENCY)
+
+        groups = {}
+        for i, corpus_id in enumerate(corpus_ids):
+            groups.setdefault(corpus_id, []).append(i)
+
+        async def run_group(corpus_id, indices):
+            try:
+                service = await self.aservice(corpus_id)
+            except UnknownCorpusError as e:
+                return [e] * len(indices)
+            return await service.abatch_query(
+                [questions[i] for i in indices], semaphore=semaphore
+            )
+
+        group_results = await asyncio.gather(
+            *(run_group(c, idx) for c, idx in groups.items())
+        )
 
-# Global instance for FastAPI
-rag_pipeline = RAGPipelineService()
+        outcomes = [None] * len(questions)
+        for indices, results in zip(groups.values(), group_results):
+            for i, result in zip(indices, results):
+                outcomes[i] = result
+        return outcomes
 
 
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.rag.logs import get_logger
+
+log = get_logger(__name__)
+
+
+# -------------------------------------------------------
+# BACKGROUND PIPELINE WARM-UP
+# -------------------------------------------------------
+class PipelineWarmup:
+    """
+    Builds the RAG service on a daemon thread so the server can bind and
+    answer probes straight away.
+
+    `factory(progress)` does the heavy imports and the build, calling
+    progress(stage, fraction_done) as it goes. Until it returns, `service`
+    is None and status() reports the current stage; a failed build stays
+    failed (the error is reported, the process keeps serving probes).
+    """
+
+    def __init__(self, factory: Callable[[Callable[[str, float], None]], Any]):
+        self.factory = factory
+        self.service: Optional[Any] = None
+        self.state = "pending"
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started_at = time.monotonic()
+            self.state = "building"
+            self.stage = "import"
+            self._thread = threading.Thread(target=self._run, name="pipeline-warmup", daemon=True)
+        self._thread.start()
+
+    def _report(self, stage: str, fraction: float):
+        self.stage = stage
+        self.progress = round(fraction, 3)
+
+    def _run(self):
+        try:
+            service = self.factory(self._report)
+        except Exception as e:
+            log.exception("warmup_failed")
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+            return
+        self.service = service
+        self.ready_at = time.monotonic()
+        log.info("warmup_ready", seconds=round(self.ready_at - self.started_at, 1))
+        self.stage = None
+        self.progress = 1.0
+        self.state = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        now = self.ready_at or time.monotonic()
+        return {
+            "status": self.state,
+            "stage": self.stage,
+            "progress": self.progress,
+            "elapsed_s": round(now - self.started_at, 1) if self.started_at else 0.0,
+            "error": self.error,
+        }
@@ -0,0 +1,361 @@
+"""
+Offline benchmark + load test: chunking, ingest, retrieval and /chat.
+
+benchmarks.fake_openai stands in for the OpenAI API (deterministic
+vectors, canned answers, configurable latency), so no network access or
+API key is needed; indexes and caches go to a temporary directory.
+Results are written as JSON. --baseline compares them with an earlier
+run and exits 1 when a metric is worse by more than --tolerance.
+
+    python -m benchmarks.bench_suite [--output bench_results.json] [--baseline previous.json]
+                                     [--requests 200] [--concurrency 16]
+                                     [--embed-latency-ms 20] [--chat-latency-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Indexes and embedding caches must not come from (or land in) the
+# working tree, or ingest would measure cache hits; app.rag.main reads
+# these when imported below
+WORK_DIR = tempfile.mkdtemp(prefix="rag-bench-")
+os.environ["INDEX_DIR"] = os.path.join(WORK_DIR, "index")
+os.environ["EMBED_CHECKPOINT_PATH"] = ""
+os.environ["QUERY_CACHE_PATH"] = ""
+
+import httpx
+
+from app.rag.main import (
+    DEFAULT_CORPUS,
+    RULEBOOK_PATH,
+    TEMPLATE_PATH,
+    VECTOR_BACKEND,
+    build_pipeline,
+    build_shared,
+    corpus_spec,
+    ingest_corpus,
+)
+from app.rag.rulebook_chunker import chunk_rulebook
+from app.rag.rulebook_loader import load_rulebook
+from app.rag.template_chunker import chunk_template_excel
+from app.rag.template_loader import load_template_excel
+from app.rag.vector_db import add_documents_to_db, create_vector_db
+from benchmarks.bench_template_chunker import time_ms
+from benchmarks.bench_vector_store import percentile, time_queries
+from benchmarks.eval_scope import load_eval_set
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (dotted result path, "higher" | "lower" is better) checked by --baseline
+REGRESSION_CHECKS = (
+    ("chunk_rulebook.chunks_per_s", "higher"),
+    ("chunk_template_excel.chunks_per_s", "higher"),
+    ("add_documents_to_db.chroma.docs_per_s", "higher"),
+    ("add_documents_to_db.numpy.docs_per_s", "higher"),
+    ("ingest_corpus.docs_per_s", "higher"),
+    ("retriever.p50_ms", "lower"),
+    ("retriever.p99_ms", "lower"),
+    ("chat.rps", "higher"),
+    ("chat.p50_ms", "lower"),
+    ("chat.p99_ms", "lower"),
+)
+
+
+# -------------------------------------------------------
+# PROCESSES
+# -------------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(args, env=None, log_name: str = "process") -> subprocess.Popen:
+    log = open(os.path.join(WORK_DIR, f"{log_name}.log"), "wb")
+    return subprocess.Popen(
+        [sys.executable, "-m", *args],
+        cwd=REPO_DIR,
+        env={**os.environ, **(env or {})},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_http(url: str, proc: subprocess.Popen, timeout: float) -> float:
+    """Polls until GET url is 200; returns the seconds waited."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url}: process exited with {proc.returncode} (logs in {WORK_DIR})")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return time.monotonic() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s (logs in {WORK_DIR})")
+
+
+def stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# -------------------------------------------------------
+# WORKLOADS
+# -------------------------------------------------------
+def benchmark_questions(n: int):
+    """n distinct in-scope questions, so answer caches never hit."""
+    base = [e["question"] for e in load_eval_set() if e["in_scope"]]
+    return [f"{base[i % len(base)]} [{i}]" for i in range(n)]
+
+
+def bench_chunking(repeat: int):
+    pages = load_rulebook(RULEBOOK_PATH)
+    rulebook_docs = chunk_rulebook(pages)
+    rulebook_ms = time_ms(lambda: chunk_rulebook(pages), repeat)
+
+    xls = load_template_excel(TEMPLATE_PATH)
+    template_docs = chunk_template_excel(xls)
+    template_ms = time_ms(lambda: chunk_template_excel(xls), repeat)
+
+    results = {
+        "chunk_rulebook": {
+            "pages": len(pages),
+            "chunks": len(rulebook_docs),
+            "median_ms": rulebook_ms,
+            "pages_per_s": round(len(pages) / rulebook_ms * 1000, 1),
+            "chunks_per_s": round(len(rulebook_docs) / rulebook_ms * 1000, 1),
+        },
+        "chunk_template_excel": {
+            "sheets": len(xls.sheet_names),
+            "chunks": len(template_docs),
+            "median_ms": template_ms,
+            "chunks_per_s": round(len(template_docs) / template_ms * 1000, 1),
+        },
+    }
+    return results, rulebook_docs + template_docs
+
+
+def bench_ingest(docs, embeddings):
+    results = {"add_documents_to_db": {}}
+    for backend in ("chroma", "numpy"):
+        store = create_vector_db(embeddings, os.path.join(WORK_DIR, f"add_{backend}"), backend=backend)
+        start = time.perf_counter()
+        add_documents_to_db(store, docs)
+        seconds = time.perf_counter() - start
+        results["add_documents_to_db"][backend] = {
+            "docs": len(docs),
+            "seconds": round(seconds, 3),
+            "docs_per_s": round(len(docs) / seconds, 1),
+        }
+
+    # Streaming ingest from the source files, as the server runs it
+    store = create_vector_db(embeddings, os.path.join(WORK_DIR, "ingest"), backend=VECTOR_BACKEND)
+    start = time.perf_counter()
+    result = ingest_corpus(store, corpus_spec(DEFAULT_CORPUS), embeddings)
+    seconds = time.perf_counter() - start
+    results["ingest_corpus"] = {
+        "backend": VECTOR_BACKEND,
+        "docs": result["added"],
+        "seconds": round(seconds, 3),
+        "docs_per_s": round(result["added"] / seconds, 1),
+        "embedding": result["embedding"],
+    }
+    return results
+
+
+def bench_retriever(shared, n_queries: int):
+    pipeline = build_pipeline(DEFAULT_CORPUS, shared)
+    questions = benchmark_questions(n_queries)
+    vectors = shared["embeddings"].embed_documents(questions)
+    retriever = pipeline["retriever"]
+    return {
+        "backend": VECTOR_BACKEND,
+        "queries": n_queries,
+        **time_queries(lambda qv: retriever.retrieve_with_embedding(*qv), list(zip(questions, vectors))),
+    }
+
+
+async def load_test(base_url: str, questions, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, statuses = [], {}
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=120,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+
+        async def one(question: str):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    status = (await client.post("/chat", json={"question": question})).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                timings.append((time.perf_counter() - start) * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        before = scrape_counter((await client.get("/metrics")).text, "rag_answers_total", "source")
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in questions))
+        wall = time.perf_counter() - start
+        after = scrape_counter((await client.get("/metrics")).text, "rag_answers_total", "source")
+
+    timings.sort()
+    return {
+        "requests": len(questions),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "rps": round(len(questions) / wall, 2),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "status": statuses,
+        "answers": {source: n - before.get(source, 0) for source, n in after.items()},
+    }
+
+
+def scrape_counter(text: str, name: str, label: str):
+    """{label value: count} from one counter family in /metrics output."""
+    counts = {}
+    prefix = f'{name}{{{label}="'
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            key, _, value = line[len(prefix):].partition('"} ')
+            counts[key] = float(value)
+    return counts
+
+
+def bench_chat(stub_url: str, n_requests: int, concurrency: int, warmup: int = 10):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_process(
+        ["uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env={"INDEX_DIR": os.path.join(WORK_DIR, "server"), "OPENAI_BASE_URL": stub_url},
+        log_name="server",
+    )
+    try:
+        ready_s = wait_http(f"{base_url}/ready", server, timeout=900)
+        questions = benchmark_questions(warmup + n_requests)
+        asyncio.run(load_test(base_url, questions[:warmup], min(concurrency, warmup)))
+        result = asyncio.run(load_test(base_url, questions[warmup:], concurrency))
+    finally:
+        stop(server)
+    return {"ready_s": round(ready_s, 2), **result}
+
+
+# -------------------------------------------------------
+# REGRESSIONS
+# -------------------------------------------------------
+def lookup(results: dict, path: str):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for path, better in REGRESSION_CHECKS:
+        new, old = lookup(results, path), lookup(baseline, path)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        if (better == "higher" and change < -tolerance) or (better == "lower" and change > tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": new, "change": round(change, 3)})
+    return regressions
+
+
+# -------------------------------------------------------
+# RUN
+# -------------------------------------------------------
+def run(args):
+    stub_port = free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}/v1"
+    stub = start_process(
+        [
+            "benchmarks.fake_openai",
+            "--port", str(stub_port),
+            "--dim", str(args.dim),
+            "--latency-ms", str(args.embed_latency_ms),
+            "--chat-latency-ms", str(args.chat_latency_ms),
+            "--token-ms", str(args.token_ms),
+            "--chat-tokens", str(args.chat_tokens),
+        ],
+        log_name="fake_openai",
+    )
+    os.environ["OPENAI_BASE_URL"] = stub_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True
+            ).stdout.strip(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "vector_backend": VECTOR_BACKEND,
+            "settings": vars(args),
+        }
+    }
+    try:
+        wait_http(f"http://127.0.0.1:{stub_port}/stats", stub, timeout=30)
+
+        chunking, docs = bench_chunking(args.repeat)
+        results.update(chunking)
+
+        shared = build_shared()
+        results.update(bench_ingest(docs, shared["embeddings"]))
+        results["retriever"] = bench_retriever(shared, args.queries)
+        results["chat"] = bench_chat(stub_url, args.requests, args.concurrency)
+    finally:
+        stop(stub)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--repeat", type=int, default=5, help="chunking timing repeats")
+    parser.add_argument("--queries", type=int, default=200, help="retriever queries")
+    parser.add_argument("--requests", type=int, default=200, help="/chat requests in the load test")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--chat-tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    results = run(args)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["regressions"] = find_regressions(results, json.load(f), args.tolerance)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nresults: {args.output}")
+    for path, _ in REGRESSION_CHECKS:
+        print(f"{path:>40}: {lookup(results, path)}")
+    for r in results.get("regressions", []):
+        print(f"REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+    sys.exit(1 if results.get("regressions") else 0)
@@ -0,0 +1,163 @@
+"""
+Template chunking: row-wise (iterrows) reference vs vectorised chunker.
+
+Runs on the LCR annex workbook. --scale N repeats the cleaned sheets N
+times to approximate a larger annex. Both implementations must produce
+identical documents; the benchmark asserts it before timing.
+
+    python -m benchmarks.bench_template_chunker [--scale 20] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from app.rag.main import TEMPLATE_PATH
+from app.rag.template_chunker import (
+    chunk_template_excel,
+    clean_multiline_items,
+    clean_template_sheet,
+    clean_value,
+    excel_row_splitter,
+)
+from app.rag.template_loader import load_template_excel
+
+
+# -------------------------------------------------------
+# ROW-WISE REFERENCE (the previous implementation)
+# -------------------------------------------------------
+def rowwise_header_row(df: pd.DataFrame):
+    for i in range(len(df)):
+        vals = df.iloc[i].astype(str).str.lower()
+        if "row" in vals.values:
+            return i
+    return None
+
+
+def rowwise_clean_multiline_items(df: pd.DataFrame) -> pd.DataFrame:
+    merged_rows = []
+    buffer = None
+
+    for _, row in df.iterrows():
+        row_code = str(row.get("Row", "")).strip()
+        id_code = str(row.get("ID", "")).strip()
+        item_text = str(row.get("Item", "")).strip()
+
+        is_continuation = (
+            (row_code == "" or row_code.lower() == "nan") and
+            (id_code == "" or id_code.lower() == "nan") and
+            item_text not in ["", "nan"]
+        )
+
+        if is_continuation:
+            if buffer is not None:
+                buffer["Item"] += " " + item_text
+            continue
+
+        if buffer is not None:
+            merged_rows.append(buffer)
+
+        buffer = row.to_dict()
+
+    if buffer:
+        merged_rows.append(buffer)
+
+    return pd.DataFrame(merged_rows)
+
+
+def rowwise_excel_row_splitter(df: pd.DataFrame):
+    docs = []
+
+    for _, row in df.iterrows():
+        item_text = str(row.get("Item", "")).strip()
+
+        if not item_text or item_text.lower() == "nan":
+            continue
+
+        metadata = {
+            "template_sheet": clean_value(row.get("template_sheet")),
+            "template_code": clean_value(row.get("template_code")),
+            "row": clean_value(row.get("Row")),
+            "id_hierarchy": clean_value(row.get("ID")),
+            "doc_type": "lcr_template",
+        }
+        for col in df.columns:
+            if col != "Item":
+                metadata[col] = clean_value(row.get(col))
+
+        docs.append(Document(page_content=item_text, metadata=metadata))
+
+    return docs
+
+
+def rowwise_chunk(xls: pd.ExcelFile, scale: int):
+    sheets = []
+    for sheet in xls.sheet_names:
+        if sheet.lower() in ["index", "readme", "instructions"]:
+            continue
+        raw = pd.read_excel(xls, sheet_name=sheet, header=None)
+        # Previous per-row header scan (clean_template_sheet now does it vectorised)
+        rowwise_header_row(raw.dropna(how="all", axis=0).dropna(how="all", axis=1))
+        cleaned = clean_template_sheet(sheet, raw)
+        if cleaned is not None:
+            sheets.append(cleaned)
+    combined = pd.concat(sheets * scale, ignore_index=True)
+    return rowwise_excel_row_splitter(rowwise_clean_multiline_items(combined))
+
+
+def vectorised_chunk(xls: pd.ExcelFile, scale: int):
+    if scale == 1:
+        return chunk_template_excel(xls)
+    sheets = [s for s in xls.sheet_names if s.lower() not in ["index", "readme", "instructions"]]
+    raw = xls.parse(sheet_name=sheets, header=None)
+    cleaned = [c for c in (clean_template_sheet(s, raw[s]) for s in sheets) if c is not None]
+    combined = pd.concat(cleaned * scale, ignore_index=True)
+    return excel_row_splitter(clean_multiline_items(combined))
+
+
+def same_documents(a, b) -> bool:
+    return len(a) == len(b) and all(
+        x.page_content == y.page_content and x.metadata == y.metadata for x, y in zip(a, b)
+    )
+
+
+def time_ms(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def run(scale: int = 20, repeat: int = 5):
+    xls = load_template_excel(TEMPLATE_PATH)
+
+    results = {}
+    for s in sorted({1, scale}):
+        reference = rowwise_chunk(xls, s)
+        candidate = vectorised_chunk(xls, s)
+        assert same_documents(reference, candidate), f"output differs at scale {s}"
+
+        results[s] = {
+            "documents": len(candidate),
+            "rowwise_ms": time_ms(lambda: rowwise_chunk(xls, s), repeat),
+            "vectorised_ms": time_ms(lambda: vectorised_chunk(xls, s), repeat),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for s, r in run(scale=args.scale, repeat=args.repeat).items():
+        speedup = r["rowwise_ms"] / r["vectorised_ms"] if r["vectorised_ms"] else float("inf")
+        print(
+            f"scale {s:>3}: {r['documents']:>6} docs   rowwise {r['rowwise_ms']:9.2f} ms   "
+            f"vectorised {r['vectorised_ms']:9.2f} ms   x{speedup:.1f}"
+        )
@@ -0,0 +1,115 @@
+"""
+Query latency: Chroma vs in-process NumPy store at our corpus size.
+
+Runs offline: documents are the real rulebook + template chunks, vectors
+come from a deterministic random embedder with text-embedding-3-large's
+dimension (3072), so no OpenAI calls are made.
+
+    python -m benchmarks.bench_vector_store [--queries 200] [--dim 3072]
+"""
+import argparse
+import hashlib
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.rag.main import RULEBOOK_PATH, TEMPLATE_PATH
+from app.rag.mmr import mmr_search_batch
+from app.rag.rulebook_chunker import chunk_rulebook
+from app.rag.rulebook_loader import load_rulebook
+from app.rag.template_chunker import chunk_template_excel
+from app.rag.template_loader import load_template_excel
+from app.rag.vector_db import create_vector_db, sync_documents_to_db
+
+
+class RandomEmbeddings(Embeddings):
+    """Deterministic unit vectors seeded by the text hash."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.model = f"random-{dim}"
+
+    def _vector(self, text: str):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(self.dim)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def time_queries(fn, queries):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+    }
+
+
+def load_corpus():
+    docs = chunk_rulebook(load_rulebook(RULEBOOK_PATH))
+    docs += chunk_template_excel(load_template_excel(TEMPLATE_PATH))
+    return docs
+
+
+def run(n_queries: int = 200, dim: int = 3072, k: int = 6, fetch_k: int = 20):
+    docs = load_corpus()
+    embeddings = RandomEmbeddings(dim)
+    queries = [embeddings.embed_query(f"query {i}") for i in range(n_queries)]
+
+    results = {"documents": len(docs), "dim": dim, "queries": n_queries}
+    for backend in ("chroma", "numpy"):
+        store = create_vector_db(embeddings, tempfile.mkdtemp(), backend=backend)
+        sync_documents_to_db(store, docs)
+        vector_cache = {}
+
+        results[backend] = {
+            "top_k": time_queries(
+                lambda q: store.similarity_search_by_vector(q, k=k), queries
+            ),
+            "mmr": time_queries(
+                lambda q: store.max_marginal_relevance_search_by_vector(q, k=k, fetch_k=fetch_k),
+                queries,
+            ),
+            # app.rag.mmr: candidate vectors fetched with the search, one
+            # candidate-candidate similarity matrix per query
+            "mmr_vec_20": time_queries(
+                lambda q: mmr_search_batch(store, [q], k=k, fetch_k=20, vector_cache=vector_cache),
+                queries,
+            ),
+            "mmr_vec_100": time_queries(
+                lambda q: mmr_search_batch(store, [q], k=k, fetch_k=100, vector_cache=vector_cache),
+                queries,
+            ),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=3072)
+    args = parser.parse_args()
+
+    report = run(n_queries=args.queries, dim=args.dim)
+    print(f"\n{report['documents']} docs, dim={report['dim']}, {report['queries']} queries")
+    for backend in ("chroma", "numpy"):
+        for op in ("top_k", "mmr", "mmr_vec_20", "mmr_vec_100"):
+            r = report[backend][op]
+            print(f"{backend:>7} {op:>11}: p50 {r['p50_ms']:8.3f} ms   p99 {r['p99_ms']:8.3f} ms")
@@ -0,0 +1,81 @@
+"""
+Offline evaluation of the local out-of-scope classifier.
+
+Builds the classifier from the real rulebook + template chunks (no
+OpenAI calls) and scores benchmarks/data/scope_eval.jsonl. A false
+refusal (in-scope question refused locally) is the costly error; a
+missed refusal only means the LLM refuses instead.
+
+    python -m benchmarks.eval_scope [--thresholds 0.2 0.34 0.5] [--min-df 1]
+"""
+import argparse
+import json
+import os
+import time
+
+from app.rag.ingest import iter_rulebook_documents, iter_template_documents
+from app.rag.lexical_index import BM25Index
+from app.rag.main import RULEBOOK_PATH, TEMPLATE_PATH
+from app.rag.scope_classifier import ScopeClassifier
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "scope_eval.jsonl")
+
+
+def load_eval_set(path: str = EVAL_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classifier: ScopeClassifier, examples):
+    tp = fp = fn = tn = 0
+    false_refusals = []
+    start = time.perf_counter()
+    for ex in examples:
+        refused = classifier.is_out_of_scope(ex["question"])
+        if refused and not ex["in_scope"]:
+            tp += 1
+        elif refused:
+            fp += 1
+            false_refusals.append(ex["question"])
+        elif not ex["in_scope"]:
+            fn += 1
+        else:
+            tn += 1
+    per_query_us = (time.perf_counter() - start) / max(1, len(examples)) * 1e6
+
+    return {
+        "refusal_precision": round(tp / (tp + fp), 3) if tp + fp else None,
+        "refusal_recall": round(tp / (tp + fn), 3) if tp + fn else None,
+        "false_refusals": false_refusals,
+        "per_query_us": round(per_query_us, 1),
+    }
+
+
+def run(thresholds=(0.2, 0.34, 0.5, 0.67), min_df: int = 1):
+    # Same vocabulary source as build_pipeline: the BM25 index
+    docs = list(iter_rulebook_documents(RULEBOOK_PATH)) + list(iter_template_documents(TEMPLATE_PATH))
+    lexical_index = BM25Index.from_documents(docs, [str(i) for i in range(len(docs))])
+    examples = load_eval_set()
+
+    return {
+        threshold: evaluate(
+            ScopeClassifier.from_lexical_index(lexical_index, refuse_below=threshold, min_df=min_df),
+            examples,
+        )
+        for threshold in thresholds
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.2, 0.34, 0.5, 0.67])
+    parser.add_argument("--min-df", type=int, default=1)
+    args = parser.parse_args()
+
+    for threshold, r in run(args.thresholds, args.min_df).items():
+        print(
+            f"refuse_below={threshold:<5} precision {r['refusal_precision']}  "
+            f"recall {r['refusal_recall']}  {r['per_query_us']} us/query"
+        )
+        for q in r["false_refusals"]:
+            print(f"    false refusal: {q}")
@@ -0,0 +1,190 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs, for
+offline ingest tests and benchmarks.
+
+Vectors are deterministic per input (text or token ids). Latency and a
+rate of injected 429 responses are configurable, to exercise the
+embedding writer's budget and retry paths. Chat answers are canned text
+of --chat-tokens words, sent after --chat-latency-ms (time to first
+token) and then one word every --token-ms, streamed or not.
+
+    python -m benchmarks.fake_openai [--port 8765] [--latency-ms 50] [--error-rate 0.1]
+                                     [--chat-latency-ms 300] [--token-ms 5] [--chat-tokens 120]
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python -m app.rag.main
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_WORDS = (
+    "Under the PRA rulebook the LCR requires institutions to hold liquid assets "
+    "covering net liquidity outflows over a thirty day stress period"
+).split()
+
+
+def fake_vector(value, dim: int) -> np.ndarray:
+    seed = int(hashlib.sha256(json.dumps(value).encode("utf-8")).hexdigest()[:8], 16)
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def fake_answer(n_tokens: int) -> list:
+    return [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(n_tokens)]
+
+
+def create_app(
+    dim: int = 3072,
+    latency_ms: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+    chat_latency_ms: float = 0.0,
+    token_ms: float = 0.0,
+    chat_tokens: int = 120,
+) -> FastAPI:
+    app = FastAPI(title="fake-openai")
+    rng = random.Random(seed)
+    app.state.stats = {"requests": 0, "inputs": 0, "rate_limited": 0, "chat_requests": 0}
+
+    @app.post("/v1/embeddings")
+    @app.post("/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+        if error_rate and rng.random() < error_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": "50"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        stats["inputs"] += len(inputs)
+
+        data = []
+        for i, value in enumerate(inputs):
+            vector = fake_vector(value, body.get("dimensions") or dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(len(v) if isinstance(v, list) else len(v.split()) for v in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.stats["chat_requests"] += 1
+
+        model = body.get("model", "fake")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{app.state.stats['chat_requests']}"
+        words = fake_answer(chat_tokens)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+
+        if chat_latency_ms:
+            await asyncio.sleep(chat_latency_ms / 1000)
+
+        if not body.get("stream"):
+            if token_ms:
+                await asyncio.sleep(token_ms * len(words) / 1000)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish_reason=None, **extra):
+            choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                if token_ms and i:
+                    await asyncio.sleep(token_ms / 1000)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--chat-tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            dim=args.dim,
+            latency_ms=args.latency_ms,
+            error_rate=args.error_rate,
+            chat_latency_ms=args.chat_latency_ms,
+            token_ms=args.token_ms,
+            chat_tokens=args.chat_tokens,
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,250 @@
+"""
+Retrieval parameter sweep: recall@k vs prompt tokens vs latency.
+
+Scores every combination of rulebook chunk_size / chunk_overlap and
+retriever k / fetch_k / MMR lambda on benchmarks/data/retrieval_golden.jsonl
+(questions with the articles and template rows that should be retrieved)
+and reports the Pareto frontier plus the cheapest configuration whose
+recall is within --recall-tolerance of the best.
+
+Each chunking setting is embedded once, through the ingest checkpoint
+(EMBED_CHECKPOINT_PATH), so chunks shared between settings — and every
+chunk on a rerun — cost no embedding calls; golden questions go through
+the query cache (QUERY_CACHE_PATH). Retrieval-only settings reuse the
+same in-memory store. Searches run as the unrouted hybrid retriever
+(QUERY_ROUTING=0) without the structural lookup; one row per chunking
+setting scores the current routed configuration for reference.
+
+    python -m benchmarks.tune_retrieval [--k 3 4 6 8] [--fetch-k 10 20 40] [--lambda 0.3 0.5 0.7 1.0]
+                                        [--chunk-size 500 700 1000] [--chunk-overlap 100]
+                                        [--output tuning_results.json]
+
+Apply the pick with RETRIEVER_K, RETRIEVER_FETCH_K, MMR_LAMBDA,
+RULEBOOK_CHUNK_SIZE and RULEBOOK_CHUNK_OVERLAP.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+
+from app.rag.embedder import get_cached_embedder, get_embedder
+from app.rag.formatter import format_docs
+from app.rag.ingest import run_ingest
+from app.rag.lexical_index import BM25Index
+from app.rag.main import (
+    CONTEXT_TOKEN_BUDGET,
+    LLM_MODEL,
+    QUERY_CACHE_PATH,
+    QUERY_ROUTES,
+    RULEBOOK_PATH,
+    TEMPLATE_PATH,
+    embedding_writer,
+)
+from app.rag.numpy_store import NumpyVectorStore
+from app.rag.prompt_builder import get_regulatory_prompt
+from app.rag.retriever import DEFAULT_FETCH_K, DEFAULT_K, DEFAULT_LAMBDA_MULT, get_combined_retriever
+from app.rag.rulebook_chunker import chunk_rulebook
+from app.rag.rulebook_loader import load_rulebook
+from app.rag.structural_index import StructuralIndex, normalize_row
+from app.rag.template_chunker import chunk_template_excel
+from app.rag.template_loader import load_template_excel
+from app.rag.tokens import count_tokens, get_token_encoding
+from benchmarks.bench_vector_store import time_queries
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval_golden.jsonl")
+
+
+def load_golden_set(path: str = GOLDEN_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# -------------------------------------------------------
+# SCORING
+# -------------------------------------------------------
+def target_keys(example) -> set:
+    """Expected targets as "article:<n>" / "row:<sheet>/<row>" keys."""
+    keys = {f"article:{a.lower()}" for a in example.get("articles", [])}
+    for ref in example.get("rows", []):
+        sheet, _, row = ref.partition("/")
+        keys.add(f"row:{sheet}/{normalize_row(row)}")
+    return keys
+
+
+def article_lookup(rulebook_docs):
+    """Chunk text → article number, with continuation chunks under their article."""
+    index = StructuralIndex.from_documents(rulebook_docs)
+    return {
+        rulebook_docs[position].page_content: number
+        for number, occurrences in index.articles.items()
+        for _, positions in occurrences
+        for position in positions
+    }
+
+
+def retrieved_keys(docs, articles) -> set:
+    keys = set()
+    for d in docs:
+        md = d.metadata
+        if md.get("doc_type") == "lcr_template":
+            keys.add(f"row:{md.get('template_sheet')}/{normalize_row(md.get('row'))}")
+        elif d.page_content in articles:
+            keys.add(f"article:{articles[d.page_content]}")
+    return keys
+
+
+def score(retriever, golden, vectors, articles, prompt, encoding):
+    recalls, prompt_tokens, n_docs = [], [], []
+    for example, vector in zip(golden, vectors):
+        docs = retriever.retrieve_with_embedding(example["question"], vector)
+        expected = target_keys(example)
+        recalls.append(len(expected & retrieved_keys(docs, articles)) / len(expected))
+
+        context, kept = format_docs(docs, max_tokens=CONTEXT_TOKEN_BUDGET, encoding=encoding)
+        messages = prompt.format_messages(context=context, question=example["question"])
+        prompt_tokens.append(sum(count_tokens(m.content, encoding) for m in messages))
+        n_docs.append(len(kept))
+
+    # Second pass for latency: candidate vectors are cached by now, as in serving
+    latency = time_queries(
+        lambda qv: retriever.retrieve_with_embedding(*qv),
+        [(e["question"], v) for e, v in zip(golden, vectors)],
+    )
+    return {
+        "recall": round(statistics.mean(recalls), 4),
+        "prompt_tokens": round(statistics.mean(prompt_tokens), 1),
+        "docs": round(statistics.mean(n_docs), 2),
+        **latency,
+    }
+
+
+def pareto_frontier(rows):
+    """Rows no other row beats on recall, prompt tokens and p50 latency at once."""
+    def dominates(a, b):
+        no_worse = (
+            a["recall"] >= b["recall"]
+            and a["prompt_tokens"] <= b["prompt_tokens"]
+            and a["p50_ms"] <= b["p50_ms"]
+        )
+        better = (
+            a["recall"] > b["recall"]
+            or a["prompt_tokens"] < b["prompt_tokens"]
+            or a["p50_ms"] < b["p50_ms"]
+        )
+        return no_worse and better
+
+    return [r for r in rows if not any(dominates(o, r) for o in rows if o is not r)]
+
+
+def recommend(rows, recall_tolerance: float):
+    best = max(r["recall"] for r in rows)
+    keep = [r for r in rows if r["recall"] >= best - recall_tolerance]
+    return min(keep, key=lambda r: (r["prompt_tokens"], r["p50_ms"]))
+
+
+# -------------------------------------------------------
+# SWEEP
+# -------------------------------------------------------
+def index_corpus(embeddings, rulebook_docs, template_docs):
+    store = NumpyVectorStore(embeddings)
+    result = run_ingest(
+        store,
+        sources={"rulebook": lambda: rulebook_docs, "template": lambda: template_docs},
+        writer=embedding_writer(embeddings),
+    )
+    ids = result["ids"]
+    lexical_index = BM25Index.from_documents([result["docs"][i] for i in ids], ids)
+    return store, lexical_index, result["embedding"]
+
+
+def sweep(args):
+    golden = load_golden_set(args.golden)
+    query_embedder = get_cached_embedder(cache_path=QUERY_CACHE_PATH or None)
+    vectors = [query_embedder.embed_query(e["question"]) for e in golden]
+
+    embeddings = get_embedder()
+    prompt = get_regulatory_prompt()
+    encoding = get_token_encoding(LLM_MODEL)
+    pages = load_rulebook(RULEBOOK_PATH)
+    template_docs = chunk_template_excel(load_template_excel(TEMPLATE_PATH))
+
+    rows = []
+    for chunk_size, chunk_overlap in itertools.product(args.chunk_size, args.chunk_overlap):
+        if chunk_overlap >= chunk_size:
+            continue
+        rulebook_docs = chunk_rulebook(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        store, lexical_index, embedding_stats = index_corpus(embeddings, rulebook_docs, template_docs)
+        articles = article_lookup(rulebook_docs)
+        print(
+            f"chunk_size={chunk_size} overlap={chunk_overlap}: {len(rulebook_docs)} rulebook chunks, "
+            f"{embedding_stats['checkpoint_hits']} checkpointed, {embedding_stats['requests']} embedding requests"
+        )
+        chunking = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunks": len(store)}
+
+        for k, fetch_k, lambda_mult in itertools.product(args.k, args.fetch_k, args.lambda_mult):
+            if fetch_k < k:
+                continue
+            retriever = get_combined_retriever(
+                store, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, lexical_index=lexical_index
+            )
+            rows.append({
+                **chunking,
+                "routing": False,
+                "k": k,
+                "fetch_k": fetch_k,
+                "lambda_mult": lambda_mult,
+                **score(retriever, golden, vectors, articles, prompt, encoding),
+            })
+
+        retriever = get_combined_retriever(store, lexical_index=lexical_index, routes=QUERY_ROUTES)
+        rows.append({
+            **chunking,
+            "routing": True,
+            "k": None,
+            "fetch_k": None,
+            "lambda_mult": DEFAULT_LAMBDA_MULT,
+            **score(retriever, golden, vectors, articles, prompt, encoding),
+        })
+    return golden, rows
+
+
+def describe(row) -> str:
+    search = "routed (QUERY_ROUTES)" if row["routing"] else (
+        f"k={row['k']:<3} fetch_k={row['fetch_k']:<3} lambda={row['lambda_mult']:<4}"
+    )
+    return (
+        f"chunk={row['chunk_size']}/{row['chunk_overlap']:<4} {search:<32} "
+        f"recall {row['recall']:.3f}  tokens {row['prompt_tokens']:8.1f}  "
+        f"p50 {row['p50_ms']:7.3f} ms  p99 {row['p99_ms']:7.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 4, DEFAULT_K, 8, 10])
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[10, DEFAULT_FETCH_K, 40])
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, nargs="+", default=[0.3, DEFAULT_LAMBDA_MULT, 0.7, 1.0])
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[500, 700, 1000])
+    parser.add_argument("--chunk-overlap", type=int, nargs="+", default=[100])
+    parser.add_argument("--recall-tolerance", type=float, default=0.02)
+    parser.add_argument("--output", default="tuning_results.json")
+    args = parser.parse_args()
+
+    golden, rows = sweep(args)
+    frontier = pareto_frontier(rows)
+    pick = recommend(rows, args.recall_tolerance)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {"golden": len(golden), "configs": rows, "pareto": frontier, "recommended": pick},
+            f,
+            indent=2,
+        )
+
+    print(f"\n{len(rows)} configurations on {len(golden)} golden questions → {args.output}")
+    print("\nPareto frontier (recall ↑, prompt tokens ↓, p50 ↓):")
+    for row in sorted(frontier, key=lambda r: (-r["recall"], r["prompt_tokens"])):
+        print("  " + describe(row))
+    print(f"\nCheapest within {args.recall_tolerance} of best recall:\n  " + describe(pick))
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.rag.answer_cache import AnswerCache
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "rag", "data")
+
+
+@pytest.fixture
+def rulebook_path():
+    return os.path.join(DATA_DIR, "Liquidity Coverage Ratio (CRR)_26-11-2025.pdf")
+
+
+@pytest.fixture
+def template_path():
+    return os.path.join(DATA_DIR, "Annex XXIV - LCR templates_for publication.xlsx")
+
+
+@pytest.fixture
+def chunks_digest():
+    """sha256 over chunk texts and metadata, in order."""
+
+    def digest(docs) -> str:
+        h = hashlib.sha256()
+        for d in docs:
+            h.update(d.page_content.encode("utf-8"))
+            h.update(b"\0")
+            h.update(json.dumps(d.metadata, sort_keys=True, default=str).encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    return digest
+
+
+class FakeClock:
+    """Stands in for time.time() in TTL tests."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def fake_vector(text: str, dim: int = 64) -> list:
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(dim).tolist()
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def aembed_query(self, text):
+        self.calls.append([text])
+        return fake_vector(text)
+
+    async def aembed_queries(self, texts):
+        self.calls.append(list(texts))
+        return [fake_vector(t) for t in texts]
+
+
+class FakeRetriever:
+    async def aretrieve_with_embedding(self, question, embedding):
+        return [Document(page_content=f"context for {question}", metadata={"page": 1})]
+
+    async def aretrieve_batch_with_embeddings(self, questions, embeddings):
+        return [await self.aretrieve_with_embedding(q, e) for q, e in zip(questions, embeddings)]
+
+
+class FakeAnswerChain:
+    """Records every generation and the peak number running at once."""
+
+    def __init__(self):
+        self.questions = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs):
+        self.questions.append(inputs["question"])
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return f"answer to {inputs['question']}"
+
+    async def astream(self, inputs):
+        self.questions.append(inputs["question"])
+        for token in ("answer ", "to ", inputs["question"]):
+            yield token
+
+
+class FakeRewriter:
+    def __init__(self):
+        self.calls = 0
+
+    async def arewrite(self, question, history):
+        if not history:
+            return question
+        self.calls += 1
+        return f"{question} (standalone)"
+
+
+class NoStructuralMatch:
+    def resolve(self, question):
+        return None
+
+
+class InScope:
+    def is_out_of_scope(self, question):
+        return False
+
+
+@pytest.fixture
+def fake_pipeline():
+    """Pipeline dict for RAGPipelineService with no OpenAI, index or disk."""
+    return {
+        "combined_rag_with_sources": None,
+        "answer_chain": FakeAnswerChain(),
+        "context_formatter": lambda docs: ("\n".join(d.page_content for d in docs), list(docs)),
+        "retriever": FakeRetriever(),
+        "embeddings": FakeEmbeddings(),
+        "answer_cache": AnswerCache("v1"),
+        "structural_index": NoStructuralMatch(),
+        "scope_classifier": InScope(),
+        "query_rewriter": FakeRewriter(),
+    }
@@ -0,0 +1,51 @@
+from app.rag import answer_cache
+from app.rag.answer_cache import AnswerCache, compute_corpus_version
+from app.rag.prompt_builder import get_regulatory_prompt
+
+
+def test_answer_cache_ttl(monkeypatch, clock):
+    monkeypatch.setattr(answer_cache.time, "time", clock.time)
+    cache = AnswerCache("v1", ttl_seconds=60)
+
+    cache.store("What is HQLA?", "answer", [{"page": 1}])
+    assert cache.lookup_exact("what is  HQLA?")["answer"] == "answer"
+
+    clock.now += 61
+    assert cache.lookup_exact("What is HQLA?") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_answer_cache_lru_eviction():
+    cache = AnswerCache("v1", max_entries=2)
+    cache.store("q1", "a1", [])
+    cache.store("q2", "a2", [])
+    assert cache.lookup_exact("q1") is not None  # q2 is now least recent
+
+    cache.store("q3", "a3", [])
+    assert cache.lookup_exact("q2") is None
+    assert cache.lookup_exact("q1")["answer"] == "a1"
+    assert cache.lookup_exact("q3")["answer"] == "a3"
+
+
+def test_answer_cache_version_change_clears():
+    cache = AnswerCache("v1")
+    cache.store("q1", "a1", [])
+    cache.set_version("v2")
+    assert cache.lookup_exact("q1") is None
+
+
+def test_semantic_lookup_respects_threshold():
+    cache = AnswerCache("v1", similarity_threshold=0.97)
+    cache.store("What is HQLA?", "answer", [], embedding=[1.0, 0.0, 0.0])
+
+    assert cache.lookup_similar([0.99, 0.05, 0.0])["answer"] == "answer"
+    assert cache.lookup_similar([0.7, 0.7, 0.0]) is None
+
+
+def test_corpus_version_tracks_chunks_prompt_and_llm():
+    prompt = get_regulatory_prompt()
+    base = compute_corpus_version(["a", "b"], prompt, "gpt-4.1-mini")
+
+    assert compute_corpus_version(["b", "a"], prompt, "gpt-4.1-mini") == base
+    assert compute_corpus_version(["a", "c"], prompt, "gpt-4.1-mini") != base
+    assert compute_corpus_version(["a", "b"], prompt, "gpt-4o") != base
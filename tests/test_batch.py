@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from app.models import BATCH_MAX_REQUESTS, BatchChatRequest, ChatRequest
+from app.services.rag_service import RAGPipelineService
+
+
+def test_batch_dedupes_normalized_questions(fake_pipeline):
+    service = RAGPipelineService(fake_pipeline)
+    questions = ["What is HQLA?", "what is  hqla?", "What is the LCR?"]
+
+    outcomes = asyncio.run(service.abatch_query(questions))
+
+    assert outcomes[0] == outcomes[1]
+    assert sorted(fake_pipeline["answer_chain"].questions) == ["What is HQLA?", "What is the LCR?"]
+    # One batched embedding call for every question that needs one
+    assert fake_pipeline["embeddings"].calls == [["What is HQLA?", "What is the LCR?"]]
+
+
+def test_batch_caps_concurrent_generations(fake_pipeline):
+    service = RAGPipelineService(fake_pipeline)
+    questions = [f"What is the outflow rate for category {i}?" for i in range(20)]
+
+    outcomes = asyncio.run(service.abatch_query(questions, max_concurrency=3))
+
+    assert len(outcomes) == 20 and not any(isinstance(o, Exception) for o in outcomes)
+    assert fake_pipeline["answer_chain"].peak == 3
+
+
+def test_batch_request_accepts_a_compliance_checklist():
+    requests = [ChatRequest(question=f"Question {i}") for i in range(500)]
+    assert len(BatchChatRequest(requests=requests).requests) == 500
+
+
+def test_batch_request_limits():
+    with pytest.raises(ValidationError):
+        BatchChatRequest(requests=[ChatRequest(question="q")] * (BATCH_MAX_REQUESTS + 1))
+    with pytest.raises(ValidationError):
+        BatchChatRequest(requests=[ChatRequest(question="q")], max_concurrency=0)
+
+
+@pytest.mark.parametrize(
+    "item",
+    [
+        {"question": "and for Level 2B?", "session_id": "s1"},
+        {"question": "and for Level 2B?", "history": [{"role": "user", "content": "What is HQLA?"}]},
+    ],
+)
+def test_batch_rejects_conversation_fields(item):
+    with pytest.raises(ValidationError, match="not supported in /chat/batch"):
+        BatchChatRequest(requests=[ChatRequest(question="What is HQLA?"), ChatRequest(**item)])
@@ -0,0 +1,87 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.rag import conversation
+from app.rag.conversation import QueryRewriter, SessionStore, is_follow_up
+from app.rag.prompt_builder import get_rewrite_prompt
+from app.services.rag_service import MultiCorpusRAGService
+
+
+def test_session_store_lru_eviction():
+    store = SessionStore(max_sessions=2)
+    store.append("s1", "q1", "a1")
+    store.append("s2", "q2", "a2")
+    assert store.history("s1")  # s2 is now least recent
+
+    store.append("s3", "q3", "a3")
+    assert store.history("s2") == []
+    assert store.history("s1") and store.history("s3")
+    assert store.stats()["evicted"] == 1
+
+
+def test_session_store_idle_ttl(monkeypatch, clock):
+    monkeypatch.setattr(conversation.time, "time", clock.time)
+    store = SessionStore(ttl_seconds=60)
+
+    store.append("s1", "q1", "a1")
+    clock.now += 61
+    assert store.history("s1") == []
+    assert store.stats()["expired"] == 1
+
+
+def test_session_store_truncates_long_turn():
+    store = SessionStore(history_tokens=50)
+    store.append("s1", "x " * 500, "short answer")
+
+    window = store.history("s1")
+    assert [m["role"] for m in window] == ["user", "assistant"]
+    assert 0 < len(window[0]["content"]) < len("x " * 500)
+
+
+def test_compact_bounds_client_history():
+    store = SessionStore(max_messages=4, answer_tokens=5, history_tokens=800)
+    history = []
+    for i in range(5):
+        history += [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": "word " * 100}]
+
+    window = store.compact(history)
+
+    assert len(window) == 4
+    assert window[-1]["role"] == "assistant" and len(window[-1]["content"]) < len("word " * 100)
+
+
+def test_sessions_are_kept_per_corpus():
+    service = MultiCorpusRAGService.__new__(MultiCorpusRAGService)
+    service.sessions = SessionStore()
+
+    service.remember("s1", "What is HQLA?", "High quality liquid assets.", corpus_id="pra_lcr")
+
+    assert service.conversation("s1", corpus_id="pra_lcr")
+    assert service.conversation("s1", corpus_id="other") == []
+
+
+@pytest.mark.parametrize(
+    "question, follow_up",
+    [
+        ("and for Level 2B?", True),
+        ("Where is that reported?", True),
+        ("What is the haircut on Level 2B assets?", False),
+    ],
+)
+def test_is_follow_up(question, follow_up):
+    assert is_follow_up(question) is follow_up
+
+
+def test_rewriter_calls_llm_once_per_follow_up_and_history():
+    llm = FakeListChatModel(responses=["What is the haircut on Level 2B assets?"])
+    rewriter = QueryRewriter(llm, get_rewrite_prompt())
+    history = [
+        {"role": "user", "content": "What is the haircut on Level 2A assets?"},
+        {"role": "assistant", "content": "15%."},
+    ]
+
+    assert rewriter.rewrite("and for Level 2B?", history) == "What is the haircut on Level 2B assets?"
+    assert rewriter.rewrite("and for Level 2B?", history) == "What is the haircut on Level 2B assets?"
+    assert rewriter.rewrite("What is the LCR?", history) == "What is the LCR?"
+    assert rewriter.rewrite("and for Level 2B?", []) == "and for Level 2B?"
+    assert rewriter.stats() == {"entries": 1, "hits": 1, "misses": 1, "skipped": 1}
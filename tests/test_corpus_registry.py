@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from app.rag.corpus_registry import CorpusRegistry, UnknownCorpusError
+
+
+def test_corpora_are_built_once_on_first_use():
+    built = []
+    registry = CorpusRegistry(lambda cid: built.append(cid) or {"id": cid}, ["pra", "eba"])
+
+    assert registry.peek("pra") is None
+    assert registry.get("pra") is registry.get("pra")
+    assert built == ["pra"]
+    with pytest.raises(UnknownCorpusError):
+        registry.get("fca")
+
+
+def test_least_recently_used_corpus_is_evicted_over_the_cap():
+    registry = CorpusRegistry(
+        lambda cid: {"id": cid}, ["a", "b", "c"], memory_cap_bytes=250, sizer=lambda obj: 100
+    )
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now least recently used
+    registry.get("c")
+
+    assert [cid for cid, _ in registry.loaded()] == ["a", "c"]
+    assert registry.stats()["memory_bytes"] == 200
+    assert registry.evictions == 1
+
+
+def test_the_requested_corpus_is_kept_even_above_the_cap():
+    registry = CorpusRegistry(lambda cid: {"id": cid}, ["a", "b"], memory_cap_bytes=50, sizer=lambda obj: 100)
+    registry.get("a")
+    registry.get("b")
+
+    assert [cid for cid, _ in registry.loaded()] == ["b"]
+
+
+def test_concurrent_first_requests_build_once():
+    gate = threading.Event()
+    builds = []
+
+    def builder(cid):
+        builds.append(cid)
+        gate.wait(1)
+        return {"id": cid}
+
+    registry = CorpusRegistry(builder, ["pra"])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("pra"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert builds == ["pra"]
+    assert all(r is results[0] for r in results)
@@ -0,0 +1,92 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from app.rag.embedding_writer import EmbeddingWriter, is_retryable, retry_after
+from app.rag.ingest import run_ingest
+from app.rag.numpy_store import NumpyVectorStore
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class FlakyEmbeddings(Embeddings):
+    """Fails the first `failures` calls with `error`, records every batch."""
+
+    def __init__(self, failures=0, error=None):
+        self.inner = DeterministicFakeEmbedding(size=8)
+        self.failures = failures
+        self.error = error
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+
+def test_retryable_failures_are_retried_and_counted():
+    embeddings = FlakyEmbeddings(failures=2, error=StatusError(429))
+    writer = EmbeddingWriter(embeddings, backoff_base=0.0)
+
+    vectors = writer.embed(["level 1 assets", "outflows"])
+
+    assert len(vectors) == 2
+    assert len(embeddings.batches) == 3
+    assert writer.stats()["retries"] == 2 and writer.stats()["requests"] == 1
+
+
+def test_client_errors_are_not_retried():
+    embeddings = FlakyEmbeddings(failures=1, error=StatusError(400))
+    writer = EmbeddingWriter(embeddings, backoff_base=0.0)
+
+    with pytest.raises(StatusError):
+        writer.embed(["level 1 assets"])
+    assert writer.stats()["retries"] == 0
+
+
+def test_retry_after_header_is_read_in_seconds():
+    assert retry_after(StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(StatusError(429)) is None
+    assert is_retryable(StatusError(503)) and not is_retryable(StatusError(404))
+
+
+def test_checkpointed_texts_are_not_embedded_again(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    texts = ["level 1 assets", "outflows"]
+    first = EmbeddingWriter(DeterministicFakeEmbedding(size=8), checkpoint_path=path)
+    vectors = first.embed(texts)
+
+    embeddings = FlakyEmbeddings()
+    second = EmbeddingWriter(embeddings, model_name=first.model, checkpoint_path=path)
+
+    assert second.embed(texts + ["inflows"]) == vectors + [embeddings.embed_query("inflows")]
+    assert embeddings.batches == [["inflows"]]
+    assert second.stats()["checkpoint_hits"] == 2
+
+
+def test_ingest_batches_stay_within_the_token_budget(tmp_path):
+    embeddings = FlakyEmbeddings()
+    writer = EmbeddingWriter(embeddings, max_batch_tokens=40)
+    docs = [
+        Document(page_content=f"Article {i} outflows from retail deposits", metadata={"doc_type": "pra_rulebook"})
+        for i in range(12)
+    ]
+    store = NumpyVectorStore(embeddings, persist_directory=str(tmp_path))
+
+    result = run_ingest(store, {"rulebook": lambda: docs}, writer=writer, embed_workers=2)
+
+    assert result["added"] == 12
+    assert len(embeddings.batches) > 1
+    assert all(sum(writer.count_tokens(t) for t in batch) <= 40 for batch in embeddings.batches)
+    assert writer.stats()["tokens"] == sum(writer.count_tokens(d.page_content) for d in docs)
@@ -0,0 +1,88 @@
+from langchain_core.documents import Document
+
+from app.rag.formatter import (
+    DOC_SEPARATOR,
+    MIN_OVERLAP_CHARS,
+    assemble_context,
+    format_docs,
+    merge_spans,
+    overlap_length,
+)
+from app.rag.tokens import count_tokens
+
+TEXT = " ".join(f"token{i}" for i in range(200))
+
+
+def test_overlap_length_finds_longest_suffix_prefix():
+    left, right = TEXT[:500], TEXT[400:900]
+    assert overlap_length(left, right) == 100
+
+
+def test_overlap_below_floor_is_ignored():
+    left = "x" * 200 + " the institution shall"
+    right = "the institution shall report " + "y" * 200
+    assert len(" the institution shall") < MIN_OVERLAP_CHARS
+    assert overlap_length(left, right) == 0
+    assert merge_spans([left, right]) == [left, right]
+
+
+def test_merge_spans_stitches_neighbours_in_any_rank_order():
+    a, b, c = TEXT[:500], TEXT[400:900], TEXT[800:1300]
+    expected = [TEXT[:1300]]
+    assert merge_spans([a, b, c]) == expected
+    assert merge_spans([c, a, b]) == expected
+    assert merge_spans([b, c, a]) == expected
+
+
+def test_merge_spans_drops_contained_chunks():
+    assert merge_spans([TEXT[:600], TEXT[100:300]]) == [TEXT[:600]]
+
+
+def test_merge_spans_keeps_unrelated_chunks_apart():
+    a, c = TEXT[:300], TEXT[900:1200]
+    assert merge_spans([a, c]) == [a, c]
+
+
+def rulebook_doc(text, article="Article 10 Level 1 Assets", page=3):
+    header = f"Article: {article}\n\n"
+    return Document(
+        page_content=header + text,
+        metadata={"doc_type": "pra_rulebook", "article": article, "page": page},
+    )
+
+
+def test_assemble_context_emits_each_header_once_and_merges_chunks():
+    docs = [rulebook_doc(TEXT[:500]), rulebook_doc(TEXT[400:900])]
+
+    context = assemble_context(docs)
+
+    assert context.count("[Article: Article 10 Level 1 Assets | Page: 3 | Source: pra_rulebook]") == 1
+    assert TEXT[:900] in context
+    assert "Article: Article 10 Level 1 Assets\n\n" not in context  # structural header stripped
+
+
+def test_format_docs_without_budget_keeps_every_doc():
+    docs = [rulebook_doc(TEXT[:300], page=p) for p in range(5)]
+
+    context, kept = format_docs(docs)
+
+    assert kept == docs
+    assert context.count(DOC_SEPARATOR) == 4
+
+
+def test_format_docs_budget_keeps_a_rank_prefix():
+    docs = [rulebook_doc(TEXT[i * 300:(i + 1) * 300], page=i) for i in range(5)]
+    budget = count_tokens(assemble_context(docs[:3]))
+
+    context, kept = format_docs(docs, max_tokens=budget)
+
+    assert kept == docs[:3]
+    assert context == assemble_context(docs[:3])
+
+
+def test_format_docs_always_keeps_the_top_doc():
+    docs = [rulebook_doc(TEXT[:600], page=1), rulebook_doc(TEXT[600:1200], page=2)]
+
+    _, kept = format_docs(docs, max_tokens=1)
+
+    assert kept == docs[:1]
@@ -0,0 +1,69 @@
+import os
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import app.rag.main as rag_main
+from app.rag import ingest, rulebook_chunker, rulebook_loader
+from app.rag.ingest import run_ingest
+from app.rag.numpy_store import NumpyVectorStore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "rag", "data")
+RULEBOOK_PATH = os.path.join(DATA_DIR, "Liquidity Coverage Ratio (CRR)_26-11-2025.pdf")
+
+
+def doc(text: str) -> Document:
+    return Document(page_content=text, metadata={"doc_type": "pra_rulebook"})
+
+
+def test_ingest_corpus_default_workers_use_process_pool(monkeypatch):
+    # INGEST_WORKERS=0 means all CPUs; with enough pages per worker the
+    # rulebook must go through the sharded chunker
+    monkeypatch.setattr(rag_main, "INGEST_WORKERS", 0)
+    monkeypatch.setattr(ingest.os, "cpu_count", lambda: 4)
+    for module in (ingest, rulebook_loader, rulebook_chunker):
+        monkeypatch.setattr(module, "MIN_PAGES_PER_SHARD", 8)
+
+    calls = []
+    chunk_rulebook = ingest.chunk_rulebook
+
+    def spy(documents, workers=None, **kwargs):
+        calls.append(workers)
+        return chunk_rulebook(documents, workers=workers, **kwargs)
+
+    monkeypatch.setattr(ingest, "chunk_rulebook", spy)
+    monkeypatch.setattr(rag_main, "embedding_writer", lambda embeddings: None)
+    monkeypatch.setattr(
+        rag_main, "run_ingest", lambda vectorstore, sources, **kwargs: list(sources["rulebook"]())
+    )
+
+    chunks = rag_main.ingest_corpus(None, {"rulebook": RULEBOOK_PATH}, None)
+
+    assert calls == [4]
+    assert len(chunks) == 440
+
+
+def test_run_ingest_deletes_stale_ids_and_skips_invalid_items(tmp_path):
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=16), persist_directory=str(tmp_path))
+
+    first = run_ingest(store, {"rulebook": lambda: [doc("one"), doc("two")]})
+    assert first["added"] == 2 and first["deleted"] == 0
+
+    second = run_ingest(store, {"rulebook": lambda: [doc("two"), 42, doc("three")]})
+    assert second["added"] == 1
+    assert second["deleted"] == 1
+    assert sorted(store.get(include=[])["ids"]) == second["ids"]
+    assert sorted(d.page_content for d in second["docs"].values()) == ["three", "two"]
+
+    reloaded = NumpyVectorStore(DeterministicFakeEmbedding(size=16), persist_directory=str(tmp_path))
+    assert sorted(reloaded.get(include=[])["ids"]) == second["ids"]
+
+
+def test_run_ingest_is_a_no_op_when_nothing_changed(tmp_path):
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=16), persist_directory=str(tmp_path))
+    sources = {"rulebook": lambda: [doc("one"), doc("two")]}
+
+    run_ingest(store, sources)
+    again = run_ingest(store, sources)
+
+    assert again["added"] == 0 and again["deleted"] == 0
@@ -0,0 +1,56 @@
+import json
+
+from langchain_core.documents import Document
+
+from app.rag import lexical_index
+from app.rag.lexical_index import BM25Index, load_or_build_bm25, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    Document(page_content="Level 1 assets are reported here.", metadata={"template_sheet": "72", "row": "0030"}),
+    Document(page_content="Level 2B assets are reported here.", metadata={"template_sheet": "72", "row": "0240"}),
+    Document(page_content="Stable retail deposits run-off rate.", metadata={"article": "Article 24 Outflows"}),
+]
+IDS = ["a", "b", "c"]
+
+
+def doc(chunk_id: str) -> Document:
+    return Document(id=chunk_id, page_content=f"text of {chunk_id}")
+
+
+def test_tokenize_normalizes_identifiers():
+    assert tokenize("C 72.00 row 0030") == ["c", "72", "row", "30", "c:72", "row:30"]
+
+
+def test_bm25_matches_identifiers_from_metadata():
+    index = BM25Index.from_documents(DOCS, IDS)
+
+    assert [d.id for d in index.search("row 0240", k=1)] == ["b"]
+    assert [d.id for d in index.search("article 24", k=1)] == ["c"]
+    assert index.search("row 0240", k=3, filter={"row": "0030"})[0].id == "a"
+
+
+def test_bm25_reused_until_chunks_or_tokenizer_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "bm25.json")
+    built = load_or_build_bm25(path, DOCS, IDS)
+
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)["fingerprint"]
+    assert load_or_build_bm25(path, DOCS, IDS).fingerprint == saved == built.fingerprint
+
+    rebuilt = load_or_build_bm25(path, DOCS[:2], IDS[:2])
+    assert rebuilt.ids == IDS[:2]
+
+    monkeypatch.setattr(lexical_index, "TOKENIZER_VERSION", lexical_index.TOKENIZER_VERSION + 1)
+    assert load_or_build_bm25(path, DOCS[:2], IDS[:2]).fingerprint != rebuilt.fingerprint
+
+
+def test_rrf_rewards_agreement_and_dedupes():
+    a, b, c, d = doc("a"), doc("b"), doc("c"), doc("d")
+    fused = reciprocal_rank_fusion([[a, b, c], [c, a, d]], k=10)
+
+    assert [x.id for x in fused] == ["a", "c", "b", "d"]
+
+
+def test_rrf_truncates_to_k():
+    lists = [[doc(str(i)) for i in range(10)]]
+    assert len(reciprocal_rank_fusion(lists, k=3)) == 3
@@ -0,0 +1,62 @@
+import os
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.rag.mmap_store import MappedVectorStore, current_snapshot, write_snapshot
+
+EMBEDDING = DeterministicFakeEmbedding(size=16)
+
+TEXTS = [
+    "Article 10 Level 1 assets include coins and banknotes.",
+    "Stable retail deposits have a run-off rate of 5%.",
+    "Covered bonds are Level 2A assets.",
+]
+METADATAS = [
+    {"doc_type": "pra_rulebook", "article": "Article 10 Level 1 Assets"},
+    {"doc_type": "pra_rulebook", "article": "Article 24 Outflows from stable retail deposits"},
+    {"doc_type": "lcr_template", "template_sheet": "72", "row": "040"},
+]
+
+
+def publish(root, texts=TEXTS, metadatas=METADATAS, sources="s1"):
+    ids = [f"id{i}" for i in range(len(texts))]
+    return write_snapshot(
+        str(root), ids, texts, metadatas, EMBEDDING.embed_documents(texts), sources=sources
+    )
+
+
+def test_open_returns_current_snapshot_or_none_when_stale(tmp_path):
+    assert MappedVectorStore.open(EMBEDDING, str(tmp_path)) is None
+    publish(tmp_path)
+
+    store = MappedVectorStore.open(EMBEDDING, str(tmp_path), sources="s1")
+    assert list(store.chunk_ids()) == ["id0", "id1", "id2"]
+    assert store.get(ids=["id2"])["metadatas"] == [METADATAS[2]]
+    assert MappedVectorStore.open(EMBEDDING, str(tmp_path), sources="changed") is None
+
+
+def test_open_snapshot_survives_pruning(tmp_path):
+    first = publish(tmp_path)
+    store = MappedVectorStore.open(EMBEDDING, str(tmp_path))
+
+    second = publish(tmp_path, texts=TEXTS[:2], metadatas=METADATAS[:2])
+    assert not os.path.exists(first)
+    assert current_snapshot(str(tmp_path)) == second
+
+    # Everything the old reader needs was mapped at open
+    hits = store.lexical_index().search("covered bonds", k=1)
+    assert hits[0].page_content == TEXTS[2]
+    assert len(store.similarity_search(TEXTS[1], k=3)) == 3
+    structural = store.structural_index()
+    assert [d.page_content for d in structural.resolve("What does Article 24 say?")] == [TEXTS[1]]
+    assert [d.page_content for d in structural.resolve("C 72.00 row 0040")] == [TEXTS[2]]
+
+    assert len(MappedVectorStore.open(EMBEDDING, str(tmp_path)).chunk_ids()) == 2
+
+
+def test_filters_use_code_columns(tmp_path):
+    publish(tmp_path)
+    store = MappedVectorStore.open(EMBEDDING, str(tmp_path))
+
+    docs = store.similarity_search(TEXTS[0], k=3, filter={"doc_type": "lcr_template"})
+    assert [d.page_content for d in docs] == [TEXTS[2]]
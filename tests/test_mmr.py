@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from app.rag.mmr import VectorCache, mmr_select
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.25, 0.5, 1.0])
+def test_batched_selection_matches_langchain(lambda_mult):
+    rng = np.random.default_rng(7)
+    queries = rng.normal(size=(4, 16)).astype(np.float32)
+    # Ragged candidate sets exercise the padding of the batched tensor
+    candidates = [rng.normal(size=(n, 16)).astype(np.float32) for n in (20, 12, 5, 20)]
+
+    picks = mmr_select(queries, candidates, k=6, lambda_mult=lambda_mult)
+
+    for query, cands, got in zip(queries, candidates, picks):
+        expected = maximal_marginal_relevance(query, cands, lambda_mult=lambda_mult, k=6)
+        assert got == expected
+
+
+def test_selection_is_capped_by_each_querys_candidates():
+    rng = np.random.default_rng(3)
+    queries = rng.normal(size=(2, 8)).astype(np.float32)
+    candidates = [rng.normal(size=(3, 8)).astype(np.float32), np.zeros((0, 8), dtype=np.float32)]
+
+    picks = mmr_select(queries, candidates, k=5)
+
+    assert sorted(picks[0]) == [0, 1, 2]
+    assert picks[1] == []
+
+
+def test_vector_cache_evicts_least_recently_used():
+    cache = VectorCache(max_entries=2)
+    cache.put_many({"a": np.ones(4, dtype=np.float32), "b": np.ones(4, dtype=np.float32)})
+    cache.get_many(["a"])
+    cache.put_many({"c": np.ones(4, dtype=np.float32)})
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert len(cache) == 2
+    assert cache.nbytes == 2 * 4 * 4
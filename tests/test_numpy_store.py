@@ -0,0 +1,80 @@
+import os
+import threading
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.rag.numpy_store import CURRENT_FILE, NumpyVectorStore, current_version, publish_version, staging_dir
+
+EMBEDDING = DeterministicFakeEmbedding(size=16)
+
+
+def store(path, texts=()):
+    s = NumpyVectorStore(EMBEDDING, persist_directory=str(path))
+    if texts:
+        s.add_texts(list(texts), ids=list(texts))
+        s.flush()
+    return s
+
+
+def versions(root):
+    return sorted(name for name in os.listdir(root) if name.startswith("v"))
+
+
+def test_nothing_is_written_until_flush(tmp_path):
+    s = NumpyVectorStore(EMBEDDING, persist_directory=str(tmp_path))
+    s.add_texts(["liquidity buffer"], ids=["a"])
+
+    assert store(tmp_path).get(include=[])["ids"] == []
+    s.flush()
+    assert store(tmp_path).get(include=[])["ids"] == ["a"]
+
+
+def test_publish_swaps_current_and_prunes_old_versions(tmp_path):
+    s = store(tmp_path, ["liquidity buffer"])
+    root = s.persist_path
+    first = current_version(root)
+
+    s.add_texts(["run-off rate"], ids=["b"])
+    s.flush()
+
+    assert current_version(root) != first
+    assert versions(root) == [os.path.basename(current_version(root))]
+    assert sorted(store(tmp_path).get(include=[])["ids"]) == ["b", "liquidity buffer"]
+
+
+def test_publish_leaves_other_writers_staging_alone(tmp_path):
+    s = store(tmp_path, ["liquidity buffer"])
+    root = s.persist_path
+    other = staging_dir(root, "v0")
+    with open(os.path.join(other, "vectors.npy"), "wb") as f:
+        f.write(b"half written")
+
+    s.add_texts(["run-off rate"], ids=["b"])
+    s.flush()
+
+    assert os.path.exists(os.path.join(other, "vectors.npy"))
+
+
+def test_concurrent_publishes_leave_one_readable_version(tmp_path):
+    root = str(tmp_path / "collection")
+    os.makedirs(root)
+
+    def publish(i):
+        for j in range(5):
+            version = f"v{i}{j:03d}"
+            staging = staging_dir(root, version)
+            with open(os.path.join(staging, "payload"), "w") as f:
+                f.write(version)
+            publish_version(root, staging, version)
+
+    threads = [threading.Thread(target=publish, args=(i,)) for i in range(1, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    current = current_version(root)
+    assert versions(root) == [os.path.basename(current)]
+    with open(os.path.join(current, "payload")) as f:
+        assert f.read() == os.path.basename(current)
+    assert os.path.exists(os.path.join(root, CURRENT_FILE))
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from app.rag.query_router import REGULATORY, REPORTING, classify_query, merge_partitions
+from app.rag.retriever import QueryRouterRetriever
+
+
+def doc(chunk_id: str) -> Document:
+    return Document(id=chunk_id, page_content=f"text of {chunk_id}")
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("Where are Level 2B assets reported in the LCR template?", REPORTING),
+        ("Which row of C 72.00 holds covered bonds?", REPORTING),
+        ("What is the haircut on Level 2B assets?", REGULATORY),
+        ("How is the liquidity buffer defined?", REGULATORY),
+    ],
+)
+def test_classify_query(question, expected):
+    assert classify_query(question) == expected
+
+
+def test_merge_partitions_interleaves_by_relative_rank_and_dedupes():
+    template = [doc("t1"), doc("t2")]
+    rulebook = [doc("r1"), doc("t1"), doc("r2"), doc("r3")]
+
+    merged = merge_partitions([template, rulebook])
+
+    assert [d.id for d in merged] == ["r1", "t1", "r2", "t2", "r3"]
+
+
+class FakePartition:
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    async def aretrieve_with_embedding(self, query, embedding):
+        self.calls.append(query)
+        return [doc(f"{self.name}-{query}")]
+
+    async def aretrieve_batch_with_embeddings(self, queries, embeddings):
+        self.calls.extend(queries)
+        return [[doc(f"{self.name}-{q}")] for q in queries]
+
+
+def test_router_searches_only_the_route_partitions():
+    template, rulebook = FakePartition("template"), FakePartition("rulebook")
+    router = QueryRouterRetriever(routes={
+        REPORTING: {"lcr_template": template, "pra_rulebook": rulebook},
+        REGULATORY: {"pra_rulebook": rulebook},
+    })
+    reporting, regulatory = "Where is Level 1 reported?", "What is the haircut?"
+
+    results = asyncio.run(router.aretrieve_batch_with_embeddings([reporting, regulatory], [[0.0], [0.0]]))
+
+    assert template.calls == [reporting]
+    assert sorted(rulebook.calls) == sorted([reporting, regulatory])
+    assert {d.id for d in results[0]} == {f"template-{reporting}", f"rulebook-{reporting}"}
+    assert [d.id for d in results[1]] == [f"rulebook-{regulatory}"]
@@ -0,0 +1,73 @@
+import asyncio
+
+from langchain_core.documents import Document
+
+from app.rag.metrics import LOOKUPS
+from app.services.rag_service import RAGPipelineService
+
+HISTORY = [
+    {"role": "user", "content": "What is the haircut on Level 2A assets?"},
+    {"role": "assistant", "content": "15%."},
+]
+
+
+async def collect(stream):
+    return [event async for event in stream]
+
+
+def test_aquery_uses_precomputed_standalone_question(fake_pipeline):
+    service = RAGPipelineService(fake_pipeline)
+    rewriter = fake_pipeline["query_rewriter"]
+
+    question = asyncio.run(service.astandalone("and for Level 2B?", HISTORY))
+    answer, _ = asyncio.run(service.aquery("and for Level 2B?", standalone_question=question))
+
+    assert rewriter.calls == 1
+    assert fake_pipeline["answer_chain"].questions == [question]
+    assert answer == f"answer to {question}"
+
+
+def test_astream_query_uses_precomputed_standalone_question(fake_pipeline):
+    service = RAGPipelineService(fake_pipeline)
+    rewriter = fake_pipeline["query_rewriter"]
+
+    events = asyncio.run(collect(
+        service.astream_query("and for Level 2B?", standalone_question="Level 2B haircut?")
+    ))
+
+    assert rewriter.calls == 0
+    assert [e["event"] for e in events][0] == "sources"
+    assert events[-1]["event"] == "done"
+
+
+def test_aquery_rewrites_follow_up_without_precomputed_question(fake_pipeline):
+    service = RAGPipelineService(fake_pipeline)
+
+    asyncio.run(service.aquery("and for Level 2B?", HISTORY))
+
+    assert fake_pipeline["query_rewriter"].calls == 1
+
+
+class ArticleIndex:
+    def resolve(self, question):
+        if "Article" in question:
+            return [Document(page_content="Article 10 text", metadata={"article": "Article 10"})]
+        return None
+
+
+def test_lookup_hits_and_misses_add_up_per_tier(fake_pipeline):
+    fake_pipeline["structural_index"] = ArticleIndex()
+    service = RAGPipelineService(fake_pipeline)
+    tiers = [(t, r) for t in ("exact", "structural", "semantic") for r in ("hit", "miss")]
+    before = {k: LOOKUPS.value(corpus=service.corpus_id, tier=k[0], result=k[1]) for k in tiers}
+
+    asyncio.run(service.aquery("What is HQLA?"))  # misses every tier, then generates
+    asyncio.run(service.aquery("What is HQLA?"))  # exact hit
+    asyncio.run(service.aquery("What does Article 10 say?"))  # structural hit
+
+    delta = {k: LOOKUPS.value(corpus=service.corpus_id, tier=k[0], result=k[1]) - v for k, v in before.items()}
+    assert delta == {
+        ("exact", "hit"): 1, ("exact", "miss"): 2,
+        ("structural", "hit"): 1, ("structural", "miss"): 1,
+        ("semantic", "hit"): 0, ("semantic", "miss"): 1,
+    }
@@ -0,0 +1,43 @@
+import pytest
+
+from app.rag import rulebook_chunker, rulebook_loader
+from app.rag.ingest import iter_rulebook_documents
+from app.rag.rulebook_chunker import chunk_rulebook, classify_page_lines
+from app.rag.rulebook_loader import load_rulebook, shard_ranges
+
+# Pinned from the original single-process chunker: the process pool and
+# the streaming path must produce the same chunks, in the same order
+RULEBOOK_CHUNKS = 440
+RULEBOOK_SHA256 = "d381ac52df3ca11acba53a6244bd648631c740d087d050ddd9156b12b359c6b6"
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_rulebook_chunks_pinned(workers, monkeypatch, rulebook_path, chunks_digest):
+    # The sample PDF is below the default shard floor; lower it so the
+    # process pool path really runs
+    monkeypatch.setattr(rulebook_loader, "MIN_PAGES_PER_SHARD", 8)
+    monkeypatch.setattr(rulebook_chunker, "MIN_PAGES_PER_SHARD", 8)
+    pages = load_rulebook(rulebook_path, workers=workers)
+    chunks = chunk_rulebook(pages, workers=workers)
+
+    assert len(chunks) == RULEBOOK_CHUNKS
+    assert chunks_digest(chunks) == RULEBOOK_SHA256
+
+
+def test_rulebook_streaming_chunks_pinned(rulebook_path, chunks_digest):
+    chunks = list(iter_rulebook_documents(rulebook_path, workers=1))
+
+    assert len(chunks) == RULEBOOK_CHUNKS
+    assert chunks_digest(chunks) == RULEBOOK_SHA256
+
+
+def test_shard_ranges_cover_every_page_once():
+    ranges = shard_ranges(100, 4, 8)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 100
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert shard_ranges(10, 4, 8) == [(0, 10)]
+
+
+def test_classify_page_lines():
+    events = classify_page_lines("Article 10 Level 1 assets\n1. A firm shall hold\n(a) coins\n  –  \nplain text")
+    assert [kind for kind, _, _ in events] == ["article", "section", "subsection", "text"]
@@ -0,0 +1,47 @@
+import pytest
+
+from app.rag.scope_classifier import ScopeClassifier
+
+CORPUS = [
+    "Article 10 Level 1 assets: coins and banknotes, central bank reserves and liquid assets.",
+    "Outflows on stable retail deposits are multiplied by a run-off rate of 5%.",
+    "Covered bonds may be treated as Level 2A assets subject to a haircut.",
+    "Sheet C 72.00 row 0040 reports holdings of eligible market assets.",
+]
+
+
+@pytest.fixture
+def classifier():
+    return ScopeClassifier.from_texts(CORPUS)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is the weather like today?",
+        "Tell me about dinosaurs",
+        "hello",
+        "Book me a flight to Paris",
+    ],
+)
+def test_refuses_off_topic_questions(classifier, question):
+    assert classifier.is_out_of_scope(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What run-off rate applies to stable retail deposits?",
+        "Are Bitcoin ETFs HQLA?",  # one corpus word in three, but a domain term
+        "Tell me about gilts",  # no corpus word, only a domain term
+        "What does Article 99 say?",  # explicit reference
+        "What goes in C 72.00?",
+    ],
+)
+def test_keeps_in_scope_questions(classifier, question):
+    assert not classifier.is_out_of_scope(question)
+
+
+def test_zero_threshold_disables_refusals():
+    classifier = ScopeClassifier.from_texts(CORPUS, refuse_below=0)
+    assert not classifier.is_out_of_scope("Tell me a joke")
@@ -0,0 +1,70 @@
+from langchain_core.documents import Document
+
+from app.rag.structural_index import StructuralIndex, parse_references
+
+
+def rule(text, article):
+    return Document(page_content=text, metadata={"doc_type": "pra_rulebook", "article": article})
+
+
+def row(text, sheet, row_code, id_code):
+    return Document(
+        page_content=text,
+        metadata={"doc_type": "lcr_template", "template_sheet": sheet, "row": row_code, "id_hierarchy": id_code},
+    )
+
+
+DOCS = [
+    rule("LCR definition", "Article 4 The Liquidity Coverage Ratio"),
+    rule("LCR formula", "Article 4 The Liquidity Coverage Ratio"),
+    # A cross-reference picked up as a heading stays with Article 4
+    rule("as set out in Article 116 of CRR;", "Article 116 of CRR;"),
+    rule("Stable deposits", "Article 24 Outflows from stable retail deposits"),
+    row("Level 1 assets", "72", "040", "1.1"),
+    row("Level 2A assets", "72", "230", "1.2"),
+    row("Retail deposits", "73", "040", "1.1"),
+]
+
+
+def test_parse_references_normalises_rows():
+    refs = parse_references("What goes in sheet C 72.00 row 0040 and Art. 24?")
+
+    assert refs["articles"] == ["24"]
+    assert refs["sheets"] == ["72"]
+    assert refs["rows"] == ["40"]
+
+
+def test_article_lookup_returns_the_whole_article_in_order():
+    index = StructuralIndex.from_documents(DOCS)
+
+    docs = index.resolve("Explain Article 4")
+
+    assert [d.page_content for d in docs] == [
+        "LCR definition",
+        "LCR formula",
+        "as set out in Article 116 of CRR;",
+    ]
+    assert index.resolve("What does Article 116 say?") is None
+
+
+def test_template_rows_and_ids_resolve_within_their_sheet():
+    index = StructuralIndex.from_documents(DOCS)
+
+    assert [d.page_content for d in index.resolve("C 72.00 row 040")] == ["Level 1 assets"]
+    assert [d.page_content for d in index.resolve("template 73 row 40")] == ["Retail deposits"]
+    assert [d.page_content for d in index.resolve("sheet 72 ID 1.2")] == ["Level 2A assets"]
+    # A row without a sheet is ambiguous
+    assert index.resolve("what is row 040?") is None
+
+
+def test_questions_without_references_fall_through():
+    index = StructuralIndex.from_documents(DOCS)
+
+    assert index.resolve("How are stable deposits treated?") is None
+
+
+def test_resolved_context_is_capped():
+    docs = [rule(f"part {i}", "Article 7 Transfers") for i in range(10)]
+    index = StructuralIndex.from_documents(docs, max_docs=3)
+
+    assert [d.page_content for d in index.resolve("Article 7")] == ["part 0", "part 1", "part 2"]
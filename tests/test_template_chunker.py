@@ -0,0 +1,47 @@
+import pandas as pd
+
+from app.rag.template_chunker import chunk_template_excel, clean_multiline_items, excel_row_splitter
+from app.rag.template_loader import load_template_excel
+
+# Pinned from the original iterrows chunker: the vectorized one must
+# produce the same chunks, in the same order
+TEMPLATE_CHUNKS = 376
+TEMPLATE_SHA256 = "13b49e07d1b0d03c46e75d56c8a5846e8ea98cb2bb99ab5f95a438de0ffd31a5"
+
+
+def test_template_chunks_pinned(template_path, chunks_digest):
+    chunks = chunk_template_excel(load_template_excel(template_path))
+
+    assert len(chunks) == TEMPLATE_CHUNKS
+    assert chunks_digest(chunks) == TEMPLATE_SHA256
+
+
+def test_continuation_rows_merge_onto_their_item():
+    df = pd.DataFrame({
+        "Row": ["010", None, None, "020"],
+        "ID": ["1", None, None, "2"],
+        "Item": ["Level 1 assets", "held by the firm", "(excluding coins)", "Level 2A assets"],
+    })
+
+    merged = clean_multiline_items(df)
+
+    assert merged["Item"].tolist() == [
+        "Level 1 assets held by the firm (excluding coins)",
+        "Level 2A assets",
+    ]
+    assert merged["Row"].tolist() == ["010", "020"]
+
+
+def test_row_splitter_skips_rows_without_item_text():
+    df = pd.DataFrame({
+        "Row": ["010", "020"],
+        "ID": ["1", "2"],
+        "Item": ["Level 1 assets", None],
+        "template_sheet": ["72", "72"],
+        "template_code": ["72", "72"],
+    })
+
+    docs = excel_row_splitter(df)
+
+    assert [d.page_content for d in docs] == ["Level 1 assets"]
+    assert docs[0].metadata["row"] == "010" and docs[0].metadata["doc_type"] == "lcr_template"
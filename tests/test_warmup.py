@@ -0,0 +1,39 @@
+import threading
+
+from app.services.warmup import PipelineWarmup
+
+
+def test_status_reports_stage_until_ready():
+    release = threading.Event()
+    reported = threading.Event()
+
+    def factory(progress):
+        progress("index", 0.5)
+        reported.set()
+        release.wait(1)
+        return "service"
+
+    warmup = PipelineWarmup(factory)
+    warmup.start()
+    reported.wait(1)
+
+    status = warmup.status()
+    assert not warmup.ready and warmup.service is None
+    assert status["status"] == "building" and status["stage"] == "index" and status["progress"] == 0.5
+
+    release.set()
+    assert warmup.wait(1)
+    assert warmup.service == "service"
+    assert warmup.status()["status"] == "ready" and warmup.status()["stage"] is None
+
+
+def test_failed_build_stays_failed_with_its_error():
+    def factory(progress):
+        raise RuntimeError("no OPENAI_API_KEY")
+
+    warmup = PipelineWarmup(factory)
+    warmup.start()
+
+    assert not warmup.wait(1)
+    assert warmup.status()["status"] == "failed"
+    assert warmup.status()["error"] == "RuntimeError: no OPENAI_API_KEY"